@@ -1,6 +1,9 @@
 """Transaction Classifier — matches counterparty names to accounting codes."""
+from collections import deque
 from typing import Optional
 
+_NO_RULE = float("inf")
+
 
 def match_counterparty(counterparty: str, rules: list) -> Optional[dict]:
     """Find the best matching rule for a counterparty name.
@@ -21,9 +24,87 @@ def match_counterparty(counterparty: str, rules: list) -> Optional[dict]:
     return None
 
 
-def classify_transactions(transactions: list, rules: list) -> dict:
+class CounterpartyMatcher:
+    """Compiled form of match_counterparty() — an Aho-Corasick automaton over all patterns.
+
+    Same semantics: case-insensitive substring match, first rule (in list order)
+    wins. Build once per rules version; each lookup then walks the counterparty
+    once, O(len(counterparty)), no matter how many rules there are. Results are
+    memoized per distinct counterparty since bank lines repeat the same names.
+    """
+
+    MEMO_MAX = 100_000
+
+    def __init__(self, rules: list):
+        self.rules = list(rules)
+        goto = [{}]         # state → {char: next state}
+        best = [_NO_RULE]   # state → lowest rule index whose pattern ends here (incl. via fail links)
+        for idx, rule in enumerate(self.rules):
+            state = 0
+            for ch in rule["pattern"].lower():
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    best.append(_NO_RULE)
+                state = nxt
+            best[state] = min(best[state], idx)
+
+        # Failure links, breadth-first: shallower states are final first, so best[] propagates in the same pass.
+        fail = [0] * len(goto)
+        queue = deque()
+        for nxt in goto[0].values():
+            best[nxt] = min(best[nxt], best[0])
+            queue.append(nxt)
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                best[nxt] = min(best[nxt], best[fail[nxt]])
+                queue.append(nxt)
+
+        self._goto, self._fail, self._best = goto, fail, best
+        self._memo = {}
+
+    def match_index(self, counterparty: str) -> Optional[int]:
+        """Index into self.rules of the winning rule, or None."""
+        if not counterparty:
+            return None
+        hit = self._memo.get(counterparty, -1)
+        if hit != -1:
+            return hit
+
+        goto, fail, best = self._goto, self._fail, self._best
+        state, found = 0, best[0]
+        for ch in counterparty.lower():
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if best[state] < found:
+                found = best[state]
+                if found == 0:
+                    break
+        result = None if found == _NO_RULE else found
+
+        if len(self._memo) >= self.MEMO_MAX:
+            self._memo.clear()
+        self._memo[counterparty] = result
+        return result
+
+    def match(self, counterparty: str) -> Optional[dict]:
+        idx = self.match_index(counterparty)
+        return None if idx is None else self.rules[idx]
+
+
+def classify_transactions(transactions: list, rules: list, matcher: Optional[CounterpartyMatcher] = None) -> dict:
     """Classify a batch of transactions using rules.
 
+    Pass a prebuilt ``matcher`` (compiled from the same rules) to skip compiling.
+
     Returns:
         {
             "classified": [...],     # matched transactions
@@ -31,12 +112,13 @@ def classify_transactions(transactions: list, rules: list) -> dict:
             "stats": {"auto": N, "unclassified": N, "total": N}
         }
     """
+    matcher = matcher or CounterpartyMatcher(rules)
     classified = []
     unclassified = []
 
     for tx in transactions:
         counterparty = tx.get("counterparty", "") or ""
-        match = match_counterparty(counterparty, rules)
+        match = matcher.match(counterparty)
 
         if match:
             classified.append({
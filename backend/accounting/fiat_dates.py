@@ -0,0 +1,64 @@
+"""Fiat statement dates — normalize WISE / Aspire date strings to one ISO form.
+
+WISE CSV ("Finished on" / "Created on") and Aspire exports use different
+formats; everything is stored as "YYYY-MM-DD HH:MM:SS" so tx_date sorts and
+range-filters as text, and tx_year / tx_month can be derived once at import.
+"""
+from datetime import date, datetime
+from typing import Optional
+
+ISO_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# ISO 8601 (fromisoformat) 이 안 맞을 때 순서대로 시도.
+# 슬래시/점 표기는 일-월 순서(Aspire SG 계정 기준)로 해석한다.
+_FORMATS = (
+    "%d-%m-%Y %H:%M:%S",
+    "%d-%m-%Y %H:%M",
+    "%d-%m-%Y",
+    "%d/%m/%Y %H:%M:%S",
+    "%d/%m/%Y %H:%M",
+    "%d/%m/%Y",
+    "%d.%m.%Y",
+    "%d %b %Y %H:%M",
+    "%d %b %Y",
+    "%d %B %Y",
+    "%b %d, %Y",
+    "%B %d, %Y",
+)
+
+
+def normalize_tx_date(value) -> str:
+    """Return ``value`` as "YYYY-MM-DD HH:MM:SS".
+
+    Accepts datetime/date objects (openpyxl cells) or strings in any of the
+    known statement formats. Unknown strings are returned stripped but
+    otherwise unchanged (never guessed); empty input gives "".
+    """
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None, microsecond=0).strftime(ISO_FORMAT)
+    if isinstance(value, date):
+        return value.strftime(ISO_FORMAT)
+
+    text = str(value).strip()
+    if not text:
+        return ""
+    try:
+        # 타임존이 붙어 있어도 명세서에 찍힌 시각 그대로 보관
+        return normalize_tx_date(datetime.fromisoformat(text))
+    except ValueError:
+        pass
+    for fmt in _FORMATS:
+        try:
+            return datetime.strptime(text, fmt).strftime(ISO_FORMAT)
+        except ValueError:
+            continue
+    return text
+
+
+def tx_period(tx_date: str) -> tuple[Optional[int], Optional[int]]:
+    """(year, month) of a normalized tx_date, or (None, None) if it isn't ISO."""
+    if len(tx_date) >= 7 and tx_date[4] == "-" and tx_date[:4].isdigit() and tx_date[5:7].isdigit():
+        return int(tx_date[:4]), int(tx_date[5:7])
+    return None, None
@@ -1,10 +1,16 @@
 import os
+import re
+import codecs
+import hashlib
+import shutil
+import asyncio
 import tempfile
 import json
 import httpx
 import subprocess
 from pathlib import Path
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
 
@@ -288,132 +294,684 @@ def _build_why(matching_langs: list, matching_domains: list, expertise: dict) ->
     return " | ".join(parts) if parts else "General match"
 
 
-async def analyze_repo(repo_url: str) -> dict:
-    """Clone and analyze a repository."""
-    with tempfile.TemporaryDirectory() as tmpdir:
-        repo_path = os.path.join(tmpdir, "repo")
+# ── Repository scan ──
+# analyze_repo 의 파일/언어 통계, 테스트 디렉터리 감지, 샘플 코드, README, 설정·구조 지표를
+# 트리 한 번 순회로 모은다. 파일 내용은 앞부분만 제한된 바이트로 읽는다.
+SCAN_PRUNE_DIRS = {".git", "node_modules", "__pycache__", ".next", "dist", "build"}
+SAMPLE_EXTENSIONS = {".py", ".js", ".ts", ".tsx", ".sol", ".rs", ".go"}
+README_NAMES = ("README.md", "readme.md", "README.rst", "README")
+CONFIG_FILE_NAMES = {
+    ".eslintrc", ".eslintrc.js", ".eslintrc.json", ".prettierrc", ".prettierrc.json",
+    "tsconfig.json", "hardhat.config.js", "hardhat.config.ts", "foundry.toml",
+    "dockerfile", "docker-compose.yml", "docker-compose.yaml",
+    ".github", "makefile", "justfile", "package.json", "cargo.toml", "go.mod",
+    ".editorconfig", "pyproject.toml", "setup.py", "setup.cfg",
+}
+SRC_DIR_NAMES = {"src", "lib", "pkg", "internal", "cmd", "contracts", "components", "modules", "core", "utils"}
+SAMPLE_COUNT = 5
+SAMPLE_CANDIDATES = 10  # 디코딩 실패로 건너뛸 여유분
+SAMPLE_CHARS = 2000
+README_CHARS = 3000
+
+# 대형 모노레포 보호: 이 이상 파일은 세지 않고 순회를 멈춘다(scan_truncated=True).
+# 읽기 예산은 README + 샘플 파일 앞부분을 읽는 총 바이트.
+REPO_SCAN_MAX_FILES = int(os.getenv("REPO_SCAN_MAX_FILES", "50000"))
+REPO_SCAN_MAX_READ_BYTES = int(os.getenv("REPO_SCAN_MAX_READ_BYTES", "131072"))
+
+# git 은 asyncio 서브프로세스로, 트리 순회·파일 읽기·임시 디렉터리 삭제는 전용 스레드 풀에서 돌려
+# 분석 중에도 이벤트 루프(다른 API 요청)가 막히지 않게 한다. 동시 분석 수도 제한한다.
+REPO_SCAN_WORKERS = int(os.getenv("REPO_SCAN_WORKERS", "2"))
+REPO_ANALYSIS_CONCURRENCY = int(os.getenv("REPO_ANALYSIS_CONCURRENCY", "2"))
+_scan_executor = ThreadPoolExecutor(max_workers=REPO_SCAN_WORKERS, thread_name_prefix="repo-scan")
+_analysis_slots = asyncio.Semaphore(REPO_ANALYSIS_CONCURRENCY)
+
+
+async def _in_scan_executor(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_scan_executor, fn, *args)
+
+
+def _walk_tree(repo_path: str):
+    """Pruned os.walk, yielding (rel_dir, depth, subdirs, [(filename, size)]) top-down in name order."""
+    for root, dirs, files in os.walk(repo_path):
+        dirs[:] = sorted(d for d in dirs if d not in SCAN_PRUNE_DIRS)
+        rel = os.path.relpath(root, repo_path)
+        rel = "" if rel == "." else rel
+        sized = []
+        for f in sorted(files):
+            try:
+                size = os.path.getsize(os.path.join(root, f))
+            except OSError:
+                size = 0
+            sized.append((f, size))
+        yield rel, (rel.count(os.sep) + 1 if rel else 0), dirs, sized
+
+
+def _scan_entries(entries, max_files: int = REPO_SCAN_MAX_FILES) -> dict:
+    """Collect every tree metric from one pass over _walk_tree-style entries."""
+    lang_counter = Counter()
+    file_count = 0
+    total_size = 0
+    has_tests = False
+    config_files = set()
+    src_dirs = set()
+    max_depth = 0
+    readme_path = None
+    sample_paths = []
+    truncated = False
+
+    for rel, depth, dirs, files in entries:
+        max_depth = max(max_depth, depth)
+        for d in dirs:
+            if "test" in d.lower() or "spec" in d.lower():
+                has_tests = True
+            if d in SRC_DIR_NAMES:
+                src_dirs.add(d)
+        if depth == 0:
+            if ".github" in dirs:
+                config_files.add("ci/cd")
+            names = {f for f, _ in files}
+            readme_path = next((n for n in README_NAMES if n in names), None)
+
+        for f, size in files:
+            if file_count >= max_files:
+                truncated = True
+                break
+            file_count += 1
+            total_size += size
+            ext = Path(f).suffix.lower()
+            if ext in LANG_EXTENSIONS:
+                lang_counter[LANG_EXTENSIONS[ext]] += 1
+            if ext in SAMPLE_EXTENSIONS and len(sample_paths) < SAMPLE_CANDIDATES:
+                sample_paths.append(os.path.join(rel, f) if rel else f)
+            if f.lower() in CONFIG_FILE_NAMES:
+                config_files.add(f.lower())
+        if truncated:
+            break
+
+    return {
+        "file_count": file_count,
+        "total_size": total_size,
+        "lang_counter": lang_counter,
+        "has_tests": has_tests,
+        "config_files": config_files,
+        "src_dirs": src_dirs,
+        "max_depth": max_depth,
+        "readme_path": readme_path,
+        "sample_paths": sample_paths,
+        "truncated": truncated,
+    }
+
+
+def _decode_prefix(data: bytes, n_chars: int) -> Optional[str]:
+    """First n_chars of UTF-8 bytes (a cut multi-byte tail is dropped); None if not UTF-8 text."""
+    try:
+        text = codecs.getincrementaldecoder("utf-8")().decode(data, final=False)
+    except UnicodeDecodeError:
+        return None
+    return text.replace("\r\n", "\n").replace("\r", "\n")[:n_chars]
+
+
+class _PrefixReader:
+    """Reads file prefixes under a shared byte budget (4 bytes per char at most for UTF-8)."""
+
+    def __init__(self, read_bytes, budget: int = REPO_SCAN_MAX_READ_BYTES):
+        self._read_bytes = read_bytes  # async (rel_path, n_bytes) -> bytes | None
+        self.remaining = budget
+
+    async def read(self, rel_path: str, n_chars: int) -> Optional[str]:
+        n_bytes = min(n_chars * 4, self.remaining)
+        if n_bytes <= 0:
+            return None
+        data = await self._read_bytes(rel_path, n_bytes)
+        if data is None:
+            return None
+        self.remaining -= len(data)
+        return _decode_prefix(data, n_chars)
+
+
+def _read_file_prefix(repo_path: str):
+    def read_sync(rel_path: str, n_bytes: int) -> Optional[bytes]:
         try:
-            subprocess.run(
-                ["git", "clone", "--depth", "50", repo_url, repo_path],
-                capture_output=True, timeout=60, check=True
-            )
+            with open(os.path.join(repo_path, rel_path), "rb") as f:
+                return f.read(n_bytes)
+        except OSError:
+            return None
+
+    async def read(rel_path: str, n_bytes: int) -> Optional[bytes]:
+        return await _in_scan_executor(read_sync, rel_path, n_bytes)
+    return read
+
+
+async def _build_analysis(scan: dict, reader: _PrefixReader, commit_count: int,
+                          commit_sha: Optional[str] = None) -> dict:
+    """analyze_repo result dict from a tree scan plus README / sample reads."""
+    readme = ""
+    if scan["readme_path"]:
+        readme = await reader.read(scan["readme_path"], README_CHARS) or ""
+
+    sample_files = []
+    for rel in scan["sample_paths"]:
+        content = await reader.read(rel, SAMPLE_CHARS)
+        if content is not None:
+            sample_files.append("--- {} ---\n{}".format(rel, content))
+            if len(sample_files) >= SAMPLE_COUNT:
+                break
+
+    # Quality metrics: documentation quality
+    readme_sections = readme.count("\n#") + readme.count("\n##")
+    readme_has_install = any(kw in readme.lower() for kw in ["install", "setup", "getting started", "usage", "quick start"])
+
+    result = {
+        "file_count": scan["file_count"],
+        "total_size_kb": round(scan["total_size"] / 1024, 1),
+        "languages": dict(scan["lang_counter"].most_common(10)),
+        "commit_count": commit_count,
+        "has_tests": scan["has_tests"],
+        "readme_preview": readme[:500],
+        "sample_code": "\n\n".join(sample_files)[:6000],
+        "readme_full": readme,
+        # Quality density metrics
+        "readme_length": len(readme),
+        "readme_sections": readme_sections,
+        "readme_has_code_blocks": "```" in readme,
+        "readme_has_install_guide": readme_has_install,
+        "config_files": list(scan["config_files"]),
+        "config_file_count": len(scan["config_files"]),
+        "max_dir_depth": scan["max_depth"],
+        "src_dir_count": len(scan["src_dirs"]),
+        # 실제로 분석한 커밋 — repo_analysis_cache 키 (ls-remote 뒤에 push 가 있었을 수 있다)
+        "commit_sha": commit_sha,
+    }
+    if scan["truncated"]:
+        result["scan_truncated"] = True
+    return result
+
+
+# 분석 모드: "objects" = blobless·no-checkout bare clone 에서 git 객체로 직접 분석 (기본),
+#           "checkout" = 기존처럼 작업 트리를 풀어 os.walk.
+# objects 모드도 total_size_kb 를 위해 세는 파일(최대 REPO_SCAN_MAX_FILES 개)의 blob 은 전부 받는다 —
+# git 프로토콜로는 blob 을 받지 않고 크기만 알 수 없다. 아끼는 것은 작업 트리 쓰기(체크아웃)와
+# blob 당 lazy fetch 왕복이고, 미러 캐시가 있으면 다음 분석부터는 바뀐 blob 만 받는다.
+# 첫 분석의 전송량을 줄이려면 REPO_SCAN_MAX_FILES 를 낮춘다.
+REPO_ANALYSIS_MODE = os.getenv("REPO_ANALYSIS_MODE", "objects")
+
+
+async def _git(repo_path: Optional[str], *args, input: Optional[bytes] = None, timeout: float = 30,
+               check: bool = False) -> subprocess.CompletedProcess:
+    """Run git as an asyncio subprocess; killed on timeout (subprocess.TimeoutExpired)."""
+    cmd = ["git", *args]
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, cwd=repo_path,
+        stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(input), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    except asyncio.CancelledError:
+        # 분석 단위 타임아웃 등으로 취소되면 git 프로세스도 정리
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+        await proc.wait()
+        raise
+    if check and proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, stdout, stderr)
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+
+async def _git_head(repo_path: str) -> Optional[str]:
+    """SHA of the clone's HEAD, or None (e.g. an empty repository)."""
+    try:
+        result = await _git(repo_path, "rev-parse", "--verify", "-q", "HEAD", timeout=10)
+    except Exception:
+        return None
+    sha = result.stdout.decode("ascii", "replace").strip() if result.returncode == 0 else ""
+    return sha if len(sha) == 40 else None
+
+
+async def _git_commit_count(repo_path: str) -> int:
+    try:
+        result = await _git(repo_path, "log", "--oneline", "--format=%H|%an|%s", timeout=10)
+        out = result.stdout.decode("utf-8", "replace").strip()
+        commits = out.split("\n") if out else []
+    except Exception:
+        commits = []
+    return len(commits)
+
+
+def _parse_ls_tree(listing: bytes) -> dict:
+    """`git ls-tree -r -t -z` output as {rel_dir: (subdirs, [(filename, oid)])}."""
+    dirs = {"": ([], [])}
+    for record in listing.split(b"\0"):
+        if not record:
+            continue
+        meta, _, raw_path = record.partition(b"\t")
+        _, obj_type, oid = meta.split(b" ")
+        path = raw_path.decode("utf-8", "surrogateescape")
+        parent, _, name = path.rpartition("/")
+        if obj_type == b"blob":
+            dirs[parent][1].append((name, oid.decode()))
+        else:  # tree, 또는 서브모듈(commit) — 체크아웃에서는 빈 디렉터리로 보인다
+            dirs[parent][0].append(name)
+            dirs.setdefault(path, ([], []))
+    return dirs
+
+
+def _walk_git_tree(dirs: dict):
+    """_walk_tree order over _parse_ls_tree output, files as (filename, oid)."""
+    stack = [""]
+    while stack:
+        rel = stack.pop()
+        subdirs, files = dirs[rel]
+        subdirs = sorted(d for d in subdirs if d not in SCAN_PRUNE_DIRS)
+        yield (rel.replace("/", os.sep), (rel.count("/") + 1 if rel else 0),
+               subdirs, sorted(files))
+        stack.extend("{}/{}".format(rel, d) if rel else d for d in reversed(subdirs))
+
+
+def _git_tree_entries(listing: bytes, max_files: int):
+    """Pruned walk entries of the HEAD listing plus the oids of the files that will be counted."""
+    entries = []
+    counted = []
+    for rel, depth, subdirs, files in _walk_git_tree(_parse_ls_tree(listing)):
+        entries.append((rel, depth, subdirs, files))
+        counted.extend(oid for _, oid in files[:max_files - len(counted)])
+    return entries, counted
+
+
+async def _git_fetch_blobs(repo_path: str, oids: list):
+    """Fetch missing blobs of a partial clone in one request (lazy fetch would go one blob at a time)."""
+    # 미러는 이전 분석에서 받은 blob 을 갖고 있으므로 HEAD 트리에서 없는 것만 요청
+    listing = await _git(repo_path, "rev-list", "--objects", "--no-walk", "--missing=print", "HEAD")
+    if listing.returncode == 0:
+        missing = {line[1:] for line in listing.stdout.decode().splitlines() if line.startswith("?")}
+        oids = [oid for oid in oids if oid in missing]
+        if not oids:
+            return
+    result = await _git(repo_path, "-c", "fetch.negotiationAlgorithm=noop", "fetch", "origin",
+                        "--no-tags", "--no-write-fetch-head", "--recurse-submodules=no",
+                        "--filter=blob:none", "--stdin",
+                        input="\n".join(oids).encode(), timeout=120)
+    if result.returncode != 0:
+        raise RuntimeError("batched fetch of {} blobs failed: {}".format(
+            len(oids), " ".join(result.stderr.decode("utf-8", "replace").split())[-300:]))
+
+
+async def _git_blob_sizes(repo_path: str, oids: list) -> dict:
+    result = await _git(repo_path, "cat-file", "--batch-check=%(objectname) %(objectsize)",
+                        input="\n".join(oids).encode() + b"\n", timeout=60)
+    sizes = {}
+    for line in result.stdout.decode().splitlines():
+        oid, _, size = line.partition(" ")
+        if size.isdigit():
+            sizes[oid] = int(size)
+    return sizes
+
+
+def _read_blob_prefix(repo_path: str, oid_by_path: dict):
+    """Prefix reads through one long-lived `git cat-file --batch` (only the first n_bytes are kept)."""
+    proc = None
+
+    async def read(rel_path: str, n_bytes: int) -> Optional[bytes]:
+        nonlocal proc
+        oid = oid_by_path.get(rel_path)
+        if oid is None:
+            return None
+        if proc is None:
+            proc = await asyncio.create_subprocess_exec(
+                "git", "cat-file", "--batch", cwd=repo_path,
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            proc.stdin.write(oid.encode() + b"\n")
+            await proc.stdin.drain()
+            line = await proc.stdout.readline()
+            if not line:
+                raise asyncio.IncompleteReadError(b"", None)
+            header = line.split()
+            if len(header) != 3:  # "<oid> missing"
+                return None
+            size = int(header[2])
+            data = await proc.stdout.readexactly(min(size, n_bytes))
+            left = size - len(data) + 1  # 나머지 + 끝 개행
+            while left > 0:
+                # read() 는 EOF 에서 양보 없이 b"" 를 돌려주므로 readexactly 로 EOF 를 오류로 받는다
+                chunk = min(left, 1 << 16)
+                await proc.stdout.readexactly(chunk)
+                left -= chunk
+            return data
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # cat-file 이 중간에 끝났다 — 이 파일은 건너뛰고 다음 읽기에서 새로 띄운다
+            await kill()
+            return None
+
+    async def kill():
+        nonlocal proc
+        if proc is not None:
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass
+            await proc.wait()
+            proc = None
+
+    async def close():
+        if proc is not None:
+            proc.stdin.close()
+            try:
+                await asyncio.wait_for(proc.wait(), 10)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+
+    read.close = close
+    return read
+
+
+async def _analyze_objects(repo_path: str, max_files: int, max_read_bytes: int) -> dict:
+    """Analyze a blobless bare clone: tree from ls-tree, sizes and prefixes from cat-file.
+
+    Every counted blob is fetched (sizes need the objects); see REPO_ANALYSIS_MODE.
+    """
+    listing = await _git(repo_path, "ls-tree", "-r", "-t", "-z", "HEAD")
+    # 빈 저장소(HEAD 없음)는 빈 트리로
+    entries, counted = await _in_scan_executor(
+        _git_tree_entries, listing.stdout if listing.returncode == 0 else b"", max_files)
+    # 세는 파일의 blob 을 한 번에 받아 크기를 구한다 (README·샘플도 이 안에 있다).
+    # 일괄 fetch 가 실패한 채 진행하면 cat-file 이 blob 을 하나씩 lazy fetch 하므로 오류로 끝낸다.
+    if counted:
+        try:
+            await _git_fetch_blobs(repo_path, counted)
         except Exception as e:
-            return {"error": "Failed to clone: {}".format(str(e))}
+            print("Repo analysis: {}: {}".format(repo_path, e))
+            return {"error": "Failed to fetch blobs: {}".format(str(e))}
+    sizes = await _git_blob_sizes(repo_path, counted) if counted else {}
+
+    oid_by_path = {}
+    sized_entries = []
+    for rel, depth, subdirs, files in entries:
+        for f, oid in files:
+            oid_by_path[os.path.join(rel, f) if rel else f] = oid
+        sized_entries.append((rel, depth, subdirs, [(f, sizes.get(oid, 0)) for f, oid in files]))
+
+    scan = await _in_scan_executor(_scan_entries, sized_entries, max_files)
+    read = _read_blob_prefix(repo_path, oid_by_path)
+    try:
+        return await _build_analysis(scan, _PrefixReader(read, max_read_bytes), await _git_commit_count(repo_path),
+                                     await _git_head(repo_path))
+    finally:
+        await read.close()
 
-        lang_counter = Counter()
-        file_count = 0
-        total_size = 0
-        for root, dirs, files in os.walk(repo_path):
-            dirs[:] = [d for d in dirs if d not in {".git", "node_modules", "__pycache__", ".next", "dist", "build"}]
-            for f in files:
-                fp = os.path.join(root, f)
-                ext = Path(f).suffix.lower()
-                if ext in LANG_EXTENSIONS:
-                    lang_counter[LANG_EXTENSIONS[ext]] += 1
-                file_count += 1
-                try:
-                    total_size += os.path.getsize(fp)
-                except:
-                    pass
 
+async def _analyze_checkout(repo_path: str, max_files: int, max_read_bytes: int) -> dict:
+    scan = await _in_scan_executor(lambda: _scan_entries(_walk_tree(repo_path), max_files))
+    reader = _PrefixReader(_read_file_prefix(repo_path), max_read_bytes)
+    return await _build_analysis(scan, reader, await _git_commit_count(repo_path), await _git_head(repo_path))
+
+
+# ── Bare mirror cache ──
+# objects 모드에서는 저장소마다 blobless bare 미러를 REPO_MIRROR_DIR 에 남겨 두고,
+# 다시 분석할 때 `git fetch` 로 바뀐 커밋·트리·blob 만 받는다.
+# 미러 디렉터리 mtime = 마지막 사용 시각. 총 크기가 REPO_MIRROR_MAX_MB 를 넘으면 오래된 것부터 삭제(LRU).
+REPO_MIRROR_DIR = os.getenv("REPO_MIRROR_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "repo_mirrors")
+REPO_MIRROR_MAX_BYTES = int(os.getenv("REPO_MIRROR_MAX_MB", "2048")) * 1024 * 1024  # 0 = 미러 사용 안 함
+# 미러 경로 → [lock, 대기 포함 사용 중인 분석 수]. 사용 중인 미러만 항목이 있다(마지막 사용자가 뺀다).
+_mirror_locks: Dict[str, list] = {}
+_mirror_evict_lock = asyncio.Lock()
+
+
+def _mirror_path(repo_url: str) -> str:
+    key = normalize_repo_url(repo_url)
+    slug = re.sub(r"[^A-Za-z0-9._-]+", "_", key.split("://", 1)[-1])[-60:]
+    return os.path.join(REPO_MIRROR_DIR, "{}-{}".format(slug, hashlib.sha1(key.encode()).hexdigest()[:12]))
+
+
+async def _sync_mirror(repo_url: str, path: str):
+    """Bring the mirror's HEAD to the remote HEAD (incremental fetch, or a fresh blobless clone)."""
+    if os.path.isdir(path):
         try:
-            result = subprocess.run(
-                ["git", "log", "--oneline", "--format=%H|%an|%s"],
-                capture_output=True, text=True, cwd=repo_path, timeout=10
-            )
-            commits = result.stdout.strip().split("\n") if result.stdout.strip() else []
-        except:
-            commits = []
-
-        has_tests = any(
-            "test" in d.lower() or "spec" in d.lower()
-            for _, dirs, _ in os.walk(repo_path)
-            for d in dirs
-        )
-
-        sample_files = []
-        for root, dirs, files in os.walk(repo_path):
-            dirs[:] = [d for d in dirs if d not in {".git", "node_modules", "__pycache__"}]
-            for f in files:
-                ext = Path(f).suffix.lower()
-                if ext in {".py", ".js", ".ts", ".tsx", ".sol", ".rs", ".go"}:
-                    fp = os.path.join(root, f)
-                    try:
-                        content = open(fp).read()[:2000]
-                        rel = os.path.relpath(fp, repo_path)
-                        sample_files.append("--- {} ---\n{}".format(rel, content))
-                        if len(sample_files) >= 5:
-                            break
-                    except:
-                        pass
-            if len(sample_files) >= 5:
+            branch = (await _git(path, "symbolic-ref", "HEAD", check=True)).stdout.decode().strip()
+            await _git(path, "fetch", "--depth", "50", "--filter=blob:none", "--no-tags", "--force",
+                       "origin", "+HEAD:" + branch, timeout=60, check=True)
+            return
+        except Exception as e:
+            # 손상됐거나 원격이 바뀐 미러 — 지우고 새로 clone
+            print("Repo mirror: refetch failed for {}: {}".format(repo_url, e))
+            await _in_scan_executor(shutil.rmtree, path, True)
+    os.makedirs(REPO_MIRROR_DIR, exist_ok=True)
+    partial = path + ".partial"
+    await _in_scan_executor(shutil.rmtree, partial, True)
+    try:
+        await _git(None, "clone", "--bare", "--filter=blob:none", "--depth", "50", repo_url, partial,
+                   timeout=60, check=True)
+    except BaseException:  # 취소 포함
+        await _in_scan_executor(shutil.rmtree, partial, True)
+        raise
+    os.replace(partial, path)
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                pass
+    return total
+
+
+def _mirror_usage() -> list:
+    """(mtime, bytes, path) of every cached mirror, least recently used first."""
+    mirrors = []
+    for name in os.listdir(REPO_MIRROR_DIR):
+        path = os.path.join(REPO_MIRROR_DIR, name)
+        if os.path.isdir(path) and not name.endswith(".partial"):
+            mirrors.append((os.path.getmtime(path), _dir_size(path), path))
+    return sorted(mirrors)
+
+
+async def _evict_mirrors(keep: str = "", max_bytes: int = REPO_MIRROR_MAX_BYTES) -> list:
+    """Delete least-recently-used mirrors until the cache fits in max_bytes. Returns evicted paths.
+
+    Runs under _mirror_evict_lock, which _analyze_mirror takes (holding its mirror lock) before
+    syncing — so a mirror not in use here can't be picked up until the eviction ends.
+    """
+    async with _mirror_evict_lock:
+        mirrors = await _in_scan_executor(_mirror_usage)
+        total = sum(size for _, size, _ in mirrors)
+        evicted = []
+        for _, size, path in mirrors:
+            if total <= max_bytes:
                 break
+            if path == keep or path in _mirror_locks:
+                continue
+            await _in_scan_executor(shutil.rmtree, path, True)
+            total -= size
+            evicted.append(path)
+        return evicted
+
+
+async def _analyze_mirror(repo_url: str, max_files: int, max_read_bytes: int) -> dict:
+    path = _mirror_path(repo_url)
+    entry = _mirror_locks.setdefault(path, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:  # 같은 미러에 fetch 가 겹치지 않게
+            async with _mirror_evict_lock:
+                pass  # 진행 중인 eviction 이 이 미러를 지우고 있을 수 있으니 끝날 때까지 기다린다
+            try:
+                await _sync_mirror(repo_url, path)
+            except Exception as e:
+                return {"error": "Failed to clone: {}".format(str(e))}
+            result = await _analyze_objects(path, max_files, max_read_bytes)
+            os.utime(path)
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _mirror_locks[path]
+    await _evict_mirrors(keep=path)
+    return result
+
+
+async def _clone_and_analyze(repo_url: str, max_files: int, max_read_bytes: int, mode: str,
+                             timeout: Optional[float] = None,
+                             slots: Optional[asyncio.Semaphore] = None) -> dict:
+    """Clone and analyze a repository (at most REPO_ANALYSIS_CONCURRENCY at a time, or ``slots``).
+
+    ``timeout`` bounds the work itself, counted from when a slot is acquired.
+    """
+    async with slots or _analysis_slots:
+        work = _clone_and_analyze_locked(repo_url, max_files, max_read_bytes, mode)
+        if timeout is None:
+            return await work
+        try:
+            return await asyncio.wait_for(work, timeout)
+        except asyncio.TimeoutError:
+            return {"error": "Analysis timed out after {}s".format(timeout)}
 
-        readme = ""
-        for name in ["README.md", "readme.md", "README.rst", "README"]:
-            rp = os.path.join(repo_path, name)
-            if os.path.exists(rp):
-                readme = open(rp).read()[:3000]
-                break
 
-        # Quality metrics: documentation quality
-        readme_len = len(readme)
-        readme_sections = readme.count("\n#") + readme.count("\n##")
-        readme_has_code_blocks = "```" in readme
-        readme_has_install = any(kw in readme.lower() for kw in ["install", "setup", "getting started", "usage", "quick start"])
-
-        # Quality metrics: code organization
-        config_files = set()
-        max_depth = 0
-        src_dirs = set()
-        for root, dirs, files in os.walk(repo_path):
-            dirs[:] = [d for d in dirs if d not in {".git", "node_modules", "__pycache__", ".next", "dist", "build"}]
-            depth = root.replace(repo_path, "").count(os.sep)
-            if depth > max_depth:
-                max_depth = depth
-            for d in dirs:
-                if d in {"src", "lib", "pkg", "internal", "cmd", "contracts", "components", "modules", "core", "utils"}:
-                    src_dirs.add(d)
-            for f in files:
-                fl = f.lower()
-                if fl in {".eslintrc", ".eslintrc.js", ".eslintrc.json", ".prettierrc", ".prettierrc.json",
-                          "tsconfig.json", "hardhat.config.js", "hardhat.config.ts", "foundry.toml",
-                          "dockerfile", "docker-compose.yml", "docker-compose.yaml",
-                          ".github", "makefile", "justfile", "package.json", "cargo.toml", "go.mod",
-                          ".editorconfig", "pyproject.toml", "setup.py", "setup.cfg"}:
-                    config_files.add(fl)
-                if f == ".github":
-                    config_files.add(".github")
-            # Check for .github directory at top level
-            if depth == 0 and ".github" in dirs:
-                config_files.add("ci/cd")
+async def _clone_and_analyze_locked(repo_url: str, max_files: int, max_read_bytes: int, mode: str) -> dict:
+    if mode == "objects" and REPO_MIRROR_MAX_BYTES > 0:
+        return await _analyze_mirror(repo_url, max_files, max_read_bytes)
+    tmpdir = tempfile.mkdtemp(prefix="repo-analysis-")
+    try:
+        repo_path = os.path.join(tmpdir, "repo")
+        if mode == "objects":
+            clone_args = ["--bare", "--filter=blob:none", "--depth", "50"]
+        else:
+            clone_args = ["--depth", "50"]
+        try:
+            await _git(None, "clone", *clone_args, repo_url, repo_path, timeout=60, check=True)
+        except Exception as e:
+            return {"error": "Failed to clone: {}".format(str(e))}
+
+        if mode == "objects":
+            return await _analyze_objects(repo_path, max_files, max_read_bytes)
+        return await _analyze_checkout(repo_path, max_files, max_read_bytes)
+    finally:
+        await _in_scan_executor(shutil.rmtree, tmpdir, True)
+
+
+# ── Repo analysis cache ──
+# 같은 저장소·같은 커밋이면 결과가 같으므로 (정규화 URL, 커밋 SHA) 로 repo_analysis_cache 에 보관.
+# 조회는 `git ls-remote` 한 번(수백 ms)으로 얻은 원격 HEAD 로 하고, 적중하면 clone 을 건너뛴다.
+# 저장은 실제로 분석한 clone 의 HEAD(result["commit_sha"]) 로 한다.
+_repo_cache_stats = {"hits": 0, "misses": 0, "bypassed": 0, "unresolved": 0}
+
+
+def repo_cache_stats() -> dict:
+    total = _repo_cache_stats["hits"] + _repo_cache_stats["misses"]
+    return {**_repo_cache_stats, "hit_rate": round(_repo_cache_stats["hits"] / total, 3) if total else None}
 
-        return {
-            "file_count": file_count,
-            "total_size_kb": round(total_size / 1024, 1),
-            "languages": dict(lang_counter.most_common(10)),
-            "commit_count": len(commits),
-            "has_tests": has_tests,
-            "readme_preview": readme[:500],
-            "sample_code": "\n\n".join(sample_files)[:6000],
-            "readme_full": readme,
-            # Quality density metrics
-            "readme_length": readme_len,
-            "readme_sections": readme_sections,
-            "readme_has_code_blocks": readme_has_code_blocks,
-            "readme_has_install_guide": readme_has_install,
-            "config_files": list(config_files),
-            "config_file_count": len(config_files),
-            "max_dir_depth": max_depth,
-            "src_dir_count": len(src_dirs),
-        }
 
+def normalize_repo_url(repo_url: str) -> str:
+    """Cache key form of a repo URL: https scheme, lower-case host, no trailing '/' or '.git'.
 
-def _build_benchmark_prompt_section(benchmark: dict = None) -> str:
+    GitHub owner/repo names are case-insensitive, so github.com paths are lower-cased too.
+    """
+    url = repo_url.strip()
+    if url.startswith("git@") and ":" in url:  # git@github.com:owner/repo.git
+        host, _, path = url[4:].partition(":")
+        url = "https://{}/{}".format(host, path)
+    scheme, sep, rest = url.partition("://")
+    if not sep:
+        scheme, rest = "https", url
+    host, _, path = rest.partition("/")
+    host = host.lower()
+    path = path.rstrip("/")
+    if path.endswith(".git"):
+        path = path[:-4]
+    if host in ("github.com", "www.github.com"):
+        host, path = "github.com", path.lower()
+    return "{}://{}/{}".format(scheme.lower(), host, path)
+
+
+async def resolve_remote_head(repo_url: str) -> Optional[str]:
+    """Commit SHA of the remote HEAD via `git ls-remote`, or None if it can't be resolved."""
+    try:
+        result = await _git(None, "ls-remote", repo_url, "HEAD", timeout=20)
+    except Exception:
+        return None
+    sha = result.stdout.split(b"\t", 1)[0].strip().decode("ascii", "replace") if result.returncode == 0 else ""
+    return sha if len(sha) == 40 else None
+
+
+async def analyze_repo(repo_url: str, max_files: int = REPO_SCAN_MAX_FILES,
+                       max_read_bytes: int = REPO_SCAN_MAX_READ_BYTES, mode: Optional[str] = None,
+                       timeout: Optional[float] = None, slots: Optional[asyncio.Semaphore] = None) -> dict:
+    """Clone and analyze a repository.
+
+    ``timeout`` (seconds) turns a slow clone/scan into an error result. ``slots`` replaces the
+    candidate-analysis semaphore (REPO_ANALYSIS_CONCURRENCY) for callers with their own limit.
+    Caching is up to the caller (repo_cache_key → load_cached_analysis / save_cached_analysis)
+    so that no DB connection is held while cloning.
+    """
+    return await _clone_and_analyze(repo_url, max_files, max_read_bytes, mode or REPO_ANALYSIS_MODE,
+                                    timeout, slots)
+
+
+async def repo_cache_key(repo_url: str) -> Optional[tuple]:
+    """(normalized URL, remote HEAD SHA) for repo_analysis_cache, or None if HEAD can't be resolved."""
+    sha = await resolve_remote_head(repo_url)
+    if sha is None:
+        # ls-remote 실패(빈 저장소, 일시 오류) — 캐시 없이 분석
+        _repo_cache_stats["unresolved"] += 1
+        return None
+    return normalize_repo_url(repo_url), sha
+
+
+async def load_cached_analysis(db, cache_key: tuple, force: bool = False) -> Optional[dict]:
+    """Cached analyze_repo result for ``cache_key``; None on a miss or when ``force`` bypasses the cache."""
+    if force:
+        _repo_cache_stats["bypassed"] += 1
+        return None
+    row = await db.execute(
+        "SELECT result FROM repo_analysis_cache WHERE repo_url = ? AND commit_sha = ?", cache_key)
+    cached = await row.fetchone()
+    if not cached:
+        _repo_cache_stats["misses"] += 1
+        return None
+    _repo_cache_stats["hits"] += 1
+    await db.execute(
+        "UPDATE repo_analysis_cache SET hit_count = hit_count + 1, last_hit_at = datetime('now') "
+        "WHERE repo_url = ? AND commit_sha = ?", cache_key)
+    await db.commit()
+    return json.loads(cached["result"])
+
+
+async def save_cached_analysis(db, repo_url: str, result: dict):
+    """Upsert a fresh analyze_repo result under the commit it actually analyzed.
+
+    That is result["commit_sha"] (the clone's HEAD), not the earlier ls-remote SHA — a push
+    in between would otherwise file the newer commit's analysis under the old one.
+    Error results and results without a commit are never cached.
+    """
+    if "error" in result or not result.get("commit_sha"):
+        return
+    cache_key = (normalize_repo_url(repo_url), result["commit_sha"])
+    await db.execute(
+        "INSERT INTO repo_analysis_cache (repo_url, commit_sha, result) VALUES (?, ?, ?) "
+        "ON CONFLICT (repo_url, commit_sha) DO UPDATE SET result = excluded.result, "
+        "created_at = datetime('now'), hit_count = 0, last_hit_at = NULL",
+        (*cache_key, json.dumps(result)))
+    await db.commit()
+
+
+def _build_benchmark_prompt_section(benchmark: dict = None, percentiles: dict = None) -> str:
     """Build the benchmark comparison section for the AI prompt."""
     if not benchmark:
         return ""
     top_langs = list(benchmark.get("languages", {}).keys())[:5]
+    position = ""
+    if percentiles and percentiles.get("overall") is not None:
+        ranks = ", ".join("{} P{:.0f}".format(label, percentiles[m])
+                          for m, label in BENCHMARK_DISTRIBUTION_METRICS.items() if percentiles.get(m) is not None)
+        position = "- Candidate's position in the org distribution (percentile rank, 50 = org median): {}\n".format(ranks)
     return f"""
 **Tokamak Network Org Benchmark (last 6 months, {benchmark['repo_count']} active repos):**
 Compare the candidate's repository against these QUALITY-DENSITY metrics (not raw size/age).
@@ -424,7 +982,7 @@ Quality benchmarks from tokamak-network org:
 - Documentation: {int(benchmark.get('doc_structured_ratio', 0) * 100)}% have structured README (2+ sections), {int(benchmark.get('doc_install_ratio', 0) * 100)}% include install/setup guide, {int(benchmark.get('doc_codeblock_ratio', 0) * 100)}% have code blocks in README
 - Code Organization: avg {benchmark.get('avg_config_files', 0)} config files (linter, CI, build tools), avg {benchmark.get('avg_src_dirs', 0)} structured src directories, {int(benchmark.get('ci_ratio', 0) * 100)}% have CI/CD (.github)
 - Primary Languages: {', '.join(top_langs)}
-
+{position}
 Evaluate the candidate's repo against these quality standards, not against raw quantity metrics.
 """
 
@@ -546,7 +1104,8 @@ Return ONLY valid JSON.""".format(
         tests=repo_analysis.get('has_tests', False),
         readme=repo_analysis.get('readme_full', 'N/A')[:2000],
         sample=repo_analysis.get('sample_code', 'N/A')[:4000],
-        benchmark_section=_build_benchmark_prompt_section(benchmark),
+        benchmark_section=_build_benchmark_prompt_section(
+            benchmark, candidate_percentiles(repo_analysis, benchmark.get("distributions")) if benchmark else None),
         benchmark_fields=_build_benchmark_fields(benchmark),
     )
 
@@ -622,18 +1181,59 @@ def _fallback_scores(repo_analysis: dict) -> dict:
     }
 
 
-async def analyze_org_benchmark(org_name: str = "tokamak-network", months: int = 6, max_repos: int = 15) -> dict:
+# ── Org benchmark ──
+# 저장소별 분석을 BENCHMARK_CONCURRENCY 개까지 동시에 돌리고(후보 분석의 REPO_ANALYSIS_CONCURRENCY 슬롯과는
+# 별개라 refresh 중에도 /api/candidates/{id}/analyze 가 org clone 뒤에 줄 서지 않는다),
+# 저장소 하나가 BENCHMARK_REPO_TIMEOUT 초를 넘기면 실패로 기록한 뒤 끝난 것들로 집계한다.
+BENCHMARK_CONCURRENCY = int(os.getenv("BENCHMARK_CONCURRENCY", "4"))
+BENCHMARK_REPO_TIMEOUT = float(os.getenv("BENCHMARK_REPO_TIMEOUT", "180"))
+
+# 진행 중인 refresh 상태 — UI 가 /api/benchmark/progress 로 폴링
+_benchmark_progress = {"running": False}
+
+
+def benchmark_progress() -> dict:
+    progress = dict(_benchmark_progress)
+    if "failed" in progress:
+        progress["failed"] = list(progress["failed"])
+    return progress
+
+
+async def analyze_org_benchmark(org_name: str = "tokamak-network", months: int = 6, max_repos: int = 15,
+                                concurrency: int = BENCHMARK_CONCURRENCY,
+                                repo_timeout: float = BENCHMARK_REPO_TIMEOUT,
+                                stored: Optional[Dict[str, dict]] = None) -> dict:
     """Analyze recent active repos from a GitHub org to build a quality benchmark.
 
-    Returns a benchmark profile with average metrics across active repos.
+    Returns a benchmark profile with average metrics across the repos that could be
+    analyzed; the ones that failed or timed out are listed in ``failed_repos``.
+    ``stored`` maps repo name → previous benchmark_repo_metrics row; repos whose
+    pushed_at is unchanged reuse it instead of being cloned again. The rows behind
+    the aggregate are returned in ``repo_metrics``.
     """
-    from datetime import datetime, timedelta
-    import httpx
-
     token = os.getenv("GITHUB_TOKEN", "")
     if not token:
         return {"error": "GITHUB_TOKEN not set"}
 
+    from datetime import datetime
+    _benchmark_progress.clear()
+    _benchmark_progress.update({
+        "running": True, "org_name": org_name, "phase": "listing",
+        "total": 0, "completed": 0, "succeeded": 0, "failed": [],
+        "started_at": datetime.utcnow().isoformat(), "finished_at": None,
+    })
+    try:
+        return await _analyze_org_benchmark(org_name, months, max_repos, token, concurrency, repo_timeout, stored)
+    finally:
+        _benchmark_progress.update({"running": False, "phase": "done",
+                                    "finished_at": datetime.utcnow().isoformat()})
+
+
+async def _analyze_org_benchmark(org_name: str, months: int, max_repos: int, token: str,
+                                 concurrency: int, repo_timeout: float, stored: Optional[Dict[str, dict]]) -> dict:
+    from datetime import datetime, timedelta
+    import httpx
+
     cutoff = (datetime.utcnow() - timedelta(days=months * 30)).isoformat() + "Z"
     headers = {"Authorization": f"token {token}", "Accept": "application/vnd.github.v3+json"}
 
@@ -663,50 +1263,100 @@ async def analyze_org_benchmark(org_name: str = "tokamak-network", months: int =
     if not repos_data:
         return {"error": "No active repos found"}
 
-    # Analyze each repo
-    analyzed = []
-    for repo in repos_data:
-        clone_url = repo.get("clone_url", "")
-        if not clone_url:
-            continue
+    # Analyze repos concurrently (bounded); failures don't stop the others.
+    # pushed_at 이 저장된 행과 같으면 다시 clone 하지 않고 저장된 지표를 쓴다.
+    stored = stored or {}
+    targets = [r for r in repos_data if r.get("clone_url")]
+    progress = _benchmark_progress
+    progress.update({"phase": "analyzing", "total": len(targets), "reused": 0})
+    limit = asyncio.Semaphore(max(1, concurrency))
+    failed = []
+
+    async def analyze_one(repo):
+        previous = stored.get(repo["name"])
+        if previous and previous.get("pushed_at") == repo.get("pushed_at", ""):
+            progress["completed"] += 1
+            progress["succeeded"] += 1
+            progress["reused"] += 1
+            return dict(previous, stars=repo.get("stargazers_count", 0), description=repo.get("description", ""))
         try:
-            result = await analyze_repo(clone_url)
-            if "error" not in result:
-                result["repo_name"] = repo["name"]
-                result["pushed_at"] = repo.get("pushed_at", "")
-                result["stars"] = repo.get("stargazers_count", 0)
-                result["description"] = repo.get("description", "")
-                analyzed.append(result)
+            result = await analyze_repo(repo["clone_url"], timeout=repo_timeout, slots=limit)
         except Exception as e:
-            print(f"Benchmark: failed to analyze {repo['name']}: {e}")
-            continue
+            result = {"error": "{}: {}".format(type(e).__name__, e)}
+        progress["completed"] += 1
+        if "error" in result:
+            print(f"Benchmark: failed to analyze {repo['name']}: {result['error']}")
+            # 예전 지표가 있으면 그걸로 집계에 남긴다
+            failed.append({"name": repo["name"], "error": result["error"], "used_previous": bool(previous)})
+            progress["failed"].append(failed[-1])
+            return previous
+        progress["succeeded"] += 1
+        return benchmark_repo_metrics(result, repo)
+
+    results = await asyncio.gather(*(analyze_one(r) for r in targets))
+    metrics = [r for r in results if r is not None]  # 목록(최근 push) 순서 유지
+    progress["phase"] = "aggregating"
+
+    if not metrics:
+        return {"error": "No repos could be analyzed", "failed_repos": failed}
+
+    benchmark = aggregate_benchmark(org_name, metrics)
+    benchmark.update({
+        "requested_repo_count": len(targets),
+        "reused_repo_count": progress["reused"],
+        "failed_repos": failed,
+        "repo_metrics": metrics,
+    })
+    return benchmark
+
+
+def benchmark_repo_metrics(result: dict, repo: dict) -> dict:
+    """Per-repo benchmark row (org_benchmark_repos) from an analyze_repo result and the GitHub repo entry."""
+    from datetime import datetime
+    return {
+        "repo_name": repo["name"],
+        "pushed_at": repo.get("pushed_at", ""),
+        "stars": repo.get("stargazers_count", 0),
+        "description": repo.get("description", ""),
+        "file_count": result["file_count"],
+        "commit_count": result["commit_count"],
+        "total_size_kb": result["total_size_kb"],
+        "has_tests": bool(result.get("has_tests")),
+        "readme_sections": result.get("readme_sections", 0),
+        "readme_has_install_guide": bool(result.get("readme_has_install_guide")),
+        "readme_has_code_blocks": bool(result.get("readme_has_code_blocks")),
+        "config_file_count": result.get("config_file_count", 0),
+        "src_dir_count": result.get("src_dir_count", 0),
+        "has_ci": "ci/cd" in result.get("config_files", []),
+        "languages": result.get("languages", {}),
+        "analyzed_at": datetime.utcnow().isoformat(),
+    }
 
-    if not analyzed:
-        return {"error": "No repos could be analyzed"}
 
-    # Aggregate quality-density metrics
-    n = len(analyzed)
-    test_count = sum(1 for r in analyzed if r.get("has_tests"))
-    readme_with_sections = sum(1 for r in analyzed if r.get("readme_sections", 0) >= 2)
-    readme_with_install = sum(1 for r in analyzed if r.get("readme_has_install_guide"))
-    readme_with_code = sum(1 for r in analyzed if r.get("readme_has_code_blocks"))
-    avg_config_files = round(sum(r.get("config_file_count", 0) for r in analyzed) / n, 1)
-    avg_src_dirs = round(sum(r.get("src_dir_count", 0) for r in analyzed) / n, 1)
-    ci_count = sum(1 for r in analyzed if "ci/cd" in r.get("config_files", []))
+def aggregate_benchmark(org_name: str, metrics: list) -> dict:
+    """Org benchmark profile (averages / ratios / languages / repo_details) from per-repo metric rows."""
+    n = len(metrics)
+    test_count = sum(1 for r in metrics if r.get("has_tests"))
+    readme_with_sections = sum(1 for r in metrics if r.get("readme_sections", 0) >= 2)
+    readme_with_install = sum(1 for r in metrics if r.get("readme_has_install_guide"))
+    readme_with_code = sum(1 for r in metrics if r.get("readme_has_code_blocks"))
+    avg_config_files = round(sum(r.get("config_file_count", 0) for r in metrics) / n, 1)
+    avg_src_dirs = round(sum(r.get("src_dir_count", 0) for r in metrics) / n, 1)
+    ci_count = sum(1 for r in metrics if r.get("has_ci"))
 
     # Aggregate language distribution
     lang_counter = Counter()
-    for r in analyzed:
+    for r in metrics:
         for lang, count in r.get("languages", {}).items():
             lang_counter[lang] += count
 
     repo_summaries = []
-    for r in analyzed:
+    for r in metrics:
         repo_summaries.append({
             "name": r["repo_name"],
-            "has_tests": r.get("has_tests", False),
+            "has_tests": bool(r.get("has_tests", False)),
             "readme_sections": r.get("readme_sections", 0),
-            "readme_has_install_guide": r.get("readme_has_install_guide", False),
+            "readme_has_install_guide": bool(r.get("readme_has_install_guide", False)),
             "config_file_count": r.get("config_file_count", 0),
             "src_dir_count": r.get("src_dir_count", 0),
             "languages": list(r.get("languages", {}).keys())[:5],
@@ -714,12 +1364,12 @@ async def analyze_org_benchmark(org_name: str = "tokamak-network", months: int =
             "description": r.get("description", ""),
         })
 
-    benchmark = {
+    return {
         "org_name": org_name,
         "repo_count": n,
-        "avg_file_count": round(sum(r["file_count"] for r in analyzed) / n, 1),
-        "avg_commit_count": round(sum(r["commit_count"] for r in analyzed) / n, 1),
-        "avg_size_kb": round(sum(r["total_size_kb"] for r in analyzed) / n, 1),
+        "avg_file_count": round(sum(r["file_count"] for r in metrics) / n, 1),
+        "avg_commit_count": round(sum(r["commit_count"] for r in metrics) / n, 1),
+        "avg_size_kb": round(sum(r["total_size_kb"] for r in metrics) / n, 1),
         "test_ratio": round(test_count / n, 2),
         # New quality-density metrics
         "doc_structured_ratio": round(readme_with_sections / n, 2),
@@ -730,8 +1380,67 @@ async def analyze_org_benchmark(org_name: str = "tokamak-network", months: int =
         "ci_ratio": round(ci_count / n, 2),
         "languages": dict(lang_counter.most_common(10)),
         "repo_details": repo_summaries,
+        "distributions": benchmark_distributions(metrics),
     }
-    return benchmark
+
+
+# ── Benchmark distributions / percentile ranks ──
+# 평균만으로는 후보가 조직 분포의 어디쯤인지 알 수 없으므로 지표별 값 전체를 정렬된 배열로 둔다.
+# 후보 여러 명은 지표마다 값을 정렬해 분포와 한 번에 병합하며 순위를 매긴다 (O((n + m) log n)).
+BENCHMARK_DISTRIBUTION_METRICS = {
+    "file_count": "files",
+    "commit_count": "commits",
+    "total_size_kb": "size",
+    "readme_sections": "README sections",
+    "config_file_count": "config files",
+    "src_dir_count": "src dirs",
+}
+
+
+def benchmark_distributions(metrics: list) -> Dict[str, list]:
+    """Sorted per-metric value arrays across benchmark repos."""
+    return {
+        m: sorted(float(r[m]) for r in metrics if isinstance(r.get(m), (int, float)))
+        for m in BENCHMARK_DISTRIBUTION_METRICS
+    }
+
+
+def percentile_ranks(values: list, distribution: list) -> list:
+    """Mid-rank percentiles (0-100) of many values against one sorted distribution, in one merge pass.
+
+    Non-numeric values (and an empty distribution) give None.
+    """
+    n = len(distribution)
+    ranks = [None] * len(values)
+    if not n:
+        return ranks
+    below = at_or_below = 0
+    for value, i in sorted((v, i) for i, v in enumerate(values) if isinstance(v, (int, float))):
+        while below < n and distribution[below] < value:
+            below += 1
+        while at_or_below < n and distribution[at_or_below] <= value:
+            at_or_below += 1
+        ranks[i] = round((below + at_or_below) * 50 / n, 1)
+    return ranks
+
+
+def rank_candidates(analyses: list, distributions: Optional[Dict[str, list]]) -> list:
+    """Percentile ranks of every repo_analysis in ``analyses``: [{metric: pct | None, "overall": mean}]."""
+    ranked = [{} for _ in analyses]
+    if not distributions:
+        return ranked
+    for metric in BENCHMARK_DISTRIBUTION_METRICS:
+        column = percentile_ranks([a.get(metric) for a in analyses], distributions.get(metric, []))
+        for row, pct in zip(ranked, column):
+            row[metric] = pct
+    for row in ranked:
+        known = [v for v in row.values() if v is not None]
+        row["overall"] = round(sum(known) / len(known), 1) if known else None
+    return ranked
+
+
+def candidate_percentiles(repo_analysis: dict, distributions: Optional[Dict[str, list]]) -> dict:
+    return rank_candidates([repo_analysis], distributions)[0]
 
 
 async def analyze_github_profile(g, username: str) -> dict:
@@ -0,0 +1,68 @@
+"""
+거래처 분류 벤치마크 — match_counterparty (규칙 × 거래 부분문자열 검사) vs CounterpartyMatcher.
+
+규칙 R개, 거래 N건(상대방 이름은 고유 — memo 효과 배제)을 만들어
+컴파일 시간과 분류 시간을 재고, 표본에서 두 결과가 같은지 확인한다.
+기존 방식은 오래 걸리므로 앞쪽 SAMPLE 건만 돌려 전체 시간을 추정한다.
+
+    cd backend && python benchmarks/classifier_matcher.py [N] [R] [SAMPLE]
+"""
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from accounting.classifier import CounterpartyMatcher, classify_transactions, match_counterparty  # noqa: E402
+
+
+def _word(rng, lo=4, hi=10):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(lo, hi)))
+
+
+def make_data(n_tx, n_rules, seed=42):
+    rng = random.Random(seed)
+    patterns = list({_word(rng, 5, 12) for _ in range(n_rules * 2)})[:n_rules]
+    rules = [{"pattern": p.title(), "account_code": f"6{i:04d}", "residence": None, "wht_flag": 0}
+             for i, p in enumerate(patterns)]
+    suffixes = ["Pte Ltd", "Inc", "GmbH", "Ltd", "LLC", "Co., Ltd."]
+    transactions = []
+    for i in range(n_tx):
+        name = f"{_word(rng).title()} {_word(rng).title()} {rng.choice(suffixes)} #{i}"
+        if rng.random() < 0.4:  # 40% 는 어떤 규칙 패턴을 포함
+            name = f"{rng.choice(patterns).upper()} {name}"
+        transactions.append({"id": i, "counterparty": name, "amount": 100.0})
+    return rules, transactions
+
+
+def run(n_tx=100_000, n_rules=2_000, sample=2_000):
+    rules, transactions = make_data(n_tx, n_rules)
+
+    started = time.perf_counter()
+    matcher = CounterpartyMatcher(rules)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    result = classify_transactions(transactions, rules, matcher=matcher)
+    matcher_s = time.perf_counter() - started
+
+    head = transactions[:sample]
+    started = time.perf_counter()
+    naive = [match_counterparty(tx["counterparty"], rules) for tx in head]
+    naive_s = (time.perf_counter() - started) * n_tx / len(head)
+
+    fresh = CounterpartyMatcher(rules)
+    mismatches = sum(1 for tx, want in zip(head, naive) if fresh.match(tx["counterparty"]) is not want)
+
+    print(f"transactions={n_tx} rules={n_rules} states={len(matcher._goto)}")
+    print(f"  compile              {build_ms:10.1f} ms")
+    print(f"  matcher classify     {matcher_s * 1000:10.1f} ms   ({result['stats']['auto']} classified)")
+    print(f"  naive (extrapolated) {naive_s * 1000:10.1f} ms   (from {len(head)} rows)")
+    print(f"  speedup              {naive_s / matcher_s:10.1f}x   mismatches on sample: {mismatches}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    run(*args)
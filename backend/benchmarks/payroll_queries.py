@@ -0,0 +1,61 @@
+"""
+list_payroll 쿼리 수 벤치마크 — 멤버 수가 늘어도 쿼리 수는 일정해야 한다.
+
+임시 SQLite DB 에 멤버 N명 × 12개월 급여/경비를 넣고 /api/hr/payroll (연간) 을 호출해
+db.query_stats() 로 실행된 문장 수와 소요 시간을 센다.
+
+    cd backend && python benchmarks/payroll_queries.py [N ...]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+
+
+async def _seed(conn, members, year):
+    await conn.bulk_insert(
+        "hr_members", ("name", "role", "monthly_usdt"),
+        [(f"member-{i:05d}", "dev", 1000 + i) for i in range(members)])
+    rows = await conn.execute("SELECT id, monthly_usdt FROM hr_members")
+    ids = [(r["id"], r["monthly_usdt"]) for r in await rows.fetchall()]
+    await conn.bulk_insert(
+        "payrolls", ("member_id", "year", "month", "usdt_amount", "krw_rate", "krw_amount", "status"),
+        [(mid, year, m, usdt, 1400, usdt * 1400, "paid") for mid, usdt in ids for m in range(1, 13)])
+    await conn.bulk_insert(
+        "expenses", ("member_id", "year", "month", "amount_usdt", "category", "status"),
+        [(mid, year, m, round(random.uniform(10, 200), 2), "기타", "paid")
+         for mid, _ in ids for m in range(1, 13) if random.random() < 0.3])
+    await conn.commit()
+
+
+async def run(member_counts, year=2026):
+    import main  # 핸들러를 직접 호출
+
+    print(f"{'members':>8} {'rows':>7} {'queries':>8} {'ms':>9}")
+    for n in member_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            db.DB_PATH = os.path.join(tmp, "bench.db")
+            conn = await db.get_db()
+            await run_migrations(conn._conn, "sqlite")
+            await conn.execute("DELETE FROM payrolls")
+            await conn.execute("DELETE FROM hr_members")
+            await _seed(conn, n, year)
+
+            db.reset_query_stats()
+            started = time.perf_counter()
+            result = await main.list_payroll(year=year, month=None, db=conn)
+            elapsed = (time.perf_counter() - started) * 1000
+            queries = sum(s["count"] for s in db.query_stats()["statements"])
+            print(f"{n:>8} {len(result):>7} {queries:>8} {elapsed:>9.1f}")
+
+
+if __name__ == "__main__":
+    counts = [int(a) for a in sys.argv[1:]] or [10, 100, 1000]
+    asyncio.run(run(counts))
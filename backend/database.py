@@ -1,8 +1,13 @@
 import aiosqlite
+import asyncio
 import os
 import json
+import gzip
+import time
 import shutil
 import glob
+import logging
+import sqlite3
 from datetime import datetime
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "hiring.db")
@@ -10,19 +15,87 @@ DB_PATH = os.path.join(os.path.dirname(__file__), "hiring.db")
 BACKUP_DIR = os.path.join(os.path.dirname(__file__), "backups")
 
 
-def backup_db():
-    """Create a timestamped backup. Keeps last 10 backups."""
+BACKUP_KEEP = int(os.getenv("DB_BACKUP_KEEP", "10"))
+BACKUP_COMPRESS = os.getenv("DB_BACKUP_COMPRESS", "1") == "1"
+BACKUP_INTERVAL_HOURS = float(os.getenv("DB_BACKUP_INTERVAL_HOURS", "24"))
+BACKUP_PAGES_PER_STEP = int(os.getenv("DB_BACKUP_PAGES_PER_STEP", "256"))
+
+logger = logging.getLogger("backup")
+
+_last_backup = {}
+
+
+def backup_db(compress=None):
+    """Online backup of the live DB. Keeps the last BACKUP_KEEP generations.
+
+    Uses the sqlite3 backup API in BACKUP_PAGES_PER_STEP page steps, so WAL
+    contents are included and other connections are only paused briefly
+    between steps. Optionally gzips the result.
+    """
     if not os.path.exists(DB_PATH):
-        return
+        return None
+    if compress is None:
+        compress = BACKUP_COMPRESS
     os.makedirs(BACKUP_DIR, exist_ok=True)
+    started = time.perf_counter()
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
     dest = os.path.join(BACKUP_DIR, f"hiring_{ts}.db")
-    shutil.copy2(DB_PATH, dest)
-    # Prune old backups, keep last 10
-    backups = sorted(glob.glob(os.path.join(BACKUP_DIR, "hiring_*.db")))
-    for old in backups[:-10]:
+    tmp = dest + ".tmp"
+
+    src = sqlite3.connect(DB_PATH, timeout=10)
+    dst = sqlite3.connect(tmp)
+    try:
+        src.backup(dst, pages=BACKUP_PAGES_PER_STEP, sleep=0.005)
+        pages = dst.execute("PRAGMA page_count").fetchone()[0]
+    finally:
+        dst.close()
+        src.close()
+
+    if compress:
+        dest += ".gz"
+        with open(tmp, "rb") as f_in, gzip.open(dest, "wb", compresslevel=6) as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.remove(tmp)
+    else:
+        os.replace(tmp, dest)
+
+    # Prune old backups (.db / .db.gz 공통), keep last BACKUP_KEEP
+    backups = sorted(glob.glob(os.path.join(BACKUP_DIR, "hiring_*.db")) +
+                     glob.glob(os.path.join(BACKUP_DIR, "hiring_*.db.gz")),
+                     key=os.path.basename)
+    for old in backups[:-BACKUP_KEEP]:
         os.remove(old)
 
+    _last_backup.pop("error", None)  # 이번 성공으로 지난 실패는 해소됨
+    _last_backup.pop("error_at", None)
+    _last_backup.update({
+        "path": dest,
+        "at": datetime.now().isoformat(timespec="seconds"),
+        "pages": pages,
+        "bytes_written": os.path.getsize(dest),
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        "compressed": compress,
+        "generations": min(len(backups), BACKUP_KEEP),
+    })
+    logger.info("DB backup %s (%d bytes, %.1f ms)", dest, _last_backup["bytes_written"], _last_backup["duration_ms"])
+    return dict(_last_backup)
+
+
+async def backup_loop():
+    """Background backup job — runs off the event loop every BACKUP_INTERVAL_HOURS."""
+    while True:
+        try:
+            await asyncio.to_thread(backup_db)
+        except Exception as e:
+            _last_backup["error"] = str(e)
+            _last_backup["error_at"] = datetime.now().isoformat(timespec="seconds")
+            logger.error("DB backup failed: %s", e)
+        await asyncio.sleep(BACKUP_INTERVAL_HOURS * 3600)
+
+
+def backup_stats():
+    return dict(_last_backup)
+
 
 async def get_db():
     db = await aiosqlite.connect(DB_PATH)
@@ -31,9 +104,11 @@ async def get_db():
     await db.execute("PRAGMA busy_timeout=5000")
     return db
 
-async def init_db():
-    backup_db()
-    db = await get_db()
+async def create_schema(db):
+    """Baseline SQLite schema + seed data (migration v0, see migrations.py).
+
+    Runs once per database; later boots skip it via schema_version.
+    """
     await db.executescript("""
     CREATE TABLE IF NOT EXISTS candidates (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -408,4 +483,3 @@ async def init_db():
         pass
 
     await db.commit()
-    await db.close()
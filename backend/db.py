@@ -4,10 +4,20 @@ Automatically selects based on DATABASE_URL env var.
 """
 import os
 import re
+import time
+import asyncio
+import collections
+import contextlib
+import functools
+import itertools
+import logging
+from datetime import datetime
 import asyncpg
 import aiosqlite
 from dotenv import load_dotenv
 
+from migrations import run_migrations, pending_migrations, LATEST_VERSION
+
 load_dotenv()
 # 로컬 개발 override — .env 다음에 backend/.env.local 을 적용(로컬 기본값).
 # 단, 환경에 DATABASE_URL 이 이미 주어진 경우(run-cloud.sh 인라인 주입 / 운영 플랫폼 env)
@@ -62,27 +72,179 @@ if USE_PG and not _is_local_host(DATABASE_URL):
         raise RuntimeError(f"Refusing to use non-local DATABASE_URL (host={_host}) without ALLOW_PROD_DB=1")
     sys.stderr.write(f"\n  ⚠️ ALLOW_PROD_DB=1 — 비로컬 DB(host={_host})에 연결합니다.\n\n")
 
-_pg_pool = None
-
+# Connection pool settings (shared by the asyncpg pool and the SQLite pool).
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))  # seconds before an idle connection is closed
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "10"))  # seconds
 
-def _sqlite_to_pg_params(sql, params):
-    """Convert SQLite ? placeholders to PostgreSQL $1, $2, ... format."""
-    if not params:
-        return sql, params
-
-    counter = [0]
-    def replace_placeholder(match):
-        counter[0] += 1
-        return f"${counter[0]}"
+_pg_pool = None
+_sqlite_pool = None
+_pool_counters = {"acquired": 0, "released": 0, "timeouts": 0}
+
+
+_PLACEHOLDER_RE = re.compile(r"\?")
+_INSERT_TABLE_RE = re.compile(r'\s*INSERT\s+INTO\s+([\w."]+)', re.IGNORECASE)
+
+# 핸들러가 쓰는 SQL 문자열은 수백 개 수준 — 원문 기준으로 변환 결과를 캐시한다.
+SQL_TRANSLATION_CACHE_SIZE = int(os.getenv("DB_SQL_CACHE_SIZE", "1024"))
+
+
+@functools.lru_cache(maxsize=SQL_TRANSLATION_CACHE_SIZE)
+def _translate_sql(sql):
+    """SQLite-dialect SQL → (PostgreSQL SQL, statement kind, insert target table).
+
+    kind is one of "fetch" (SELECT/WITH → conn.fetch), "returning"
+    (write with RETURNING clause), "insert" (plain INSERT — an ``id`` can be
+    returned in the same round-trip) or "execute" (other writes/DDL).
+    Pure function of the SQL text, so results are memoised by lru_cache.
+    """
+    counter = itertools.count(1)
+    converted = _PLACEHOLDER_RE.sub(lambda _m: f"${next(counter)}", sql)
+    # Handle datetime('now') → NOW()
+    converted = converted.replace("datetime('now')", "NOW()::TEXT")
+
+    head = converted.lstrip()[:6].upper()
+    table = None
+    if head.startswith("SELECT") or head.startswith("WITH"):
+        kind = "fetch"
+    elif "RETURNING" in converted.upper():
+        kind = "returning"
+    elif head == "INSERT":
+        kind = "insert"
+        m = _INSERT_TABLE_RE.match(converted)
+        table = m.group(1).strip('"').split(".")[-1].lower() if m else None
+    else:
+        kind = "execute"
+    return converted, kind, table
 
-    converted = re.sub(r'\?', replace_placeholder, sql)
-    return converted, list(params)
+
+def _bulk_insert_sql(table, columns):
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+
+
+def now_text():
+    """Current UTC time in SQLite datetime('now') format, for bulk-loaded rows."""
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+
+@functools.lru_cache(maxsize=SQL_TRANSLATION_CACHE_SIZE)
+def _returning_id(pg_sql):
+    return pg_sql.rstrip().rstrip(";") + " RETURNING id"
+
+
+def sql_cache_stats() -> dict:
+    """Hit/miss counters of the SQL translation cache (PostgreSQL path only)."""
+    info = _translate_sql.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
+
+
+# ── Query timing / slow-query log ──
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+DB_QUERY_SAMPLES = int(os.getenv("DB_QUERY_SAMPLES", "256"))  # p50/p95 는 문장별 최근 N건 기준
+_MAX_TRACKED_STATEMENTS = 2000
+
+logger = logging.getLogger("db")
+
+_WS_RE = re.compile(r"\s+")
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+_query_stats = {}  # normalized SQL → {"count", "total_ms", "max_ms", "samples"}
+_slow_queries = collections.deque(maxlen=100)
+
+
+@functools.lru_cache(maxsize=SQL_TRANSLATION_CACHE_SIZE)
+def _normalize_sql(sql):
+    return _WS_RE.sub(" ", sql).strip()
+
+
+def _redact(params):
+    """Parameter values never reach the log — only their type (and length for strings)."""
+    out = []
+    for p in params or ():
+        if p is None:
+            out.append(None)
+        elif isinstance(p, (str, bytes)):
+            out.append(f"<{type(p).__name__}:{len(p)}>")
+        else:
+            out.append(f"<{type(p).__name__}>")
+    return out
+
+
+def _record_query(sql, elapsed_ms):
+    key = _normalize_sql(sql)
+    st = _query_stats.get(key)
+    if st is None:
+        if len(_query_stats) >= _MAX_TRACKED_STATEMENTS:
+            key = "(other)"
+            st = _query_stats.get(key)
+        if st is None:
+            st = _query_stats[key] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                                      "samples": collections.deque(maxlen=DB_QUERY_SAMPLES)}
+    st["count"] += 1
+    st["total_ms"] += elapsed_ms
+    st["samples"].append(elapsed_ms)
+    if elapsed_ms > st["max_ms"]:
+        st["max_ms"] = elapsed_ms
+    return key
+
+
+async def _timed(sql, params, run, explain):
+    """Run ``run()`` and account its wall time under the normalized SQL.
+
+    Over DB_SLOW_QUERY_MS the statement is logged with redacted params and
+    the plan from ``explain()`` (EXPLAIN / EXPLAIN QUERY PLAN).
+    """
+    started = time.perf_counter()
+    result = await run()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    key = _record_query(sql, elapsed_ms)
+    if elapsed_ms >= DB_SLOW_QUERY_MS:
+        plan = None
+        if explain is not None and sql.lstrip()[:6].upper().startswith(_EXPLAINABLE):
+            try:
+                plan = await explain()
+            except Exception as e:
+                plan = f"(explain failed: {e})"
+        entry = {"sql": key, "params": _redact(params), "ms": round(elapsed_ms, 1),
+                 "plan": plan, "at": datetime.utcnow().isoformat(timespec="seconds")}
+        _slow_queries.append(entry)
+        logger.warning("slow query %.1f ms: %s params=%s\n%s", elapsed_ms, key, entry["params"], plan)
+    return result
+
+
+def _percentile(sorted_samples, q):
+    return sorted_samples[min(len(sorted_samples) - 1, int(round(q * (len(sorted_samples) - 1))))]
+
+
+def query_stats(limit=100) -> dict:
+    """Per-statement timing table (slowest total first) plus the recent slow-query log."""
+    rows = []
+    for sql, st in _query_stats.items():
+        samples = sorted(st["samples"])
+        rows.append({
+            "sql": sql,
+            "count": st["count"],
+            "total_ms": round(st["total_ms"], 1),
+            "avg_ms": round(st["total_ms"] / st["count"], 2),
+            "p50_ms": round(_percentile(samples, 0.50), 2),
+            "p95_ms": round(_percentile(samples, 0.95), 2),
+            "max_ms": round(st["max_ms"], 2),
+        })
+    rows.sort(key=lambda r: r["total_ms"], reverse=True)
+    return {"slow_threshold_ms": DB_SLOW_QUERY_MS, "statements": rows[:limit],
+            "tracked": len(rows), "slow_queries": list(_slow_queries)}
+
+
+def reset_query_stats():
+    _query_stats.clear()
+    _slow_queries.clear()
 
 
 class PgCursorWrapper:
     """Wraps asyncpg results to behave like aiosqlite cursor."""
-    def __init__(self, rows):
+    def __init__(self, rows, lastrowid=None):
         self._rows = rows
+        self.lastrowid = lastrowid
 
     async def fetchone(self):
         if self._rows and len(self._rows) > 0:
@@ -93,40 +255,77 @@ class PgCursorWrapper:
         return [dict(r) for r in self._rows]
 
 
+# table name → has an ``id`` column (looked up once per process).
+_tables_with_id = {}
+
+
 class PgConnectionWrapper:
     """Wraps asyncpg connection to match aiosqlite interface."""
-    def __init__(self, conn):
+    def __init__(self, conn, pool=None):
         self._conn = conn
+        self._pool = pool
         self.total_changes = 0
 
-    async def execute(self, sql, params=None):
-        sql, params = _sqlite_to_pg_params(sql, params or ())
-        # Handle datetime('now') → NOW()
-        sql = sql.replace("datetime('now')", "NOW()::TEXT")
+    async def _has_id_column(self, table):
+        if table not in _tables_with_id:
+            _tables_with_id[table] = await self._conn.fetchval(
+                "SELECT EXISTS (SELECT 1 FROM information_schema.columns "
+                "WHERE table_name = $1 AND column_name = 'id')", table)
+        return _tables_with_id[table]
 
-        try:
-            if sql.strip().upper().startswith("SELECT"):
-                rows = await self._conn.fetch(sql, *params)
-                return PgCursorWrapper(rows)
-            else:
-                result = await self._conn.execute(sql, *params)
-                # Extract affected rows count
-                if result:
-                    try:
-                        self.total_changes = int(result.split()[-1])
-                    except:
-                        self.total_changes = 0
-
-                # For INSERT ... RETURNING, return cursor-like
-                if "RETURNING" in sql.upper():
-                    rows = await self._conn.fetch(sql, *params)
-                    return PgCursorWrapper(rows)
-
-                # Simulate lastrowid for INSERT
-                cursor = type('Cursor', (), {'lastrowid': 0})()
-                return cursor
-        except Exception as e:
-            raise e
+    async def execute(self, sql, params=None):
+        # 한 번만 변환 — sql_cache 적중률이 문장당 한 번으로 집계되게
+        pg_sql, kind, table = _translate_sql(sql)
+        params = list(params or ())
+
+        async def explain():
+            rows = await self._conn.fetch("EXPLAIN " + pg_sql, *params)
+            return "\n".join(r[0] for r in rows)
+
+        return await _timed(sql, params, lambda: self._execute(pg_sql, kind, table, params), explain)
+
+    async def _execute(self, sql, kind, table, params):
+
+        if kind == "fetch":
+            rows = await self._conn.fetch(sql, *params)
+            return PgCursorWrapper(rows)
+
+        # INSERT ... RETURNING: one round-trip, rows come back with the write.
+        if kind == "returning":
+            rows = await self._conn.fetch(sql, *params)
+            self.total_changes = len(rows)
+            lastrowid = rows[-1]["id"] if rows and "id" in rows[-1].keys() else None
+            return PgCursorWrapper(rows, lastrowid=lastrowid)
+
+        # Plain INSERT: append RETURNING id so lastrowid is real, like SQLite's.
+        if kind == "insert" and table and await self._has_id_column(table):
+            rows = await self._conn.fetch(_returning_id(sql), *params)
+            self.total_changes = len(rows)
+            return PgCursorWrapper([], lastrowid=rows[-1]["id"] if rows else None)
+
+        result = await self._conn.execute(sql, *params)
+        # Extract affected rows count
+        if result:
+            try:
+                self.total_changes = int(result.split()[-1])
+            except:
+                self.total_changes = 0
+        return PgCursorWrapper([], lastrowid=None)
+
+    async def executemany(self, sql, seq_of_params):
+        """Run one statement for many parameter sets in a single pipelined batch."""
+        pg_sql = _translate_sql(sql)[0]
+        args = [list(p) for p in seq_of_params]
+        await _timed(sql, (), lambda: self._conn.executemany(pg_sql, args), None)
+
+    async def bulk_insert(self, table, columns, rows):
+        """Load many rows via COPY (copy_records_to_table) — one round-trip."""
+        rows = [tuple(r) for r in rows]
+        if rows:
+            await _timed(f"COPY {table} ({', '.join(columns)})", (),
+                         lambda: self._conn.copy_records_to_table(table, records=rows, columns=list(columns)),
+                         None)
+        return len(rows)
 
     async def executescript(self, sql):
         """Execute multiple statements (PostgreSQL)."""
@@ -139,51 +338,315 @@ class PgConnectionWrapper:
                     pass  # Skip errors for CREATE IF NOT EXISTS etc.
 
     async def commit(self):
-        pass  # asyncpg auto-commits in pooler mode
+        pass  # asyncpg auto-commits in pooler mode; use transaction() to group writes
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        """``async with db.transaction():`` — one BEGIN/COMMIT for the whole block.
+
+        Rolls back if the block raises. Nested blocks become savepoints.
+        """
+        async with self._conn.transaction():
+            yield self
+
+    async def close(self):
+        """Release back to the pool (or close if unpooled). Safe to call twice."""
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        if self._pool is not None:
+            await self._pool.release(conn)
+            _pool_counters["released"] += 1
+        else:
+            await conn.close()
+
+
+async def _sqlite_connect():
+    db = await aiosqlite.connect(DB_PATH)
+    db.row_factory = aiosqlite.Row
+    await db.execute("PRAGMA journal_mode=WAL")
+    await db.execute("PRAGMA busy_timeout=5000")
+    return db
+
+
+class SqlitePool:
+    """Small reusable pool of aiosqlite connections.
+
+    Each aiosqlite connection owns a worker thread, so opening one per request
+    costs a thread spawn plus the PRAGMA round-trips. Idle connections are kept
+    (LIFO) and closed once they sit unused longer than ``max_idle`` seconds.
+    """
+    def __init__(self, max_size, max_idle, acquire_timeout):
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.acquire_timeout = acquire_timeout
+        self._slots = asyncio.Semaphore(max_size)
+        self._idle = []  # [(conn, last_used_monotonic)]
+        self._size = 0
+
+    async def acquire(self):
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            _pool_counters["timeouts"] += 1
+            raise
+        try:
+            await self._prune_idle()
+            if self._idle:
+                conn, _ = self._idle.pop()
+            else:
+                conn = await _sqlite_connect()
+                self._size += 1
+        except Exception:
+            self._slots.release()
+            raise
+        return conn
+
+    async def release(self, conn):
+        try:
+            if conn.in_transaction:
+                await conn.rollback()  # uncommitted work never leaks into the next request
+            self._idle.append((conn, time.monotonic()))
+        except Exception:
+            self._size -= 1
+            try:
+                await conn.close()
+            except Exception:
+                pass
+        finally:
+            self._slots.release()
+
+    async def _prune_idle(self):
+        cutoff = time.monotonic() - self.max_idle
+        while self._idle and self._idle[0][1] < cutoff:
+            conn, _ = self._idle.pop(0)
+            self._size -= 1
+            try:
+                await conn.close()
+            except Exception:
+                pass
+
+    async def close(self):
+        while self._idle:
+            conn, _ = self._idle.pop()
+            self._size -= 1
+            await conn.close()
+
+    def stats(self) -> dict:
+        return {"size": self._size, "idle": len(self._idle), "max_size": self.max_size}
+
+
+class SqliteCursorWrapper:
+    """aiosqlite cursor results read inside the timed call (rows stay sqlite3.Row)."""
+    def __init__(self, rows, lastrowid=None, rowcount=-1):
+        self._rows = rows
+        self._pos = 0
+        self.lastrowid = lastrowid
+        self.rowcount = rowcount
+
+    async def fetchone(self):
+        if self._pos >= len(self._rows):
+            return None
+        self._pos += 1
+        return self._rows[self._pos - 1]
+
+    async def fetchall(self):
+        rows, self._pos = self._rows[self._pos:], len(self._rows)
+        return rows
+
+    async def close(self):
+        pass
+
+
+class SqliteConnectionWrapper:
+    """aiosqlite connection with the bulk helpers of PgConnectionWrapper.
+
+    When pooled, close() hands the connection back to the pool.
+    """
+    def __init__(self, conn, pool=None):
+        self._conn = conn
+        self._pool = pool
+        self._tx_depth = 0
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    async def execute(self, sql, params=None):
+        async def explain():
+            cur = await self._conn.execute("EXPLAIN QUERY PLAN " + sql, params or ())
+            return "\n".join(r[3] for r in await cur.fetchall())
+
+        async def run():
+            # SQLite 는 SELECT 비용 대부분이 커서 스텝이므로 행까지 읽은 뒤에 시간을 잰다 (PG 의 fetch 와 같게)
+            cur = await self._conn.execute(sql, params)
+            rows = await cur.fetchall() if cur.description is not None else []
+            return SqliteCursorWrapper(rows, cur.lastrowid, cur.rowcount)
+
+        return await _timed(sql, params, run, explain)
+
+    async def executemany(self, sql, seq_of_params):
+        return await _timed(sql, (), lambda: self._conn.executemany(sql, seq_of_params), None)
+
+    async def commit(self):
+        # transaction() 블록 안에서는 블록 종료 시 한 번만 커밋
+        if not self._tx_depth:
+            await self._conn.commit()
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        """``async with db.transaction():`` — one BEGIN/COMMIT for the whole block.
+
+        Rolls back if the block raises. commit() calls inside the block are
+        deferred to its end; nested blocks join the outer one.
+        """
+        if self._tx_depth:
+            self._tx_depth += 1
+            try:
+                yield self
+            finally:
+                self._tx_depth -= 1
+            return
+        if not self._conn.in_transaction:
+            # IMMEDIATE: 쓰기 락을 먼저 잡아 중간에 SQLITE_BUSY 로 실패하지 않도록
+            await self._conn.execute("BEGIN IMMEDIATE")
+        self._tx_depth = 1
+        try:
+            yield self
+        except BaseException:
+            self._tx_depth = 0
+            await self._conn.rollback()
+            raise
+        self._tx_depth = 0
+        await self._conn.commit()
+
+    async def bulk_insert(self, table, columns, rows):
+        """Insert many rows with one prepared statement (executemany)."""
+        rows = [tuple(r) for r in rows]
+        if rows:
+            await self.executemany(_bulk_insert_sql(table, columns), rows)
+        return len(rows)
 
     async def close(self):
-        await self._conn.close()
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        if self._pool is None:
+            await conn.close()
+            return
+        await self._pool.release(conn)
+        _pool_counters["released"] += 1
+
+
+async def init_pool():
+    """Create the process-wide connection pool. Called from the FastAPI lifespan."""
+    global _pg_pool, _sqlite_pool
+    if USE_PG:
+        if _pg_pool is None:
+            _pg_pool = await asyncpg.create_pool(
+                DATABASE_URL,
+                min_size=DB_POOL_MIN_SIZE,
+                max_size=DB_POOL_MAX_SIZE,
+                max_inactive_connection_lifetime=DB_POOL_MAX_IDLE,
+                statement_cache_size=0,
+            )
+    elif _sqlite_pool is None:
+        _sqlite_pool = SqlitePool(DB_POOL_MAX_SIZE, DB_POOL_MAX_IDLE, DB_POOL_ACQUIRE_TIMEOUT)
+
+
+async def close_pool():
+    global _pg_pool, _sqlite_pool
+    if _pg_pool is not None:
+        await _pg_pool.close()
+        _pg_pool = None
+    if _sqlite_pool is not None:
+        await _sqlite_pool.close()
+        _sqlite_pool = None
+
+
+def pool_stats() -> dict:
+    """Pool occupancy + counters for /api/health."""
+    if _pg_pool is not None:
+        size, idle = _pg_pool.get_size(), _pg_pool.get_idle_size()
+        stats = {"size": size, "idle": idle, "max_size": _pg_pool.get_max_size()}
+    elif _sqlite_pool is not None:
+        stats = _sqlite_pool.stats()
+    else:
+        return {"enabled": False}
+    in_use = _pool_counters["acquired"] - _pool_counters["released"]
+    return {"enabled": True, **stats, "in_use": in_use, **_pool_counters,
+            "max_idle": DB_POOL_MAX_IDLE, "acquire_timeout": DB_POOL_ACQUIRE_TIMEOUT}
 
 
 async def get_db():
-    """Get a database connection. Returns aiosqlite or PgConnectionWrapper."""
+    """Get a database connection. Returns aiosqlite or PgConnectionWrapper.
+
+    With the pool initialised the connection is borrowed; close() returns it.
+    Without a pool (scripts, tests) a dedicated connection is opened as before.
+    """
     if USE_PG:
+        if _pg_pool is not None:
+            try:
+                conn = await _pg_pool.acquire(timeout=DB_POOL_ACQUIRE_TIMEOUT)
+            except asyncio.TimeoutError:
+                _pool_counters["timeouts"] += 1
+                raise
+            _pool_counters["acquired"] += 1
+            return PgConnectionWrapper(conn, pool=_pg_pool)
         conn = await asyncpg.connect(DATABASE_URL, statement_cache_size=0)
         return PgConnectionWrapper(conn)
-    else:
-        db = await aiosqlite.connect(DB_PATH)
-        db.row_factory = aiosqlite.Row
-        await db.execute("PRAGMA journal_mode=WAL")
-        await db.execute("PRAGMA busy_timeout=5000")
-        return db
+    if _sqlite_pool is not None:
+        conn = await _sqlite_pool.acquire()
+        _pool_counters["acquired"] += 1
+        return SqliteConnectionWrapper(conn, _sqlite_pool)
+    return SqliteConnectionWrapper(await _sqlite_connect())
+
+
+async def db_session():
+    """FastAPI dependency — one pooled connection per request, always released.
+
+    Handlers may still call ``await db.close()`` to hand the connection back
+    early (before PDF/Excel rendering etc.); the second release is a no-op.
+    """
+    db = await get_db()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+_startup = {}
 
 
 async def _pg_migrate():
-    """Idempotent additive migrations for PostgreSQL/Supabase.
-    Adds columns only — never touches RLS (default-deny stays as-is)."""
+    """Apply pending schema migrations (migrations.py) on PostgreSQL/Supabase."""
     conn = await asyncpg.connect(DATABASE_URL, statement_cache_size=0)
     try:
-        # C-1 §1: email-intake columns on candidates
-        await conn.execute("ALTER TABLE candidates ADD COLUMN IF NOT EXISTS wallet_address TEXT")
-        await conn.execute("ALTER TABLE candidates ADD COLUMN IF NOT EXISTS source TEXT DEFAULT 'manual'")
-        await conn.execute("ALTER TABLE candidates ADD COLUMN IF NOT EXISTS source_email_id TEXT")
-        await conn.execute("ALTER TABLE candidates ADD COLUMN IF NOT EXISTS detected_at TEXT")
-        # C-1 §3: detected_applicants staging table (감지됨/검토 대기)
-        await conn.execute(
-            "CREATE TABLE IF NOT EXISTS detected_applicants ("
-            "id SERIAL PRIMARY KEY, sender_email TEXT NOT NULL UNIQUE, sender_name TEXT, "
-            "repo_url TEXT, wallet_address TEXT, status TEXT DEFAULT 'detected', "
-            "source_email_ids TEXT, first_detected_at TEXT, updated_at TEXT, "
-            "registered_candidate_id INTEGER)"
-        )
-        # RLS 기본 거부 유지: 정책 없이 RLS만 켠다(서비스 역할만 백엔드 경유 접근).
-        await conn.execute("ALTER TABLE detected_applicants ENABLE ROW LEVEL SECURITY")
+        return await run_migrations(conn, "pg")
+    finally:
+        await conn.close()
+
+
+async def _sqlite_migrate():
+    from database import backup_db
+    existed = os.path.exists(DB_PATH)
+    conn = await _sqlite_connect()
+    try:
+        pending = await pending_migrations(conn, "sqlite")
+        if pending and existed:
+            backup_db()  # 스키마를 바꾸기 전에만 백업
+        return await run_migrations(conn, "sqlite", pending)
     finally:
         await conn.close()
 
 
+def startup_stats():
+    """init_db timing and schema version, for /api/health."""
+    return dict(_startup)
+
+
 async def init_db():
     """Initialize database. For PostgreSQL, tables are created via migration script."""
+    started = time.perf_counter()
     m = db_mode()
     bar = "=" * 64
     icon = "🟢" if m["mode"] == "local" else "🔴"
@@ -195,11 +658,10 @@ async def init_db():
         print("  로컬 테스트 DB. 클라우드(실데이터) 미연결.")
     print(f"{bar}\n")
 
-    if USE_PG:
-        # Tables already created by migrate_to_pg.py
-        await _pg_migrate()
-        return
-
-    # SQLite initialization (existing logic)
-    from database import init_db as sqlite_init_db
-    await sqlite_init_db()
+    # PostgreSQL tables are created by migrate_to_pg.py; SQLite gets them from v0.
+    applied = await (_pg_migrate() if USE_PG else _sqlite_migrate())
+    _startup.update({
+        "init_db_ms": round((time.perf_counter() - started) * 1000, 1),
+        "schema_version": LATEST_VERSION,
+        "migrations_applied": applied,
+    })
@@ -1,11 +1,12 @@
 import os
 import json
+import time
 import asyncio
 from datetime import datetime
 from contextlib import asynccontextmanager
 from typing import Optional
 
-from fastapi import FastAPI, HTTPException, Request, BackgroundTasks, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, Request, Response, BackgroundTasks, UploadFile, File, Form, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from dotenv import load_dotenv
@@ -13,9 +14,10 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import sqlite3
-from db import init_db, get_db
-from database import DB_PATH
-from analyzer import analyze_repo, ai_analyze, analyze_github_profile, TEAM_MEMBERS, recommend_reviewers, calculate_weighted_score, analyze_org_benchmark
+from db import init_db, get_db, db_session, now_text, init_pool, close_pool, pool_stats, USE_PG
+from database import DB_PATH, backup_loop, backup_stats
+from analyzer import analyze_repo, repo_cache_key, load_cached_analysis, save_cached_analysis, repo_cache_stats, ai_analyze, analyze_github_profile, TEAM_MEMBERS, recommend_reviewers, calculate_weighted_score, analyze_org_benchmark, benchmark_progress, aggregate_benchmark, \
+    candidate_percentiles, rank_candidates, BENCHMARK_DISTRIBUTION_METRICS
 from team_profiler import scan_org_profiles
 from linkedin_google import search_linkedin_candidates, get_linkedin_candidates, update_candidate_status as update_linkedin_status, init_linkedin_db
 from github_linkedin import bridge_github_candidates
@@ -27,13 +29,21 @@ from intake_scheduler import scheduler_loop as intake_scheduler_loop
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    started = time.perf_counter()
     await init_db()
+    await init_pool()
     init_linkedin_db()
+    app.state.startup_ms = round((time.perf_counter() - started) * 1000, 1)
     task = asyncio.create_task(scheduler_loop())
     intake_task = asyncio.create_task(intake_scheduler_loop())  # C-1 §5: 주 2회 채용 메일 스캔
+    # SQLite 온라인 백업 — 부팅을 막지 않도록 백그라운드에서
+    backup_task = None if USE_PG else asyncio.create_task(backup_loop())
     yield
     task.cancel()
     intake_task.cancel()
+    if backup_task:
+        backup_task.cancel()
+    await close_pool()
 
 app = FastAPI(title="Tokamak Hiring Framework", lifespan=lifespan)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
@@ -41,8 +51,24 @@ app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], all
 
 @app.get("/api/health")
 async def health_check():
-    from db import db_mode
-    return {"status": "healthy", **db_mode()}
+    from db import db_mode, sql_cache_stats, startup_stats
+    startup = {"total_ms": getattr(app.state, "startup_ms", None), **startup_stats()}
+    result = {"status": "healthy", **db_mode(), "pool": pool_stats(), "sql_cache": sql_cache_stats(),
+              "startup": startup, "repo_analysis_cache": repo_cache_stats()}
+    if not USE_PG:
+        result["backup"] = backup_stats()
+    return result
+
+
+@app.get("/api/admin/query-stats")
+async def admin_query_stats(request: Request, limit: int = 100, reset: bool = False):
+    """DB 문장별 실행 시간(count / total / p50 / p95 / max) + 최근 slow query 로그."""
+    require_operator(request)
+    from db import query_stats, reset_query_stats
+    result = query_stats(limit)
+    if reset:
+        reset_query_stats()
+    return result
 
 
 def get_user_email(request: Request) -> Optional[str]:
@@ -60,8 +86,7 @@ class CandidateSubmission(BaseModel):
 # ---- User endpoints ----
 
 @app.get("/api/users")
-async def list_users():
-    db = await get_db()
+async def list_users(db=Depends(db_session)):
     rows = await db.execute("SELECT id, name, email, role FROM users ORDER BY name")
     users = [dict(r) for r in await rows.fetchall()]
     await db.close()
@@ -69,11 +94,10 @@ async def list_users():
 
 
 @app.get("/api/users/me")
-async def get_current_user(request: Request):
+async def get_current_user(request: Request, db=Depends(db_session)):
     email = get_user_email(request)
     if not email:
         return {"user": None}
-    db = await get_db()
     row = await db.execute("SELECT id, name, email, role FROM users WHERE email = ?", (email,))
     user = await row.fetchone()
     await db.close()
@@ -85,8 +109,7 @@ async def get_current_user(request: Request):
 # ---- Candidate endpoints ----
 
 @app.post("/api/candidates/submit")
-async def submit_candidate(data: CandidateSubmission):
-    db = await get_db()
+async def submit_candidate(data: CandidateSubmission, db=Depends(db_session)):
     cursor = await db.execute(
         "INSERT INTO candidates (name, email, repo_url, demo_url, description) VALUES (?, ?, ?, ?, ?)",
         (data.name, data.email, data.repo_url, data.demo_url, data.description)
@@ -123,9 +146,8 @@ async def scan_inbox_endpoint(days: Optional[int] = None):
 
 
 @app.get("/api/candidates/intake")
-async def list_intake():
+async def list_intake(db=Depends(db_session)):
     """감지됨(검토 대기) 목록. 각 건의 등록 가능 여부와 보류 사유를 함께 반환."""
-    db = await get_db()
     cur = await db.execute(
         "SELECT * FROM detected_applicants ORDER BY first_detected_at DESC, id DESC"
     )
@@ -152,10 +174,9 @@ async def list_intake():
 
 
 @app.delete("/api/candidates/intake/{intake_id}")
-async def delete_intake(intake_id: int):
+async def delete_intake(intake_id: int, db=Depends(db_session)):
     """감지됨(검토 대기) 항목을 사람이 명시적으로 삭제. staging(detected_applicants)에서만
     지우고 candidates 본테이블은 절대 건드리지 않는다."""
-    db = await get_db()
     cur = await db.execute("SELECT sender_email FROM detected_applicants WHERE id=?", (intake_id,))
     row = await cur.fetchone()
     if not row:
@@ -169,11 +190,10 @@ async def delete_intake(intake_id: int):
 
 
 @app.post("/api/candidates/intake/{intake_id}/approve")
-async def approve_intake(intake_id: int):
+async def approve_intake(intake_id: int, db=Depends(db_session)):
     """운영자 '등록 승인'. 조건 충족 시에만 candidates에 등록한다.
     - 미충족(지갑 대기/repo 없음/확인 필요) → 422 + 보류 사유(자동 등록 금지).
     - 이미 등록/같은 발신자 후보 존재 → 재등록 안 함(중복 방지)."""
-    db = await get_db()
     cur = await db.execute("SELECT * FROM detected_applicants WHERE id=?", (intake_id,))
     row = await cur.fetchone()
     if not row:
@@ -210,20 +230,14 @@ async def approve_intake(intake_id: int):
 
     # 등록: status='submitted', source='email_auto'
     name = r.get("sender_name") or r["sender_email"].split("@")[0]
-    await db.execute(
+    cur = await db.execute(
         "INSERT INTO candidates (name, email, repo_url, description, status, wallet_address, source, source_email_id, detected_at) "
         "VALUES (?,?,?,?, 'submitted', ?, 'email_auto', ?, ?)",
         (name, r["sender_email"], r["repo_url"], "hr@ 자동 감지 지원",
          r.get("wallet_address"), r.get("source_email_ids") or "[]", r.get("first_detected_at")),
     )
-    await db.commit()
-    # 새 후보 id 조회 (SQLite/PG 공통 안전)
-    cur = await db.execute(
-        "SELECT id FROM candidates WHERE email=? AND source='email_auto' ORDER BY id DESC LIMIT 1",
-        (r["sender_email"],),
-    )
-    newrow = await cur.fetchone()
-    new_id = dict(newrow).get("id") if newrow else None
+    # 새 후보 id — SQLite/PG 모두 cursor.lastrowid 로 같은 round-trip 에서 받는다
+    new_id = cur.lastrowid
     await db.execute(
         "UPDATE detected_applicants SET registered_candidate_id=?, updated_at=datetime('now') WHERE id=?",
         (new_id, intake_id),
@@ -234,66 +248,72 @@ async def approve_intake(intake_id: int):
 
 
 @app.post("/api/candidates/{candidate_id}/analyze")
-async def analyze_candidate(candidate_id: int, request: Request):
+async def analyze_candidate(candidate_id: int, request: Request, force: bool = False, db=Depends(db_session)):
     user_email = get_user_email(request)
-    db = await get_db()
     row = await db.execute("SELECT * FROM candidates WHERE id = ?", (candidate_id,))
     candidate = await row.fetchone()
+    # clone(최대 60초+) / AI 호출(120초) 동안 풀 커넥션을 잡고 있지 않는다 — 필요할 때만 다시 빌린다.
+    await db.close()
     if not candidate:
-        await db.close()
         raise HTTPException(404, "Candidate not found")
 
-    repo_analysis = await analyze_repo(candidate["repo_url"])
-    if "error" in repo_analysis:
-        await db.close()
-        raise HTTPException(400, repo_analysis["error"])
-
     demo_url = ""
     try:
         demo_url = candidate["demo_url"] or ""
     except (KeyError, IndexError):
         pass
 
-    # Fetch latest benchmark for comparison
-    benchmark_data = None
-    brow = await db.execute("SELECT * FROM org_benchmark ORDER BY id DESC LIMIT 1")
-    bm = await brow.fetchone()
-    if bm:
-        benchmark_data = dict(bm)
-        benchmark_data["languages"] = json.loads(benchmark_data["languages"]) if isinstance(benchmark_data["languages"], str) else benchmark_data["languages"]
-        raw_details = json.loads(benchmark_data["repo_details"]) if isinstance(benchmark_data["repo_details"], str) else benchmark_data["repo_details"]
-        if isinstance(raw_details, dict) and "_quality_metrics" in raw_details:
-            benchmark_data.update(raw_details["_quality_metrics"])
-            benchmark_data["repo_details"] = raw_details.get("repos", [])
-        else:
-            benchmark_data["repo_details"] = raw_details
+    # 같은 커밋을 이미 분석했으면 repo_analysis_cache 결과 재사용 (force=true 면 다시 분석)
+    cache_key = await repo_cache_key(candidate["repo_url"])
+    db = await get_db()
+    try:
+        repo_analysis = await load_cached_analysis(db, cache_key, force) if cache_key else None
+        # Latest benchmark for comparison (in-memory, rebuilt only after a refresh)
+        benchmark_data = await _latest_benchmark(db)
+    finally:
+        await db.close()
+
+    fresh = repo_analysis is None
+    if fresh:
+        repo_analysis = await analyze_repo(candidate["repo_url"])
+        if "error" in repo_analysis:
+            raise HTTPException(400, repo_analysis["error"])
 
     ai_result = await ai_analyze(repo_analysis, candidate["description"], demo_url, benchmark_data)
 
     track_b = ai_result.get("track_b", {})
     weighted_score = ai_result.get("weighted_score", 0)
     benchmark_comparison = ai_result.get("benchmark_comparison", {})
+    benchmark_percentiles = candidate_percentiles(repo_analysis, (benchmark_data or {}).get("distributions"))
 
-    await db.execute(
-        """UPDATE candidates SET status='analyzed', scores=?, report=?, recommendation=?,
-           repo_analysis=?, track_b_evaluation=?, weighted_score=?, analyzed_by=?, analyzed_at=? WHERE id=?""",
-        (
-            json.dumps(ai_result.get("scores", {})),
-            ai_result.get("report", ""),
-            ai_result.get("recommendation", "Maybe"),
-            json.dumps({
-                **(({k: v for k, v in repo_analysis.items() if k != "sample_code"})),
-                "benchmark_comparison": benchmark_comparison,
-            }),
-            json.dumps(track_b),
-            weighted_score,
-            user_email or "",
-            datetime.utcnow().isoformat(),
-            candidate_id
+    db = await get_db()
+    try:
+        if fresh:
+            await save_cached_analysis(db, candidate["repo_url"], repo_analysis)
+        await db.execute(
+            """UPDATE candidates SET status='analyzed', scores=?, report=?, recommendation=?,
+               repo_analysis=?, track_b_evaluation=?, weighted_score=?, analyzed_by=?, analyzed_at=?,
+               """ + _CANDIDATE_METRIC_SET + " WHERE id=?",
+            (
+                json.dumps(ai_result.get("scores", {})),
+                ai_result.get("report", ""),
+                ai_result.get("recommendation", "Maybe"),
+                json.dumps({
+                    **(({k: v for k, v in repo_analysis.items() if k != "sample_code"})),
+                    "benchmark_comparison": benchmark_comparison,
+                    "benchmark_percentiles": benchmark_percentiles,
+                }),
+                json.dumps(track_b),
+                weighted_score,
+                user_email or "",
+                datetime.utcnow().isoformat(),
+                *_candidate_metric_values(repo_analysis),
+                candidate_id
+            )
         )
-    )
-    await db.commit()
-    await db.close()
+        await db.commit()
+    finally:
+        await db.close()
     return {
         "id": candidate_id,
         "status": "analyzed",
@@ -302,18 +322,111 @@ async def analyze_candidate(candidate_id: int, request: Request):
         "track_b": track_b,
         "recommendation": ai_result.get("recommendation"),
         "benchmark_comparison": benchmark_comparison,
+        "benchmark_percentiles": benchmark_percentiles,
     }
 
 
 # ── Tokamak Org Benchmark ──
+# 저장소별 지표는 org_benchmark_repos 에 한 행씩 두고 refresh 때 pushed_at 이 바뀐 것만 다시 분석한다.
+# 최신 집계는 그 행들로 계산해 메모리에 두고(단일 워커), refresh 가 끝나면 다시 만든다.
+BENCHMARK_ORG = "tokamak-network"
+BENCHMARK_REPO_COLUMNS = (
+    "repo_name", "pushed_at", "stars", "description", "file_count", "commit_count", "total_size_kb",
+    "has_tests", "readme_sections", "readme_has_install_guide", "readme_has_code_blocks",
+    "config_file_count", "src_dir_count", "has_ci", "languages", "analyzed_at",
+)
+_BENCHMARK_BOOL_COLUMNS = ("has_tests", "readme_has_install_guide", "readme_has_code_blocks", "has_ci")
+BENCHMARK_REPO_UPSERT = (
+    "INSERT INTO org_benchmark_repos (org_name, {cols}, included) VALUES (?, {marks}, 1) "
+    "ON CONFLICT (org_name, repo_name) DO UPDATE SET {updates}, included = 1"
+).format(
+    cols=", ".join(BENCHMARK_REPO_COLUMNS),
+    marks=", ".join("?" for _ in BENCHMARK_REPO_COLUMNS),
+    updates=", ".join("{0} = excluded.{0}".format(c) for c in BENCHMARK_REPO_COLUMNS[1:]),
+)
+_benchmark_cache: Optional[dict] = None
+_benchmark_refresh_lock = asyncio.Lock()
+# 후보 분포 지표 → candidates 컬럼 (migration v8). 순위 계산이 repo_analysis JSON 을 읽지 않게 한다.
+CANDIDATE_METRIC_COLUMNS = {m: "metric_" + m for m in BENCHMARK_DISTRIBUTION_METRICS}
+_CANDIDATE_METRIC_SET = ", ".join(c + "=?" for c in CANDIDATE_METRIC_COLUMNS.values())
+_CANDIDATE_METRIC_SELECT = ", ".join(CANDIDATE_METRIC_COLUMNS.values())
+
+
+def _candidate_metric_values(repo_analysis: dict) -> list:
+    """CANDIDATE_METRIC_COLUMNS values of a repo_analysis (non-numeric → None)."""
+    values = [repo_analysis.get(m) for m in CANDIDATE_METRIC_COLUMNS]
+    return [float(v) if isinstance(v, (int, float)) else None for v in values]
+
+
+def _benchmark_repo_row(row) -> dict:
+    metrics = {c: row[c] for c in BENCHMARK_REPO_COLUMNS}
+    for c in _BENCHMARK_BOOL_COLUMNS:
+        metrics[c] = bool(metrics[c])
+    metrics["languages"] = json.loads(metrics["languages"] or "{}")
+    return metrics
+
+
+async def _load_benchmark_repos(db, org_name: str, included_only: bool = False) -> list:
+    sql = "SELECT * FROM org_benchmark_repos WHERE org_name = ?"
+    if included_only:
+        sql += " AND included = 1 ORDER BY pushed_at DESC, repo_name"
+    rows = await db.execute(sql, (org_name,))
+    return [_benchmark_repo_row(r) for r in await rows.fetchall()]
+
+
+def _legacy_benchmark(row) -> dict:
+    """Benchmark from an org_benchmark row with quality metrics inside repo_details (before org_benchmark_repos)."""
+    result = dict(row)
+    result["languages"] = json.loads(result["languages"]) if isinstance(result["languages"], str) else result["languages"]
+    raw_details = json.loads(result["repo_details"]) if isinstance(result["repo_details"], str) else result["repo_details"]
+    # Extract quality metrics stored inside repo_details
+    if isinstance(raw_details, dict) and "_quality_metrics" in raw_details:
+        result.update(raw_details["_quality_metrics"])
+        result["repo_details"] = raw_details.get("repos", [])
+    else:
+        result["repo_details"] = raw_details
+    return result
+
+
+async def _latest_benchmark(db) -> Optional[dict]:
+    """Latest org benchmark profile (copy of the in-memory cache; built on first use)."""
+    global _benchmark_cache
+    if _benchmark_cache is None:
+        row = await db.execute("SELECT * FROM org_benchmark ORDER BY id DESC LIMIT 1")
+        b = await row.fetchone()
+        if not b:
+            return None
+        repos = await _load_benchmark_repos(db, b["org_name"], included_only=True)
+        if repos:
+            _benchmark_cache = {"id": b["id"], "created_at": b["created_at"],
+                                **aggregate_benchmark(b["org_name"], repos)}
+        else:
+            _benchmark_cache = _legacy_benchmark(b)
+    return {**_benchmark_cache, "repo_details": list(_benchmark_cache["repo_details"])}
+
 
 @app.post("/api/benchmark/refresh")
 async def refresh_benchmark():
     """Analyze tokamak-network org repos and save benchmark profile."""
-    benchmark = await analyze_org_benchmark("tokamak-network", months=6, max_repos=15)
+    # locked() 확인과 락 획득 사이에 await 가 없어야 동시 요청 두 개가 함께 통과하지 않는다
+    if _benchmark_refresh_lock.locked():
+        raise HTTPException(409, "Benchmark refresh already running")
+    async with _benchmark_refresh_lock:
+        return await _refresh_benchmark()
+
+
+async def _refresh_benchmark() -> dict:
+    global _benchmark_cache
+    db = await get_db()
+    try:
+        stored = {r["repo_name"]: r for r in await _load_benchmark_repos(db, BENCHMARK_ORG)}
+    finally:
+        await db.close()
+    benchmark = await analyze_org_benchmark(BENCHMARK_ORG, months=6, max_repos=15, stored=stored)
     if "error" in benchmark:
         raise HTTPException(400, benchmark["error"])
-    # Store quality metrics inside repo_details JSON to avoid schema migration
+    repo_metrics = benchmark.pop("repo_metrics")
+    # org_benchmark 는 refresh 이력 — 기존 형식(repo_details 안의 _quality_metrics) 그대로 남긴다
     quality_meta = {
         "_quality_metrics": {
             "doc_structured_ratio": benchmark.get("doc_structured_ratio", 0),
@@ -325,43 +438,72 @@ async def refresh_benchmark():
         },
         "repos": benchmark["repo_details"],
     }
+    # 분석(수 분)이 끝난 뒤에만 풀 커넥션을 빌린다.
     db = await get_db()
-    await db.execute(
-        """INSERT INTO org_benchmark (org_name, repo_count, avg_file_count, avg_commit_count, avg_size_kb, test_ratio, languages, repo_details)
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-        (benchmark["org_name"], benchmark["repo_count"], benchmark["avg_file_count"],
-         benchmark["avg_commit_count"], benchmark["avg_size_kb"], benchmark["test_ratio"],
-         json.dumps(benchmark["languages"]), json.dumps(quality_meta)))
-    await db.commit()
-    await db.close()
+    try:
+        async with db.transaction():
+            await db.execute("UPDATE org_benchmark_repos SET included = 0 WHERE org_name = ?", (BENCHMARK_ORG,))
+            await db.executemany(BENCHMARK_REPO_UPSERT, [
+                (BENCHMARK_ORG, *(json.dumps(m[c]) if c == "languages" else
+                                  int(m[c]) if c in _BENCHMARK_BOOL_COLUMNS else m[c]
+                                  for c in BENCHMARK_REPO_COLUMNS))
+                for m in repo_metrics
+            ])
+            await db.execute(
+                """INSERT INTO org_benchmark (org_name, repo_count, avg_file_count, avg_commit_count, avg_size_kb, test_ratio, languages, repo_details)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (benchmark["org_name"], benchmark["repo_count"], benchmark["avg_file_count"],
+                 benchmark["avg_commit_count"], benchmark["avg_size_kb"], benchmark["test_ratio"],
+                 json.dumps(benchmark["languages"]), json.dumps(quality_meta)))
+        _benchmark_cache = None
+        await _latest_benchmark(db)  # 저장된 행으로 집계를 다시 만든다
+    finally:
+        await db.close()
     return benchmark
 
 
+@app.get("/api/benchmark/progress")
+async def get_benchmark_progress():
+    """Progress of the running (or last) benchmark refresh: total / completed / succeeded / failed."""
+    return benchmark_progress()
+
+
+@app.get("/api/benchmark/candidate-ranks")
+async def benchmark_candidate_ranks(db=Depends(db_session)):
+    """Percentile ranks of every analyzed candidate against the latest benchmark distributions (one pass)."""
+    benchmark = await _latest_benchmark(db)
+    # repo_analysis JSON 대신 지표 컬럼만 — 분석 전이거나 repo_analysis 를 못 읽은 행은 비어 있어 빠진다
+    rows = await db.execute(
+        f"SELECT id, name, {_CANDIDATE_METRIC_SELECT} FROM candidates "
+        f"WHERE {CANDIDATE_METRIC_COLUMNS['file_count']} IS NOT NULL ORDER BY id")
+    candidates = [(r["id"], r["name"], {m: r[c] for m, c in CANDIDATE_METRIC_COLUMNS.items()})
+                  for r in await rows.fetchall()]
+    await db.close()
+    if not benchmark or not benchmark.get("distributions"):
+        return {"exists": False, "metrics": list(BENCHMARK_DISTRIBUTION_METRICS), "candidates": []}
+    ranks = rank_candidates([a for _, _, a in candidates], benchmark["distributions"])
+    return {
+        "exists": True,
+        "metrics": list(BENCHMARK_DISTRIBUTION_METRICS),
+        "benchmark_repo_count": benchmark["repo_count"],
+        "candidates": [{"id": cid, "name": name, "percentiles": pct}
+                       for (cid, name, _), pct in zip(candidates, ranks)],
+    }
+
+
 @app.get("/api/benchmark/latest")
-async def get_latest_benchmark():
+async def get_latest_benchmark(db=Depends(db_session)):
     """Get the most recent benchmark profile."""
-    db = await get_db()
-    row = await db.execute("SELECT * FROM org_benchmark ORDER BY id DESC LIMIT 1")
-    b = await row.fetchone()
+    result = await _latest_benchmark(db)
     await db.close()
-    if not b:
+    if not result:
         return {"exists": False}
-    result = dict(b)
     result["exists"] = True
-    result["languages"] = json.loads(result["languages"]) if isinstance(result["languages"], str) else result["languages"]
-    raw_details = json.loads(result["repo_details"]) if isinstance(result["repo_details"], str) else result["repo_details"]
-    # Extract quality metrics stored inside repo_details
-    if isinstance(raw_details, dict) and "_quality_metrics" in raw_details:
-        result.update(raw_details["_quality_metrics"])
-        result["repo_details"] = raw_details.get("repos", [])
-    else:
-        result["repo_details"] = raw_details
     return result
 
 
 @app.get("/api/candidates")
-async def list_candidates():
-    db = await get_db()
+async def list_candidates(db=Depends(db_session)):
     rows = await db.execute(
         "SELECT id, name, email, repo_url, status, scores, recommendation, weighted_score, reviewed_by, analyzed_by, created_at, reward_amount, reward_token, reward_tx, reward_date, reviewer, review_comment, result_shared, source FROM candidates ORDER BY created_at DESC"
     )
@@ -376,26 +518,23 @@ async def list_candidates():
 
 
 @app.delete("/api/candidates/{candidate_id}")
-async def delete_candidate(candidate_id: int):
-    db = await get_db()
+async def delete_candidate(candidate_id: int, db=Depends(db_session)):
     await db.execute("DELETE FROM candidates WHERE id=?", (candidate_id,))
     await db.commit()
     await db.close()
     return {"message": "Deleted"}
 
 @app.put("/api/candidates/{candidate_id}/status")
-async def update_candidate_status(candidate_id: int, data: dict):
+async def update_candidate_status(candidate_id: int, data: dict, db=Depends(db_session)):
     """Update candidate status (submitted/analyzed/hired/rejected)."""
-    db = await get_db()
     await db.execute("UPDATE candidates SET status=? WHERE id=?", (data["status"], candidate_id))
     await db.commit()
     await db.close()
     return {"message": f"Status → {data['status']}"}
 
 @app.put("/api/candidates/{candidate_id}/reward")
-async def update_candidate_reward(candidate_id: int, data: dict):
+async def update_candidate_reward(candidate_id: int, data: dict, db=Depends(db_session)):
     """Record TON reward payment."""
-    db = await get_db()
     await db.execute(
         "UPDATE candidates SET reward_amount=?, reward_token=?, reward_tx=?, reward_date=? WHERE id=?",
         (data.get("amount", 0), data.get("token", "TON"), data.get("tx_hash", ""), data.get("date", ""), candidate_id))
@@ -404,9 +543,8 @@ async def update_candidate_reward(candidate_id: int, data: dict):
     return {"message": "Reward recorded"}
 
 @app.put("/api/candidates/{candidate_id}/review")
-async def update_candidate_review(candidate_id: int, data: dict):
+async def update_candidate_review(candidate_id: int, data: dict, db=Depends(db_session)):
     """Update reviewer and comment."""
-    db = await get_db()
     await db.execute(
         "UPDATE candidates SET reviewer=?, review_comment=?, result_shared=? WHERE id=?",
         (data.get("reviewer", ""), data.get("comment", ""), data.get("result_shared", 0), candidate_id))
@@ -415,8 +553,7 @@ async def update_candidate_review(candidate_id: int, data: dict):
     return {"message": "Review updated"}
 
 @app.get("/api/candidates/{candidate_id}")
-async def get_candidate(candidate_id: int):
-    db = await get_db()
+async def get_candidate(candidate_id: int, db=Depends(db_session)):
     row = await db.execute("SELECT * FROM candidates WHERE id = ?", (candidate_id,))
     candidate = await row.fetchone()
     await db.close()
@@ -430,8 +567,7 @@ async def get_candidate(candidate_id: int):
 
 
 @app.get("/api/candidates/{candidate_id}/report")
-async def get_report(candidate_id: int):
-    db = await get_db()
+async def get_report(candidate_id: int, db=Depends(db_session)):
     row = await db.execute("SELECT report, scores, recommendation, name, weighted_score, track_b_evaluation FROM candidates WHERE id = ?", (candidate_id,))
     candidate = await row.fetchone()
     await db.close()
@@ -446,9 +582,8 @@ async def get_report(candidate_id: int):
 
 
 @app.get("/api/candidates/{candidate_id}/report/download")
-async def download_report(candidate_id: int, format: str = "md"):
+async def download_report(candidate_id: int, format: str = "md", db=Depends(db_session)):
     """Download candidate analysis report as MD or PDF."""
-    db = await get_db()
     row = await db.execute("SELECT * FROM candidates WHERE id = ?", (candidate_id,))
     candidate = await row.fetchone()
     await db.close()
@@ -603,9 +738,8 @@ async def download_report(candidate_id: int, format: str = "md"):
 
 
 @app.get("/api/candidates/{candidate_id}/recommended-reviewers")
-async def get_recommended_reviewers(candidate_id: int, request: Request):
+async def get_recommended_reviewers(candidate_id: int, request: Request, db=Depends(db_session)):
     user_email = get_user_email(request)
-    db = await get_db()
     row = await db.execute("SELECT scores, repo_analysis FROM candidates WHERE id = ?", (candidate_id,))
     candidate = await row.fetchone()
     if not candidate:
@@ -621,11 +755,10 @@ async def get_recommended_reviewers(candidate_id: int, request: Request):
 
 
 @app.post("/api/candidates/{candidate_id}/review")
-async def mark_reviewed(candidate_id: int, request: Request):
+async def mark_reviewed(candidate_id: int, request: Request, db=Depends(db_session)):
     user_email = get_user_email(request)
     if not user_email:
         raise HTTPException(400, "X-User-Email header required")
-    db = await get_db()
     row = await db.execute("SELECT id FROM candidates WHERE id = ?", (candidate_id,))
     if not await row.fetchone():
         await db.close()
@@ -725,16 +858,16 @@ def _scan_github_sync(token: str):
 
     logger.info("Total activities collected: %d", len(activities))
     saved_acts = 0
-    for login, atype, repo_name, url, dt_str, details in activities:
-        try:
-            conn.execute("""
-                INSERT OR IGNORE INTO monitor_activities
-                (github_username, activity_type, repo_name, activity_url, activity_date, details)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (login, atype, repo_name, url, dt_str, details))
-            saved_acts += 1
-        except Exception as e:
-            logger.error("Failed to save activity: %s %s %s - %s", login, atype, url, e)
+    before = conn.total_changes
+    try:
+        conn.executemany("""
+            INSERT OR IGNORE INTO monitor_activities
+            (github_username, activity_type, repo_name, activity_url, activity_date, details)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, activities)
+        saved_acts = conn.total_changes - before
+    except Exception as e:
+        logger.error("Failed to save activities: %s", e)
     conn.commit()
     logger.info("Activities saved: %d", saved_acts)
 
@@ -786,48 +919,92 @@ def _scan_github_sync(token: str):
     return {"repos_scanned": repos_scanned, "external_users_found": len(external_users), "profiles_analyzed": analyzed}
 
 
+MONITOR_CANDIDATE_COLUMNS = ("id", "github_username", "profile_url", "bio", "public_repos", "followers",
+                             "languages", "contributions", "scores", "activity_level", "last_scanned", "linkedin_url")
+MONITOR_JSON_COLUMNS = ("languages", "contributions", "scores")
+# 활동 조회 IN (...) 바인딩 묶음 크기 (fields/limit 없이 전체를 받을 때도 파라미터 한도 아래로)
+MONITOR_IN_CHUNK = 500
+
+
 @app.get("/api/monitor/candidates")
-async def list_monitor_candidates(activity_within: str = ""):
-    """List monitor candidates. activity_within: 1w, 1m, 3m to filter by last_scanned."""
-    db = await get_db()
-    query = "SELECT * FROM monitor_candidates"
+async def list_monitor_candidates(response: Response, activity_within: str = "", limit: Optional[int] = None,
+                                  offset: int = 0, fields: str = "", db=Depends(db_session)):
+    """List monitor candidates. activity_within: 1w, 1m, 3m to filter by last_scanned.
+
+    limit/offset paginate (total in X-Total-Count); fields=a,b,... returns only those keys.
+    Activities come from two set-based queries for the whole page, not two per candidate.
+    """
+    where = ""
     params = []  # type: list
     if activity_within in ("1w", "1m", "3m"):
         days_map = {"1w": 7, "1m": 30, "3m": 90}
-        query += " WHERE last_scanned >= datetime('now', ?)"
+        where = " WHERE last_scanned >= datetime('now', ?)"
         params.append("-{} days".format(days_map[activity_within]))
-    query += " ORDER BY last_scanned DESC"
-    rows = await db.execute(query, params)
-    candidates = []
-    for r in await rows.fetchall():
-        c = dict(r)
-        for f in ["languages", "contributions", "scores"]:
-            if c.get(f):
-                c[f] = json.loads(c[f])
-
-        # Fetch recent activities
-        act_rows = await db.execute(
-            "SELECT activity_type, repo_name, activity_url, activity_date, details FROM monitor_activities WHERE github_username = ? ORDER BY activity_date DESC LIMIT 5",
-            (c["github_username"],)
-        )
-        c["recent_activities"] = [dict(a) for a in await act_rows.fetchall()]
 
-        # Activity type summary
-        summary_rows = await db.execute(
-            "SELECT activity_type, COUNT(*) as cnt FROM monitor_activities WHERE github_username = ? GROUP BY activity_type",
-            (c["github_username"],)
-        )
-        c["activity_types"] = {row["activity_type"]: row["cnt"] for row in await summary_rows.fetchall()}
-
-        candidates.append(c)
+    wanted = {f.strip() for f in fields.split(",") if f.strip()} if fields else None
+    if wanted is None:
+        columns = "*"
+    else:
+        columns = ", ".join(c for c in MONITOR_CANDIDATE_COLUMNS if c in wanted or c == "github_username")
+
+    if limit is not None:
+        count_row = await db.execute("SELECT COUNT(*) AS cnt FROM monitor_candidates" + where, params)
+        response.headers["X-Total-Count"] = str((await count_row.fetchone())["cnt"])
+
+    # id 로 동순위를 끊어 페이지 경계가 요청마다 같게
+    page = " FROM monitor_candidates" + where + " ORDER BY last_scanned DESC, id"
+    page_params = list(params)
+    if limit is not None:
+        page += " LIMIT ? OFFSET ?"
+        page_params += [max(0, min(limit, 1000)), max(0, offset)]
+    rows = await db.execute("SELECT " + columns + page, page_params)
+    candidates = [dict(r) for r in await rows.fetchall()]
+    # 활동 쿼리는 방금 읽은 사용자 이름을 그대로 바인딩 (페이지를 다시 고르지 않는다)
+    usernames = [c["github_username"] for c in candidates]
+    chunks = [usernames[i:i + MONITOR_IN_CHUNK] for i in range(0, len(usernames), MONITOR_IN_CHUNK)]
+
+    recent = {}
+    if candidates and (wanted is None or "recent_activities" in wanted):
+        # 최근 5건: 사용자별 ROW_NUMBER 로 한 번에
+        for chunk in chunks:
+            act_rows = await db.execute(
+                "SELECT github_username, activity_type, repo_name, activity_url, activity_date, details FROM ("
+                " SELECT github_username, activity_type, repo_name, activity_url, activity_date, details,"
+                " ROW_NUMBER() OVER (PARTITION BY github_username ORDER BY activity_date DESC) AS rn"
+                " FROM monitor_activities WHERE github_username IN (" + ", ".join("?" for _ in chunk) + ")"
+                ") ranked WHERE rn <= 5 ORDER BY github_username, rn",
+                chunk)
+            for a in await act_rows.fetchall():
+                a = dict(a)
+                recent.setdefault(a.pop("github_username"), []).append(a)
+
+    type_counts = {}
+    if candidates and (wanted is None or "activity_types" in wanted):
+        for chunk in chunks:
+            summary_rows = await db.execute(
+                "SELECT github_username, activity_type, COUNT(*) as cnt FROM monitor_activities"
+                " WHERE github_username IN (" + ", ".join("?" for _ in chunk) + ") GROUP BY github_username, activity_type",
+                chunk)
+            for row in await summary_rows.fetchall():
+                type_counts.setdefault(row["github_username"], {})[row["activity_type"]] = row["cnt"]
     await db.close()
+
+    for c in candidates:
+        for f in MONITOR_JSON_COLUMNS:
+            if c.get(f):
+                c[f] = json.loads(c[f])
+        if wanted is None or "recent_activities" in wanted:
+            c["recent_activities"] = recent.get(c["github_username"], [])
+        if wanted is None or "activity_types" in wanted:
+            c["activity_types"] = type_counts.get(c["github_username"], {})
+        if wanted is not None and "github_username" not in wanted:
+            del c["github_username"]
     return candidates
 
 
 @app.get("/api/monitor/candidates/{github_username}/activities")
-async def get_monitor_activities(github_username: str):
+async def get_monitor_activities(github_username: str, db=Depends(db_session)):
     """Get all activities for a monitor candidate."""
-    db = await get_db()
     rows = await db.execute(
         "SELECT activity_type, repo_name, activity_url, activity_date, details FROM monitor_activities WHERE github_username = ? ORDER BY activity_date DESC",
         (github_username,)
@@ -838,8 +1015,7 @@ async def get_monitor_activities(github_username: str):
 
 
 @app.get("/api/monitor/candidates/{github_username}")
-async def get_monitor_candidate(github_username: str):
-    db = await get_db()
+async def get_monitor_candidate(github_username: str, db=Depends(db_session)):
     row = await db.execute("SELECT * FROM monitor_candidates WHERE github_username = ?", (github_username,))
     candidate = await row.fetchone()
     await db.close()
@@ -869,9 +1045,8 @@ async def team_profile_scan():
 
 
 @app.get("/api/team/profiles")
-async def list_team_profiles():
+async def list_team_profiles(db=Depends(db_session)):
     """List all team member profiles with expertise."""
-    db = await get_db()
     rows = await db.execute("SELECT * FROM team_profiles WHERE is_active = 1 ORDER BY review_count DESC, github_username")
     profiles = []
     for r in await rows.fetchall():
@@ -885,9 +1060,8 @@ async def list_team_profiles():
 
 
 @app.get("/api/team/profiles/{github_username}")
-async def get_team_profile(github_username: str):
+async def get_team_profile(github_username: str, db=Depends(db_session)):
     """Get individual team member profile."""
-    db = await get_db()
     row = await db.execute("SELECT * FROM team_profiles WHERE github_username = ?", (github_username,))
     profile = await row.fetchone()
     await db.close()
@@ -901,9 +1075,8 @@ async def get_team_profile(github_username: str):
 
 
 @app.delete("/api/team/profiles/{github_username}")
-async def delete_team_profile(github_username: str):
+async def delete_team_profile(github_username: str, db=Depends(db_session)):
     """Delete a team member profile."""
-    db = await get_db()
     row = await db.execute("SELECT id FROM team_profiles WHERE github_username = ?", (github_username,))
     if not await row.fetchone():
         await db.close()
@@ -942,9 +1115,12 @@ async def add_team_profile(req: AddTeamMemberRequest):
 
     # Check if already exists
     db = await get_db()
-    row = await db.execute("SELECT id FROM team_profiles WHERE github_username = ?", (username,))
-    if await row.fetchone():
-        await db.close()
+    try:
+        row = await db.execute("SELECT id FROM team_profiles WHERE github_username = ?", (username,))
+        exists = await row.fetchone()
+    finally:
+        await db.close()  # GitHub 스캔 동안 풀 커넥션을 잡고 있지 않는다
+    if exists:
         raise HTTPException(409, f"'{username}' already exists in team profiles")
 
     # Scan tokamak-network org repos for this user's activity
@@ -952,7 +1128,6 @@ async def add_team_profile(req: AddTeamMemberRequest):
         org = g.get_organization("tokamak-network")
         all_repos = list(org.get_repos(sort="updated", type="all"))[:50]
     except Exception as e:
-        await db.close()
         raise HTTPException(500, f"Failed to access org repos: {e}")
 
     six_months_ago = datetime.utcnow() - timedelta(days=180)
@@ -996,21 +1171,24 @@ async def add_team_profile(req: AddTeamMemberRequest):
     top_languages = dict(Counter(languages).most_common(10))
     now = datetime.utcnow().isoformat()
 
-    await db.execute("""
-        INSERT INTO team_profiles (github_username, display_name, avatar_url, expertise_areas, top_repos, languages, review_count, last_active, last_profiled, is_active)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
-    """, (
-        username,
-        user.name or username,
-        user.avatar_url or "",
-        json.dumps(expertise),
-        json.dumps(top_repos),
-        json.dumps(top_languages),
-        review_count,
-        now, now,
-    ))
-    await db.commit()
-    await db.close()
+    db = await get_db()
+    try:
+        await db.execute("""
+            INSERT INTO team_profiles (github_username, display_name, avatar_url, expertise_areas, top_repos, languages, review_count, last_active, last_profiled, is_active)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
+        """, (
+            username,
+            user.name or username,
+            user.avatar_url or "",
+            json.dumps(expertise),
+            json.dumps(top_repos),
+            json.dumps(top_languages),
+            review_count,
+            now, now,
+        ))
+        await db.commit()
+    finally:
+        await db.close()
 
     return {"added": username, "display_name": user.name or username, "repos_scanned": len(all_repos), "commits_found": review_count}
 
@@ -1059,7 +1237,7 @@ async def github_search(data: LinkedInSearchRequest):
 
 
 @app.get("/api/linkedin/candidates")
-async def linkedin_candidates(status: str = "", limit: int = 100, offset: int = 0):
+async def linkedin_candidates(status: str = "", limit: int = 100, offset: int = 0, db=Depends(db_session)):
     """List LinkedIn candidates with scores and total count."""
     candidates = get_linkedin_candidates(
         status=status or None,
@@ -1067,7 +1245,6 @@ async def linkedin_candidates(status: str = "", limit: int = 100, offset: int =
         offset=offset,
     )
     # Get total count for pagination
-    db = await get_db()
     if status:
         row = await db.execute("SELECT COUNT(*) as cnt FROM linkedin_candidates WHERE status=?", (status,))
     else:
@@ -1153,20 +1330,21 @@ async def linkedin_outreach(candidate_id: int, data: OutreachRequest):
     # Save to outreach_history if message was sent
     if data.message_sent:
         db = await get_db()
-        await db.execute(
-            "INSERT INTO outreach_history (candidate_id, candidate_type, template_used, message_sent, channel, status, sent_by) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (candidate_id, "linkedin", data.template_id, data.message_sent, data.channel, "sent", data.notes or "")
-        )
-        await db.commit()
-        await db.close()
+        try:
+            await db.execute(
+                "INSERT INTO outreach_history (candidate_id, candidate_type, template_used, message_sent, channel, status, sent_by) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (candidate_id, "linkedin", data.template_id, data.message_sent, data.channel, "sent", data.notes or "")
+            )
+            await db.commit()
+        finally:
+            await db.close()
 
     return {"id": candidate_id, "status": data.status}
 
 
 @app.get("/api/linkedin/candidates/{candidate_id}/outreach-history")
-async def get_outreach_history(candidate_id: int):
+async def get_outreach_history(candidate_id: int, db=Depends(db_session)):
     """Returns outreach history for a candidate."""
-    db = await get_db()
     rows = await db.execute(
         "SELECT * FROM outreach_history WHERE candidate_id = ? ORDER BY sent_at DESC",
         (candidate_id,)
@@ -1250,9 +1428,8 @@ async def _find_linkedin_for_monitor_candidate(username: str, db) -> Optional[st
 
 
 @app.post("/api/monitor/find-linkedin")
-async def monitor_find_linkedin_all():
+async def monitor_find_linkedin_all(db=Depends(db_session)):
     """Find LinkedIn profiles for all monitor candidates missing linkedin_url."""
-    db = await get_db()
     rows = await db.execute(
         "SELECT github_username FROM monitor_candidates WHERE linkedin_url IS NULL OR linkedin_url = ''"
     )
@@ -1270,9 +1447,8 @@ async def monitor_find_linkedin_all():
 
 
 @app.post("/api/monitor/find-linkedin/{username}")
-async def monitor_find_linkedin_single(username: str):
+async def monitor_find_linkedin_single(username: str, db=Depends(db_session)):
     """Find LinkedIn profile for a single monitor candidate."""
-    db = await get_db()
     row = await db.execute("SELECT id FROM monitor_candidates WHERE github_username = ?", (username,))
     if not await row.fetchone():
         await db.close()
@@ -1293,9 +1469,8 @@ async def linkedin_bridge():
 
 
 @app.get("/api/candidates/{candidate_id}/match")
-async def get_candidate_match(candidate_id: int):
+async def get_candidate_match(candidate_id: int, db=Depends(db_session)):
     """Get team matching scores — unified with recommended-reviewers engine."""
-    db = await get_db()
     row = await db.execute("SELECT * FROM candidates WHERE id = ?", (candidate_id,))
     candidate = await row.fetchone()
     if not candidate:
@@ -1423,12 +1598,11 @@ class PayrollUpdate(BaseModel):
 # ── HR Members ──
 
 @app.get("/api/hr/members/download")
-async def download_members(active: Optional[int] = None):
+async def download_members(active: Optional[int] = None, db=Depends(db_session)):
     """팀원 목록 엑셀 다운로드"""
     import openpyxl, io
     from fastapi.responses import StreamingResponse
 
-    db = await get_db()
     if active is not None:
         rows = await db.execute("SELECT * FROM hr_members WHERE is_active=? ORDER BY id", (active,))
     else:
@@ -1454,7 +1628,7 @@ async def download_members(active: Optional[int] = None):
 
 
 @app.post("/api/hr/members/upload")
-async def upload_members(file: UploadFile = File(...)):
+async def upload_members(file: UploadFile = File(...), db=Depends(db_session)):
     """팀원 엑셀 업로드 (신규 추가 또는 기존 업데이트)"""
     import openpyxl, io
 
@@ -1462,7 +1636,6 @@ async def upload_members(file: UploadFile = File(...)):
     wb = openpyxl.load_workbook(io.BytesIO(content))
     ws = wb.active
 
-    db = await get_db()
     added, updated = 0, 0
 
     for row in ws.iter_rows(min_row=2, values_only=True):
@@ -1491,14 +1664,14 @@ async def upload_members(file: UploadFile = File(...)):
                 (name, github, role, monthly_usdt, wallet, contract_start, contract_end or None, is_active))
             added += 1
 
+    await _refresh_payroll_summary(db, [_current_period()])
     await db.commit()
     await db.close()
     return {"added": added, "updated": updated, "message": f"{added}명 추가, {updated}명 업데이트"}
 
 
 @app.get("/api/hr/members")
-async def list_hr_members(active: Optional[int] = None):
-    db = await get_db()
+async def list_hr_members(active: Optional[int] = None, db=Depends(db_session)):
     if active is not None:
         rows = await db.execute("SELECT * FROM hr_members WHERE is_active=? ORDER BY id", (active,))
     else:
@@ -1508,8 +1681,7 @@ async def list_hr_members(active: Optional[int] = None):
     return result
 
 @app.get("/api/hr/members/{member_id}")
-async def get_hr_member(member_id: int):
-    db = await get_db()
+async def get_hr_member(member_id: int, db=Depends(db_session)):
     row = await db.execute("SELECT * FROM hr_members WHERE id=?", (member_id,))
     member = await row.fetchone()
     if not member:
@@ -1524,19 +1696,18 @@ async def get_hr_member(member_id: int):
     return m
 
 @app.post("/api/hr/members")
-async def create_hr_member(data: HRMemberCreate):
-    db = await get_db()
+async def create_hr_member(data: HRMemberCreate, db=Depends(db_session)):
     cursor = await db.execute(
         "INSERT INTO hr_members (name, github, role, monthly_usdt, wallet_address, contract_start, drive_folder_name, tax_treatment) VALUES (?,?,?,?,?,?,?,?)",
         (data.name, data.github, data.role, data.monthly_usdt, data.wallet_address, data.contract_start, data.drive_folder_name, data.tax_treatment))
+    await _refresh_payroll_summary(db, [_current_period()])
     await db.commit()
     mid = cursor.lastrowid
     await db.close()
     return {"id": mid, "message": "Member created"}
 
 @app.put("/api/hr/members/{member_id}")
-async def update_hr_member(member_id: int, data: HRMemberUpdate):
-    db = await get_db()
+async def update_hr_member(member_id: int, data: HRMemberUpdate, db=Depends(db_session)):
     row = await db.execute("SELECT * FROM hr_members WHERE id=?", (member_id,))
     if not await row.fetchone():
         await db.close()
@@ -1545,39 +1716,42 @@ async def update_hr_member(member_id: int, data: HRMemberUpdate):
     if updates:
         set_clause = ", ".join(f"{k}=?" for k in updates)
         await db.execute(f"UPDATE hr_members SET {set_clause} WHERE id=?", list(updates.values()) + [member_id])
+        await _refresh_payroll_summary(db, [_current_period()])
         await db.commit()
     await db.close()
     return {"message": "Updated"}
 
 @app.delete("/api/hr/members/{member_id}")
-async def delete_hr_member(member_id: int, permanent: bool = False):
-    db = await get_db()
+async def delete_hr_member(member_id: int, permanent: bool = False, db=Depends(db_session)):
+    periods = [_current_period()]
     if permanent:
+        periods += await _touched_periods(db, "payrolls", "member_id=?", (member_id,))
         await db.execute("DELETE FROM payrolls WHERE member_id=?", (member_id,))
         await db.execute("DELETE FROM incentives WHERE member_id=?", (member_id,))
         await db.execute("DELETE FROM reserves WHERE member_id=?", (member_id,))
         await db.execute("DELETE FROM hr_members WHERE id=?", (member_id,))
     else:
         await db.execute("UPDATE hr_members SET is_active=0 WHERE id=?", (member_id,))
+    await _refresh_payroll_summary(db, periods)
     await db.commit()
     await db.close()
     return {"message": "Deleted" if permanent else "Deactivated"}
 
 @app.post("/api/hr/members/{member_id}/retire")
-async def retire_hr_member(member_id: int, data: dict):
+async def retire_hr_member(member_id: int, data: dict, db=Depends(db_session)):
     """퇴직 처리 (is_active=0, contract_end 기록)"""
-    db = await get_db()
     contract_end = data.get("contract_end", datetime.now().strftime("%Y-%m-%d"))
     await db.execute("UPDATE hr_members SET is_active=0, contract_end=? WHERE id=?", (contract_end, member_id))
+    await _refresh_payroll_summary(db, [_current_period()])
     await db.commit()
     await db.close()
     return {"message": "퇴직 처리 완료"}
 
 @app.post("/api/hr/members/{member_id}/reinstate")
-async def reinstate_hr_member(member_id: int):
+async def reinstate_hr_member(member_id: int, db=Depends(db_session)):
     """복직 처리 (is_active=1, contract_end 제거)"""
-    db = await get_db()
     await db.execute("UPDATE hr_members SET is_active=1, contract_end=NULL WHERE id=?", (member_id,))
+    await _refresh_payroll_summary(db, [_current_period()])
     await db.commit()
     await db.close()
     return {"message": "복직 처리 완료"}
@@ -1586,12 +1760,11 @@ async def reinstate_hr_member(member_id: int):
 # ── Payroll ──
 
 @app.get("/api/hr/payroll/download")
-async def download_payroll(year: int = 2026, month: Optional[int] = None):
+async def download_payroll(year: int = 2026, month: Optional[int] = None, db=Depends(db_session)):
     """급여 월별 엑셀 다운로드"""
     import openpyxl, io
     from fastapi.responses import StreamingResponse
 
-    db = await get_db()
     if month:
         rows = await db.execute("""
             SELECT p.*, m.name, m.role FROM payrolls p
@@ -1623,39 +1796,82 @@ async def download_payroll(year: int = 2026, month: Optional[int] = None):
     return StreamingResponse(buf, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         headers={"Content-Disposition": f"attachment; filename={fname}"})
 
+# 연도 내 (멤버, 월)별 경비 합계 — 급여 행에 LEFT JOIN 해서 한 쿼리로 붙인다 (파라미터: year)
+PAYROLL_EXPENSE_CTE = """
+    WITH exp AS (
+        SELECT member_id, month, COALESCE(SUM(amount_usdt), 0) AS expense_total, COUNT(*) AS expense_count
+        FROM expenses WHERE year = ?
+        GROUP BY member_id, month
+    )
+"""
+PAYROLL_EXPENSE_JOIN = "LEFT JOIN exp e ON e.member_id = p.member_id AND e.month = p.month"
+
+# payroll_monthly_summary 한 달치 재계산 (파라미터: year, month, year, month, year, month).
+# GROUP BY 없는 집계라 급여가 0건인 달도 행이 하나 나온다(경비·재직자 예상치만 남음).
+PAYROLL_SUMMARY_REFRESH = """
+    INSERT INTO payroll_monthly_summary (
+        year, month, payroll_count, total_usdt, total_krw, total_tax, tax_accrued,
+        rate_sum, rate_count, expense_usdt, active_member_count, active_member_usdt, updated_at)
+    SELECT CAST(? AS INTEGER), CAST(? AS INTEGER), COUNT(*),
+           COALESCE(SUM(usdt_amount), 0), COALESCE(SUM(krw_amount), 0), COALESCE(SUM(tax_simulated), 0),
+           COALESCE(SUM(CASE WHEN tax_simulated > 0 THEN tax_simulated ELSE 0 END), 0),
+           COALESCE(SUM(CASE WHEN krw_rate > 0 THEN krw_rate ELSE 0 END), 0),
+           COALESCE(SUM(CASE WHEN krw_rate > 0 THEN 1 ELSE 0 END), 0),
+           (SELECT COALESCE(SUM(amount_usdt), 0) FROM expenses WHERE year = ? AND month = ?),
+           (SELECT COUNT(*) FROM hr_members WHERE is_active = 1),
+           (SELECT COALESCE(SUM(monthly_usdt), 0) FROM hr_members WHERE is_active = 1),
+           datetime('now')
+    FROM payrolls WHERE year = ? AND month = ?
+    ON CONFLICT (year, month) DO UPDATE SET
+        payroll_count = excluded.payroll_count, total_usdt = excluded.total_usdt,
+        total_krw = excluded.total_krw, total_tax = excluded.total_tax,
+        tax_accrued = excluded.tax_accrued, rate_sum = excluded.rate_sum,
+        rate_count = excluded.rate_count, expense_usdt = excluded.expense_usdt,
+        active_member_count = excluded.active_member_count,
+        active_member_usdt = excluded.active_member_usdt, updated_at = excluded.updated_at
+"""
+
+
+async def _refresh_payroll_summary(db, periods):
+    """급여/경비/멤버 쓰기 후 영향받은 (year, month) 들의 요약 행만 다시 계산 (한 배치)."""
+    periods = sorted({(int(y), int(m)) for y, m in periods if y and m})
+    if periods:
+        await db.executemany(PAYROLL_SUMMARY_REFRESH, [(y, m, y, m, y, m) for y, m in periods])
+
+
+async def _touched_periods(db, table: str, where: str, params) -> list:
+    """삭제/수정 전에 대상 payrolls/expenses 행들의 (year, month) 를 미리 확보."""
+    rows = await db.execute(f"SELECT DISTINCT year, month FROM {table} WHERE {where}", params)
+    return [(r["year"], r["month"]) for r in await rows.fetchall()]
+
+
+def _current_period() -> tuple:
+    today = datetime.now()
+    return (today.year, today.month)
+
+
 @app.get("/api/hr/payroll")
-async def list_payroll(year: int = 2026, month: Optional[int] = None):
-    db = await get_db()
+async def list_payroll(year: int = 2026, month: Optional[int] = None, db=Depends(db_session)):
+    select = PAYROLL_EXPENSE_CTE + f"""
+        SELECT p.*, m.name, m.role, m.wallet_address,
+               COALESCE(e.expense_total, 0) AS expense_usdt, COALESCE(e.expense_count, 0) AS expense_count
+        FROM payrolls p
+        JOIN hr_members m ON p.member_id = m.id
+        {PAYROLL_EXPENSE_JOIN}
+    """
     if month:
-        rows = await db.execute("""
-            SELECT p.*, m.name, m.role, m.wallet_address FROM payrolls p
-            JOIN hr_members m ON p.member_id = m.id
-            WHERE p.year=? AND p.month=? ORDER BY m.name
-        """, (year, month))
+        rows = await db.execute(select + " WHERE p.year=? AND p.month=? ORDER BY m.name", (year, year, month))
     else:
-        rows = await db.execute("""
-            SELECT p.*, m.name, m.role, m.wallet_address FROM payrolls p
-            JOIN hr_members m ON p.member_id = m.id
-            WHERE p.year=? ORDER BY p.month DESC, m.name
-        """, (year,))
+        rows = await db.execute(select + " WHERE p.year=? ORDER BY p.month DESC, m.name", (year, year))
     result = [dict(r) for r in await rows.fetchall()]
+    await db.close()
 
-    # Attach expense totals per member/month
     for p in result:
-        exp_row = await db.execute(
-            "SELECT COALESCE(SUM(amount_usdt), 0) as expense_total, COUNT(*) as expense_count FROM expenses WHERE member_id=? AND year=? AND month=?",
-            (p["member_id"], p["year"], p["month"]))
-        exp = await exp_row.fetchone()
-        p["expense_usdt"] = exp["expense_total"]
-        p["expense_count"] = exp["expense_count"]
-        p["total_usdt"] = p["usdt_amount"] + exp["expense_total"]
-
-    await db.close()
+        p["total_usdt"] = p["usdt_amount"] + p["expense_usdt"]
     return result
 
 @app.post("/api/hr/payroll/add")
-async def add_payroll(data: PayrollCreate):
-    db = await get_db()
+async def add_payroll(data: PayrollCreate, db=Depends(db_session)):
     existing = await db.execute(
         "SELECT id FROM payrolls WHERE member_id=? AND year=? AND month=?",
         (data.member_id, data.year, data.month))
@@ -1665,38 +1881,43 @@ async def add_payroll(data: PayrollCreate):
     cursor = await db.execute(
         "INSERT INTO payrolls (member_id, year, month, usdt_amount, krw_rate, krw_amount, tax_simulated, reserve_tokamak, net_pay_krw, status) VALUES (?,?,?,?,?,?,?,0,?,?)",
         (data.member_id, data.year, data.month, data.usdt_amount, data.krw_rate, data.krw_amount, data.tax_simulated, data.net_pay_krw, data.status))
+    await _refresh_payroll_summary(db, [(data.year, data.month)])
     await db.commit()
     pid = cursor.lastrowid
     await db.close()
     return {"id": pid, "message": "Created"}
 
 @app.put("/api/hr/payroll/{payroll_id}")
-async def update_payroll(payroll_id: int, data: PayrollUpdate):
-    db = await get_db()
+async def update_payroll(payroll_id: int, data: PayrollUpdate, db=Depends(db_session)):
     updates = {k: v for k, v in data.model_dump().items() if v is not None}
     if updates:
+        periods = await _touched_periods(db, "payrolls", "id=?", (payroll_id,))
         set_clause = ", ".join(f"{k}=?" for k in updates)
         await db.execute(f"UPDATE payrolls SET {set_clause} WHERE id=?", list(updates.values()) + [payroll_id])
+        periods += await _touched_periods(db, "payrolls", "id=?", (payroll_id,))
+        await _refresh_payroll_summary(db, periods)
         await db.commit()
     await db.close()
     return {"message": "Updated"}
 
 @app.delete("/api/hr/payroll/{payroll_id}")
-async def delete_payroll(payroll_id: int):
-    db = await get_db()
+async def delete_payroll(payroll_id: int, db=Depends(db_session)):
+    periods = await _touched_periods(db, "payrolls", "id=?", (payroll_id,))
     await db.execute("DELETE FROM payrolls WHERE id=?", (payroll_id,))
+    await _refresh_payroll_summary(db, periods)
     await db.commit()
     await db.close()
     return {"message": "Deleted"}
 
 @app.post("/api/hr/payroll/bulk-delete")
-async def bulk_delete_payroll(data: dict):
+async def bulk_delete_payroll(data: dict, db=Depends(db_session)):
     ids = data.get("ids", [])
     if not ids:
         return {"message": "No ids"}
-    db = await get_db()
     placeholders = ",".join("?" for _ in ids)
+    periods = await _touched_periods(db, "payrolls", f"id IN ({placeholders})", ids)
     await db.execute(f"DELETE FROM payrolls WHERE id IN ({placeholders})", ids)
+    await _refresh_payroll_summary(db, periods)
     await db.commit()
     await db.close()
     return {"message": f"{len(ids)}건 삭제"}
@@ -1749,52 +1970,42 @@ def _compute_withholding(tax_treatment: str, taxable_krw: int, num_dependents: i
     return round(result.get("total_tax_100", 0))
 
 
-@app.post("/api/hr/payroll/recalculate")
-async def recalculate_payroll(data: dict):
+async def _recalculate_payrolls(db, year: int, month_from: int, month_to: int,
+                                ecos_rate: Optional[float] = None, ecos_date: Optional[str] = None) -> int:
     """
-    경비 포함하여 krw_amount / net_pay_krw 재계산.
-    fx_date가 주어지면 ECOS에서 해당 날짜 종가를 조회하여 krw_rate 갱신.
-    미입력 시 기존 krw_rate 유지.
-    tax_treatment에 따라 비거주자는 세액 0.
+    기간(year, month_from~month_to) 급여 일괄 재계산 엔진.
+    급여·멤버·경비를 쿼리 3번으로 읽고 세액은 메모리에서 계산, UPDATE 는 executemany 한 번.
+    ecos_rate 가 있으면 모든 행의 krw_rate/fx_date 를 그 값으로 교체. 호출 측 트랜잭션 안에서 실행.
     """
-    year, month = data.get("year"), data.get("month")
-    fx_date = data.get("fx_date")  # YYYY-MM-DD or YYYYMMDD
-    if not year or not month:
-        raise HTTPException(400, "year, month required")
+    period = (year, month_from, month_to)
+    p_rows = await db.execute(
+        "SELECT id, member_id, month, usdt_amount, krw_rate, num_dependents FROM payrolls"
+        " WHERE year=? AND month BETWEEN ? AND ?", period)
+    payrolls_list = [dict(r) for r in await p_rows.fetchall()]
+    if not payrolls_list:
+        return 0
 
-    # ECOS 환율 조회 (fx_date 입력 시)
-    ecos_rate = None
-    ecos_date = None
-    if fx_date:
-        ecos_rate, ecos_date = await _ecos_rate_for_date(fx_date)
+    m_rows = await db.execute(
+        "SELECT id, tax_treatment FROM hr_members WHERE id IN"
+        " (SELECT member_id FROM payrolls WHERE year=? AND month BETWEEN ? AND ?)", period)
+    treatments = {r["id"]: dict(r).get("tax_treatment") or "kr_resident" for r in await m_rows.fetchall()}
 
-    db = await get_db()
-    rows = await db.execute(
-        "SELECT p.id, p.member_id, p.usdt_amount, p.krw_rate, p.num_dependents FROM payrolls p WHERE p.year=? AND p.month=?",
-        (year, month))
-    payrolls_list = [dict(r) for r in await rows.fetchall()]
+    e_rows = await db.execute(
+        "SELECT member_id, month, COALESCE(SUM(amount_usdt), 0) AS total FROM expenses"
+        " WHERE year=? AND month BETWEEN ? AND ? GROUP BY member_id, month", period)
+    expense_totals = {(r["member_id"], r["month"]): r["total"] or 0 for r in await e_rows.fetchall()}
 
-    updated = 0
+    updates = []
     for p in payrolls_list:
         # 환율: fx_date 입력 시 ECOS 조회값, 아니면 기존값
         rate = ecos_rate if ecos_rate else (p["krw_rate"] or 0)
         if rate <= 0:
             continue
-
-        # 멤버 tax_treatment 조회
-        m_row = await db.execute("SELECT tax_treatment FROM hr_members WHERE id=?", (p["member_id"],))
-        member = await m_row.fetchone()
-        tax_treatment = (dict(member).get("tax_treatment") or "kr_resident") if member else "kr_resident"
-
+        tax_treatment = treatments.get(p["member_id"], "kr_resident")
         num_deps = p.get("num_dependents") or 1
 
-        # 경비 조회
-        exp_row = await db.execute(
-            "SELECT COALESCE(SUM(amount_usdt), 0) as total FROM expenses WHERE member_id=? AND year=? AND month=?",
-            (p["member_id"], year, month))
-        expense_usdt = (await exp_row.fetchone())["total"] or 0
-        total_usdt = p["usdt_amount"] + expense_usdt
-        krw_amount = round(total_usdt * rate)
+        expense_usdt = expense_totals.get((p["member_id"], p["month"]), 0)
+        krw_amount = round((p["usdt_amount"] + expense_usdt) * rate)
 
         # 세금: Service Fee만 과세, 경비는 비과세
         service_krw = round(p["usdt_amount"] * rate)
@@ -1803,18 +2014,54 @@ async def recalculate_payroll(data: dict):
 
         tax_src = "auto" if tax_treatment == "kr_resident" else "non_resident"
         if ecos_rate:
-            await db.execute(
+            updates.append((rate, krw_amount, tax, net_pay, ecos_date, tax_src, p["id"]))
+        else:
+            updates.append((krw_amount, tax, net_pay, tax_src, p["id"]))
+
+    if updates:
+        if ecos_rate:
+            await db.executemany(
                 "UPDATE payrolls SET krw_rate=?, krw_amount=?, tax_simulated=?, net_pay_krw=?, fx_date=?, tax_source=? WHERE id=?",
-                (rate, krw_amount, tax, net_pay, ecos_date, tax_src, p["id"]))
+                updates)
         else:
-            await db.execute(
+            await db.executemany(
                 "UPDATE payrolls SET krw_amount=?, tax_simulated=?, net_pay_krw=?, tax_source=? WHERE id=?",
-                (krw_amount, tax, net_pay, tax_src, p["id"]))
-        updated += 1
+                updates)
+        await _refresh_payroll_summary(db, [(year, m) for m in range(month_from, month_to + 1)])
+    return len(updates)
+
+
+@app.post("/api/hr/payroll/recalculate")
+async def recalculate_payroll(data: dict, db=Depends(db_session)):
+    """
+    경비 포함하여 krw_amount / net_pay_krw 재계산.
+    fx_date가 주어지면 ECOS에서 해당 날짜 종가를 조회하여 krw_rate 갱신.
+    미입력 시 기존 krw_rate 유지.
+    tax_treatment에 따라 비거주자는 세액 0.
+    기간: month 하나, 또는 month_from~month_to, 둘 다 없으면 연간 전체 (환율 정정용).
+    """
+    year, month = data.get("year"), data.get("month")
+    fx_date = data.get("fx_date")  # YYYY-MM-DD or YYYYMMDD
+    if not year:
+        raise HTTPException(400, "year required")
+    if month:
+        month_from = month_to = int(month)
+    else:
+        month_from, month_to = int(data.get("month_from") or 1), int(data.get("month_to") or 12)
+    if not 1 <= month_from <= month_to <= 12:
+        raise HTTPException(400, "month range must be within 1-12")
+
+    # ECOS 환율 조회 (fx_date 입력 시)
+    ecos_rate = None
+    ecos_date = None
+    if fx_date:
+        ecos_rate, ecos_date = await _ecos_rate_for_date(fx_date)
+
+    async with db.transaction():
+        updated = await _recalculate_payrolls(db, int(year), month_from, month_to, ecos_rate, ecos_date)
 
-    await db.commit()
     await db.close()
-    result = {"message": f"{updated}건 재계산 완료"}
+    result = {"message": f"{updated}건 재계산 완료", "months": [month_from, month_to]}
     if ecos_rate:
         result["fx_rate"] = ecos_rate
         result["fx_date"] = ecos_date
@@ -1823,30 +2070,24 @@ async def recalculate_payroll(data: dict):
 
 
 @app.get("/api/hr/payroll/tax-history")
-async def get_tax_history(year: int = 2026, member_id: Optional[int] = None):
+async def get_tax_history(year: int = 2026, member_id: Optional[int] = None, db=Depends(db_session)):
     """
     과세 히스토리 조회 — 월별 과세 내역 누적.
     과세표준, 적용환율, 환율기준일, 부양가족수, tax_treatment, 세액, 실지급,
     tax_source(auto/manual/non_resident/legacy) 포함.
     비거주자(세액 0)도 행으로 표시.
     """
-    db = await get_db()
+    select = PAYROLL_EXPENSE_CTE + f"""
+        SELECT p.*, m.name, m.tax_treatment, COALESCE(e.expense_total, 0) AS expense_usdt
+        FROM payrolls p
+        JOIN hr_members m ON p.member_id = m.id
+        {PAYROLL_EXPENSE_JOIN}
+    """
     if member_id:
-        rows = await db.execute("""
-            SELECT p.*, m.name, m.tax_treatment
-            FROM payrolls p
-            JOIN hr_members m ON p.member_id = m.id
-            WHERE p.year = ? AND p.member_id = ?
-            ORDER BY p.month ASC
-        """, (year, member_id))
+        rows = await db.execute(select + " WHERE p.year = ? AND p.member_id = ? ORDER BY p.month ASC",
+                                (year, year, member_id))
     else:
-        rows = await db.execute("""
-            SELECT p.*, m.name, m.tax_treatment
-            FROM payrolls p
-            JOIN hr_members m ON p.member_id = m.id
-            WHERE p.year = ?
-            ORDER BY m.name, p.month ASC
-        """, (year,))
+        rows = await db.execute(select + " WHERE p.year = ? ORDER BY m.name, p.month ASC", (year, year))
     payrolls_list = [dict(r) for r in await rows.fetchall()]
     await db.close()
 
@@ -1859,6 +2100,7 @@ async def get_tax_history(year: int = 2026, member_id: Optional[int] = None):
             "year": p["year"],
             "month": p["month"],
             "usdt_amount": p["usdt_amount"],
+            "expense_usdt": p["expense_usdt"],  # 비과세 — krw_amount 에는 포함, 과세표준에서는 제외
             "krw_rate": p["krw_rate"],
             "fx_date": p.get("fx_date"),
             "krw_amount": p["krw_amount"],
@@ -1884,16 +2126,14 @@ async def get_tax_history(year: int = 2026, member_id: Optional[int] = None):
     return {"year": year, "history": history, "annual_summary": list(summary.values())}
 
 @app.post("/api/hr/payroll/confirm")
-async def confirm_payroll(data: PayrollConfirm):
-    db = await get_db()
+async def confirm_payroll(data: PayrollConfirm, db=Depends(db_session)):
     await db.execute("UPDATE payrolls SET status='confirmed', confirmed_at=datetime('now') WHERE year=? AND month=? AND status='estimated'", (data.year, data.month))
     await db.commit()
     await db.close()
     return {"message": "Confirmed"}
 
 @app.post("/api/hr/payroll/pay")
-async def pay_payroll(data: PayrollConfirm):
-    db = await get_db()
+async def pay_payroll(data: PayrollConfirm, db=Depends(db_session)):
     await db.execute("UPDATE payrolls SET status='paid', paid_at=datetime('now') WHERE year=? AND month=? AND status='confirmed'", (data.year, data.month))
     await db.commit()
     await db.close()
@@ -1905,9 +2145,8 @@ class PayrollBulkStatus(BaseModel):
     status: str  # estimated, confirmed, paid
 
 @app.post("/api/hr/payroll/bulk-status")
-async def bulk_update_payroll_status(data: PayrollBulkStatus):
+async def bulk_update_payroll_status(data: PayrollBulkStatus, db=Depends(db_session)):
     """일괄 상태 변경 (해당 연/월 전체)"""
-    db = await get_db()
     if data.status == "confirmed":
         await db.execute("UPDATE payrolls SET status='confirmed', confirmed_at=datetime('now') WHERE year=? AND month=?", (data.year, data.month))
     elif data.status == "paid":
@@ -1928,30 +2167,35 @@ async def bulk_update_payroll_status(data: PayrollBulkStatus):
 # ── Dashboard ──
 
 @app.get("/api/hr/dashboard")
-async def hr_dashboard():
+async def hr_dashboard(db=Depends(db_session)):
     import calendar as _cal
     import math
     from datetime import date
 
-    db = await get_db()
     today = date.today()
     year, month = today.year, today.month
 
-    # 이번 달 급여 데이터
-    rows = await db.execute("SELECT * FROM payrolls WHERE year=? AND month=?", (year, month))
-    payrolls = [dict(r) for r in await rows.fetchall()]
-    total_usdt = sum(p["usdt_amount"] for p in payrolls)
-    total_krw = sum(p["krw_amount"] for p in payrolls)
-    total_tax = sum(p["tax_simulated"] for p in payrolls)
-
-    # 데이터 없으면 재직 팀원 기준 예상치
-    if not payrolls:
-        m_rows = await db.execute("SELECT monthly_usdt FROM hr_members WHERE is_active=1")
-        members = [dict(r) for r in await m_rows.fetchall()]
-        total_usdt = sum(m["monthly_usdt"] for m in members)
-        member_count = len(members)
+    # 연간 집계는 payroll_monthly_summary (월당 1행) 에서 — 원본 테이블은 읽지 않는다
+    rows = await db.execute("SELECT * FROM payroll_monthly_summary WHERE year=?", (year,))
+    summary = {r["month"]: dict(r) for r in await rows.fetchall()}
+    if month not in summary:
+        # 이번 달 급여·경비·멤버 쓰기가 아직 없어 행이 없다 — 저장하지 않고 조회 결과로만 채운다
+        # (행은 그 쓰기들의 _refresh_payroll_summary 가 만든다). 재직자 예상치는 지금 값으로.
+        row = await db.execute(
+            "SELECT COUNT(*) AS n, COALESCE(SUM(monthly_usdt), 0) AS usdt FROM hr_members WHERE is_active = 1")
+        active = await row.fetchone()
+        summary[month] = {
+            "payroll_count": 0, "total_usdt": 0, "total_krw": 0, "total_tax": 0, "tax_accrued": 0,
+            "rate_sum": 0, "rate_count": 0, "active_member_count": active["n"], "active_member_usdt": active["usdt"],
+        }
+    cur = summary[month]
+
+    # 이번 달 급여 데이터 — 없으면 재직 팀원 기준 예상치
+    if cur["payroll_count"]:
+        total_usdt, member_count = cur["total_usdt"], cur["payroll_count"]
     else:
-        member_count = len(payrolls)
+        total_usdt, member_count = cur["active_member_usdt"], cur["active_member_count"]
+    total_krw, total_tax = cur["total_krw"], cur["total_tax"]
 
     # 최근 트랜잭션
     tx_rows = await db.execute("SELECT * FROM hr_transactions ORDER BY timestamp DESC LIMIT 5")
@@ -1964,19 +2208,13 @@ async def hr_dashboard():
     d_day = max((last_day - today).days, 0)
 
     # 연간 세금 누적 적립금
-    tax_acc_row = await db.execute("SELECT SUM(tax_simulated) as total_tax_yr FROM payrolls WHERE year=? AND tax_simulated > 0", (year,))
-    tax_acc = await tax_acc_row.fetchone()
-    total_tax_year_krw = tax_acc["total_tax_yr"] or 0
-
-    rate_row = await db.execute("SELECT AVG(krw_rate) as avg_rate FROM payrolls WHERE year=? AND krw_rate > 0", (year,))
-    rate = await rate_row.fetchone()
-    avg_rate = rate["avg_rate"] or 1
+    total_tax_year_krw = sum(s["tax_accrued"] for s in summary.values())
+    rate_count = sum(s["rate_count"] for s in summary.values())
+    avg_rate = (sum(s["rate_sum"] for s in summary.values()) / rate_count) if rate_count else 1
     total_tax_year_usdt = math.ceil(total_tax_year_krw / avg_rate / 10) * 10 if total_tax_year_krw > 0 else 0
 
     # 연간 총 지급 USDT
-    annual_row = await db.execute("SELECT SUM(usdt_amount) as total FROM payrolls WHERE year=?", (year,))
-    annual = await annual_row.fetchone()
-    annual_usdt = annual["total"] or 0
+    annual_usdt = sum(s["total_usdt"] for s in summary.values())
 
     await db.close()
     return {
@@ -1992,16 +2230,14 @@ async def hr_dashboard():
 # ── Settings & Wallets ──
 
 @app.get("/api/hr/settings")
-async def get_settings():
-    db = await get_db()
+async def get_settings(db=Depends(db_session)):
     rows = await db.execute("SELECT key, value FROM hr_settings")
     settings = {r["key"]: r["value"] for r in await rows.fetchall()}
     await db.close()
     return settings
 
 @app.put("/api/hr/settings")
-async def update_settings(data: dict):
-    db = await get_db()
+async def update_settings(data: dict, db=Depends(db_session)):
     for k, v in data.items():
         await db.execute("INSERT OR REPLACE INTO hr_settings (key, value) VALUES (?,?)", (k, v))
     await db.commit()
@@ -2009,8 +2245,7 @@ async def update_settings(data: dict):
     return {"message": "Updated"}
 
 @app.get("/api/hr/wallets")
-async def list_wallets():
-    db = await get_db()
+async def list_wallets(db=Depends(db_session)):
     rows = await db.execute("SELECT * FROM hr_wallets WHERE is_active=1 ORDER BY id")
     result = [dict(r) for r in await rows.fetchall()]
     await db.close()
@@ -2022,8 +2257,7 @@ class WalletCreate(BaseModel):
     chain: str = "ERC-20"
 
 @app.post("/api/hr/wallets")
-async def add_wallet(data: WalletCreate):
-    db = await get_db()
+async def add_wallet(data: WalletCreate, db=Depends(db_session)):
     cursor = await db.execute(
         "INSERT INTO hr_wallets (label, address, chain, created_at) VALUES (?,?,?,datetime('now'))",
         (data.label, data.address, data.chain))
@@ -2033,8 +2267,7 @@ async def add_wallet(data: WalletCreate):
     return {"id": wid, "message": "Added"}
 
 @app.put("/api/hr/wallets/{wallet_id}")
-async def update_wallet(wallet_id: int, data: WalletCreate):
-    db = await get_db()
+async def update_wallet(wallet_id: int, data: WalletCreate, db=Depends(db_session)):
     await db.execute("UPDATE hr_wallets SET label=?, address=?, chain=? WHERE id=?",
                      (data.label, data.address, data.chain, wallet_id))
     await db.commit()
@@ -2042,8 +2275,7 @@ async def update_wallet(wallet_id: int, data: WalletCreate):
     return {"message": "Updated"}
 
 @app.delete("/api/hr/wallets/{wallet_id}")
-async def delete_wallet(wallet_id: int):
-    db = await get_db()
+async def delete_wallet(wallet_id: int, db=Depends(db_session)):
     await db.execute("DELETE FROM hr_wallets WHERE id=?", (wallet_id,))
     await db.commit()
     await db.close()
@@ -2074,8 +2306,7 @@ class ExpenseUpdate(BaseModel):
     expense_date: Optional[str] = None
 
 @app.get("/api/hr/expenses")
-async def list_expenses(year: int = 2026, month: Optional[int] = None):
-    db = await get_db()
+async def list_expenses(year: int = 2026, month: Optional[int] = None, db=Depends(db_session)):
     if month:
         rows = await db.execute("""
             SELECT e.*, m.name, m.role FROM expenses e
@@ -2093,41 +2324,43 @@ async def list_expenses(year: int = 2026, month: Optional[int] = None):
     return result
 
 @app.post("/api/hr/expenses")
-async def create_expense(data: ExpenseCreate):
-    db = await get_db()
+async def create_expense(data: ExpenseCreate, db=Depends(db_session)):
     cursor = await db.execute(
         "INSERT INTO expenses (member_id, year, month, amount_usdt, category, description, tx_hash, memo, status, expense_date, created_at) VALUES (?,?,?,?,?,?,?,?,?,?,datetime('now'))",
         (data.member_id, data.year, data.month, data.amount_usdt, data.category, data.description, data.tx_hash, data.memo, data.status, data.expense_date))
+    await _refresh_payroll_summary(db, [(data.year, data.month)])
     await db.commit()
     eid = cursor.lastrowid
     await db.close()
     return {"id": eid, "message": "Created"}
 
 @app.put("/api/hr/expenses/{expense_id}")
-async def update_expense(expense_id: int, data: ExpenseUpdate):
-    db = await get_db()
+async def update_expense(expense_id: int, data: ExpenseUpdate, db=Depends(db_session)):
     updates = {k: v for k, v in data.model_dump().items() if v is not None}
     if updates:
+        periods = await _touched_periods(db, "expenses", "id=?", (expense_id,))
         set_clause = ", ".join(f"{k}=?" for k in updates)
         await db.execute(f"UPDATE expenses SET {set_clause} WHERE id=?", list(updates.values()) + [expense_id])
+        periods += await _touched_periods(db, "expenses", "id=?", (expense_id,))
+        await _refresh_payroll_summary(db, periods)
         await db.commit()
     await db.close()
     return {"message": "Updated"}
 
 @app.delete("/api/hr/expenses/{expense_id}")
-async def delete_expense(expense_id: int):
-    db = await get_db()
+async def delete_expense(expense_id: int, db=Depends(db_session)):
+    periods = await _touched_periods(db, "expenses", "id=?", (expense_id,))
     await db.execute("DELETE FROM expenses WHERE id=?", (expense_id,))
+    await _refresh_payroll_summary(db, periods)
     await db.commit()
     await db.close()
     return {"message": "Deleted"}
 
 @app.get("/api/hr/expenses/download")
-async def download_expenses(year: int = 2026, month: Optional[int] = None):
+async def download_expenses(year: int = 2026, month: Optional[int] = None, db=Depends(db_session)):
     import openpyxl, io
     from fastapi.responses import StreamingResponse
 
-    db = await get_db()
     if month:
         rows = await db.execute("""
             SELECT e.*, m.name FROM expenses e JOIN hr_members m ON e.member_id = m.id
@@ -2159,9 +2392,8 @@ async def download_expenses(year: int = 2026, month: Optional[int] = None):
 
 
 @app.post("/api/hr/expenses/bulk-status")
-async def bulk_update_expense_status(data: dict):
+async def bulk_update_expense_status(data: dict, db=Depends(db_session)):
     """경비 일괄 상태 변경"""
-    db = await get_db()
     year = data["year"]
     month = data.get("month")
     status = data["status"]
@@ -2177,7 +2409,7 @@ async def bulk_update_expense_status(data: dict):
     return {"message": f"{cnt}건 → {label}", "count": cnt}
 
 @app.post("/api/hr/expenses/upload")
-async def upload_expenses(file: UploadFile = File(...)):
+async def upload_expenses(file: UploadFile = File(...), db=Depends(db_session)):
     """경비 엑셀 일괄 업로드. 컬럼: 연도, 월, 이름, 금액(USDT), 카테고리, 내용, TX Hash, 상태, 발생일"""
     import openpyxl, io
 
@@ -2185,8 +2417,13 @@ async def upload_expenses(file: UploadFile = File(...)):
     wb = openpyxl.load_workbook(io.BytesIO(content))
     ws = wb.active
 
-    db = await get_db()
-    added, skipped = 0, 0
+    skipped = 0
+    m_rows = await db.execute("SELECT id, name FROM hr_members ORDER BY id")
+    member_ids = {}
+    for r in await m_rows.fetchall():
+        member_ids.setdefault(r["name"], r["id"])
+    new_rows = []
+    now = now_text()
 
     for row in ws.iter_rows(min_row=2, values_only=True):
         if not row[0] or not row[2]:
@@ -2202,17 +2439,18 @@ async def upload_expenses(file: UploadFile = File(...)):
         status = str(row[8] or "pending").strip() if len(row) > 8 else "pending"
         expense_date = str(row[9] or "").strip() if len(row) > 9 else ""
 
-        r = await db.execute("SELECT id FROM hr_members WHERE name=?", (name,))
-        member = await r.fetchone()
-        if not member:
+        member_id = member_ids.get(name)
+        if member_id is None:
             skipped += 1
             continue
 
-        await db.execute(
-            "INSERT INTO expenses (member_id, year, month, amount_usdt, category, description, tx_hash, memo, status, expense_date, created_at) VALUES (?,?,?,?,?,?,?,?,?,?,datetime('now'))",
-            (member["id"], year, month, amount, category, description, tx_hash, memo, status, expense_date))
-        added += 1
+        new_rows.append((member_id, year, month, amount, category, description, tx_hash, memo, status, expense_date, now))
 
+    added = await db.bulk_insert(
+        "expenses",
+        ("member_id", "year", "month", "amount_usdt", "category", "description", "tx_hash", "memo", "status", "expense_date", "created_at"),
+        new_rows)
+    await _refresh_payroll_summary(db, {(r[1], r[2]) for r in new_rows})
     await db.commit()
     await db.close()
     return {"added": added, "skipped": skipped, "message": f"{added}건 추가, {skipped}건 스킵"}
@@ -2250,10 +2488,97 @@ async def download_expenses_template():
 
 # ── Fiat Transactions (법인 입출금) ──
 
+from accounting.fiat_dates import normalize_tx_date, tx_period
+
+# 업로드 일괄 적재(bulk_insert) 컬럼 순서
+FIAT_WISE_COLUMNS = ("tx_id", "source", "direction", "status", "amount", "currency", "counterparty", "counterparty_id",
+                     "category", "reference", "note", "exchange_rate", "tx_date", "tx_year", "tx_month",
+                     "fee_amount", "gross_amount", "created_at")
+FIAT_ASPIRE_COLUMNS = ("tx_id", "source", "direction", "status", "amount", "currency", "counterparty", "counterparty_id",
+                       "category", "reference", "note", "exchange_rate", "balance", "tx_date", "tx_year", "tx_month",
+                       "fee_amount", "gross_amount", "created_at")
+
+# list_fiat 총건수 캐시: 필터 → (버전, 시각, 건수). 업로드/삭제 때 _fiat_version 을 올려 무효화.
+# 워커별 캐시라 다른 워커의 쓰기는 TTL 이 지나야 반영된다.
+FIAT_COUNT_TTL = 60
+_fiat_count_cache: dict = {}
+_fiat_version = 0
+
+
+def _bump_fiat_version():
+    global _fiat_version
+    _fiat_version += 1
+
+
+def _fiat_filters(year=None, month=None, currency="", direction="", source=""):
+    """연/월은 정규화된 tx_year / tx_month 컬럼으로 (idx_fiat_period)."""
+    conditions, params = [], []
+    if year:
+        conditions.append("tx_year=?")
+        params.append(year)
+    if month:
+        conditions.append("tx_month=?")
+        params.append(month)
+    if currency:
+        conditions.append("currency=?")
+        params.append(currency)
+    if direction:
+        conditions.append("direction=?")
+        params.append(direction)
+    if source:
+        conditions.append("source=?")
+        params.append(source)
+    return conditions, params
+
+
+async def _counterparty_ids(db, names) -> dict:
+    """거래처 이름 → counterparties.id. 처음 보는 이름은 만들고, 규칙 해석은 다음 조회 때 다시 하도록 표시."""
+    global _counterparties_resolved
+    names = {n for n in names if n}
+    if not names:
+        return {}
+    rows = await db.execute("SELECT id, name FROM counterparties")
+    ids = {r["name"]: r["id"] for r in await rows.fetchall()}
+    missing = sorted(names - ids.keys())
+    if missing:
+        await db.executemany(
+            "INSERT INTO counterparties (name) VALUES (?) ON CONFLICT (name) DO NOTHING", [(n,) for n in missing])
+        placeholders = ",".join("?" for _ in missing)
+        rows = await db.execute(f"SELECT id, name FROM counterparties WHERE name IN ({placeholders})", missing)
+        ids.update({r["name"]: r["id"] for r in await rows.fetchall()})
+        _counterparties_resolved = None
+    return {n: ids[n] for n in names}
+
+
+async def _refresh_counterparty_stats(db, ids):
+    """업로드/삭제로 건수가 바뀐 거래처만 tx_count / total_amount 재집계."""
+    ids = sorted({i for i in ids if i})
+    if ids:
+        placeholders = ",".join("?" for _ in ids)
+        await db.execute(f"""
+            UPDATE counterparties SET
+                tx_count = (SELECT COUNT(*) FROM fiat_transactions f WHERE f.counterparty_id = counterparties.id),
+                total_amount = (SELECT COALESCE(SUM(amount), 0) FROM fiat_transactions f WHERE f.counterparty_id = counterparties.id)
+            WHERE id IN ({placeholders})
+        """, ids)
+
+
+async def _fiat_count(db, where: str, params: list) -> int:
+    key = (where, tuple(params))
+    hit = _fiat_count_cache.get(key)
+    if hit and hit[0] == _fiat_version and time.monotonic() - hit[1] < FIAT_COUNT_TTL:
+        return hit[2]
+    row = await db.execute(f"SELECT COUNT(*) as cnt FROM fiat_transactions{where}", params)
+    total = (await row.fetchone())["cnt"]
+    if len(_fiat_count_cache) > 512:
+        _fiat_count_cache.clear()
+    _fiat_count_cache[key] = (_fiat_version, time.monotonic(), total)
+    return total
+
+
 @app.get("/api/hr/fiat/upload-status")
-async def fiat_upload_status():
+async def fiat_upload_status(db=Depends(db_session)):
     """최근 업로드 시점 및 데이터 현황"""
-    db = await get_db()
     total_row = await db.execute("SELECT COUNT(*) as cnt FROM fiat_transactions")
     total = (await total_row.fetchone())["cnt"]
     latest_row = await db.execute("SELECT MAX(created_at) as latest FROM fiat_transactions")
@@ -2264,46 +2589,41 @@ async def fiat_upload_status():
     return {"total": total, "latest_upload": latest, "sources": sources}
 
 @app.get("/api/hr/fiat")
-async def list_fiat(currency: str = "", direction: str = "", source: str = "", year: Optional[int] = None, month: Optional[int] = None, limit: int = 100, offset: int = 0):
-    db = await get_db()
-    conditions, params = [], []
-    if currency:
-        conditions.append("currency=?")
-        params.append(currency)
-    if direction:
-        conditions.append("direction=?")
-        params.append(direction)
-    if source:
-        conditions.append("source=?")
-        params.append(source)
-    if year:
-        conditions.append("CAST(substr(tx_date, 1, 4) AS INTEGER)=?")
-        params.append(year)
-    if month:
-        conditions.append("CAST(substr(tx_date, 6, 2) AS INTEGER)=?")
-        params.append(month)
+async def list_fiat(currency: str = "", direction: str = "", source: str = "", year: Optional[int] = None, month: Optional[int] = None, limit: int = 100, offset: int = 0, cursor: str = "", db=Depends(db_session)):
+    """
+    입출금 목록 (tx_date, id 내림차순 — tx_date 가 없는 행은 '' 로 보고 맨 뒤).
+    cursor: 이전 응답의 next_cursor ("tx_date|id") — 주면 offset 대신 그 다음 행부터 (keyset).
+    total 은 필터별로 캐시된 건수.
+    """
+    conditions, params = _fiat_filters(year, month, currency, direction, source)
     where = " WHERE " + " AND ".join(conditions) if conditions else ""
-    rows = await db.execute(f"SELECT * FROM fiat_transactions{where} ORDER BY tx_date DESC LIMIT ? OFFSET ?", params + [limit, offset])
+    total = await _fiat_count(db, where, params)
+
+    page_conditions, page_params = list(conditions), list(params)
+    if cursor:
+        try:
+            cur_date, cur_id = cursor.rsplit("|", 1)
+            cur_id = int(cur_id)
+        except ValueError:
+            await db.close()
+            raise HTTPException(400, "invalid cursor")
+        # row value — idx_fiat_date0_id 범위 조건. NULL 날짜도 비교되도록 정렬과 같은 식을 쓴다
+        page_conditions.append("(COALESCE(tx_date, ''), id) < (?, ?)")
+        page_params += [cur_date, cur_id]
+        offset = 0
+    page_where = " WHERE " + " AND ".join(page_conditions) if page_conditions else ""
+    rows = await db.execute(
+        f"SELECT * FROM fiat_transactions{page_where} ORDER BY COALESCE(tx_date, '') DESC, id DESC LIMIT ? OFFSET ?",
+        page_params + [limit, offset])
     data = [dict(r) for r in await rows.fetchall()]
-    count_row = await db.execute(f"SELECT COUNT(*) as cnt FROM fiat_transactions{where}", params)
-    total = (await count_row.fetchone())["cnt"]
     await db.close()
-    return {"transactions": data, "total": total}
+    next_cursor = f"{data[-1]['tx_date'] or ''}|{data[-1]['id']}" if len(data) == limit else None
+    return {"transactions": data, "total": total, "next_cursor": next_cursor}
 
 @app.get("/api/hr/fiat/summary")
-async def fiat_summary(year: Optional[int] = None, month: Optional[int] = None, source: str = ""):
-    db = await get_db()
-    conditions = ["(status='COMPLETED' OR status='completed')"]
-    params: list = []
-    if year:
-        conditions.append("CAST(substr(tx_date, 1, 4) AS INTEGER)=?")
-        params.append(year)
-    if month:
-        conditions.append("CAST(substr(tx_date, 6, 2) AS INTEGER)=?")
-        params.append(month)
-    if source:
-        conditions.append("source=?")
-        params.append(source)
+async def fiat_summary(year: Optional[int] = None, month: Optional[int] = None, source: str = "", db=Depends(db_session)):
+    conditions, params = _fiat_filters(year, month, source=source)
+    conditions.append("(status='COMPLETED' OR status='completed')")
     where = " WHERE " + " AND ".join(conditions)
     rows = await db.execute(f"""
         SELECT currency, direction,
@@ -2316,27 +2636,32 @@ async def fiat_summary(year: Optional[int] = None, month: Optional[int] = None,
     return data
 
 @app.post("/api/hr/fiat/upload-wise")
-async def upload_wise_csv(file: UploadFile = File(...)):
+async def upload_wise_csv(file: UploadFile = File(...), db=Depends(db_session)):
     """WISE CSV 업로드"""
     import csv, io
 
     content = (await file.read()).decode("utf-8-sig")
     reader = csv.DictReader(io.StringIO(content))
 
-    db = await get_db()
     existing = set()
     rows = await db.execute("SELECT tx_id FROM fiat_transactions WHERE source='WISE'")
     for r in await rows.fetchall():
         existing.add(r["tx_id"])
 
-    added, skipped = 0, 0
-    for row in reader:
+    skipped = 0
+    new_rows = []
+    now = now_text()
+    rows_in = list(reader)
+    cp_ids = await _counterparty_ids(
+        db, [row.get("Target name", "") or row.get("Source name", "") for row in rows_in])
+    for row in rows_in:
         tx_id = row.get("ID", "").strip()
         if not tx_id:
             continue
         if tx_id in existing:
             skipped += 1
             continue
+        existing.add(tx_id)
         status = row.get("Status", "")
         direction = row.get("Direction", "")
         amount = float(row.get("Source amount (after fees)") or 0)
@@ -2344,21 +2669,22 @@ async def upload_wise_csv(file: UploadFile = File(...)):
         gross = amount + fee if fee > 0 else amount
         currency = row.get("Source currency", "") or row.get("Source fee currency", "")
         counterparty = row.get("Target name", "") or row.get("Source name", "")
-        tx_date = row.get("Finished on", "") or row.get("Created on", "")
+        tx_date = normalize_tx_date(row.get("Finished on", "") or row.get("Created on", ""))
 
-        await db.execute(
-            "INSERT INTO fiat_transactions (tx_id, source, direction, status, amount, currency, counterparty, category, reference, note, exchange_rate, tx_date, fee_amount, gross_amount, created_at) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,datetime('now'))",
-            (tx_id, "WISE", direction, status, amount, currency, counterparty,
+        new_rows.append(
+            (tx_id, "WISE", direction, status, amount, currency, counterparty, cp_ids.get(counterparty),
              row.get("Category", ""), row.get("Reference", ""), row.get("Note", ""),
-             float(row.get("Exchange rate") or 0), tx_date, fee, gross))
-        added += 1
+             float(row.get("Exchange rate") or 0), tx_date, *tx_period(tx_date), fee, gross, now))
 
+    added = await db.bulk_insert("fiat_transactions", FIAT_WISE_COLUMNS, new_rows)
+    await _refresh_counterparty_stats(db, {r[7] for r in new_rows})
     await db.commit()
+    _bump_fiat_version()
     await db.close()
     return {"added": added, "skipped": skipped, "message": f"WISE: {added}건 추가, {skipped}건 중복 제외"}
 
 @app.post("/api/hr/fiat/upload-aspire")
-async def upload_aspire_excel(file: UploadFile = File(...)):
+async def upload_aspire_excel(file: UploadFile = File(...), db=Depends(db_session)):
     """Aspire 엑셀 업로드 (USD/SGD/GBP)"""
     import openpyxl, io
 
@@ -2374,20 +2700,22 @@ async def upload_aspire_excel(file: UploadFile = File(...)):
             currency = h.split("(")[1].replace(")", "").strip()
             break
 
-    db = await get_db()
     existing = set()
     rows = await db.execute("SELECT tx_id FROM fiat_transactions WHERE source='Aspire'")
     for r in await rows.fetchall():
         existing.add(r["tx_id"])
 
-    added, skipped = 0, 0
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        if not row[1]:
-            continue
+    skipped = 0
+    new_rows = []
+    now = now_text()
+    rows_in = [row for row in ws.iter_rows(min_row=2, values_only=True) if row[1]]
+    cp_ids = await _counterparty_ids(db, [str(row[4] or "") for row in rows_in])
+    for row in rows_in:
         tx_id = str(row[1]).strip()
         if tx_id in existing:
             skipped += 1
             continue
+        existing.add(tx_id)
         tx_type = str(row[2] or "")
         amount = float(row[3] or 0)
         counterparty = str(row[4] or "")
@@ -2395,7 +2723,7 @@ async def upload_aspire_excel(file: UploadFile = File(...)):
         category = str(row[10] or "")
         note = str(row[11] or "")
         balance = float(row[12] or 0) if row[12] else 0
-        tx_date = str(row[16] or "")
+        tx_date = normalize_tx_date(row[16])
         direction = "IN" if tx_type == "credit" else "OUT"
 
         # Parse fee from reference (e.g., "Fee: SGD 12.50")
@@ -2406,46 +2734,38 @@ async def upload_aspire_excel(file: UploadFile = File(...)):
             fee = float(fee_match.group(1))
         gross = abs(amount) + fee if fee > 0 else abs(amount)
 
-        await db.execute(
-            "INSERT INTO fiat_transactions (tx_id, source, direction, status, amount, currency, counterparty, category, reference, note, exchange_rate, balance, tx_date, fee_amount, gross_amount, created_at) VALUES (?,?,?,?,?,?,?,?,?,?,0,?,?,?,?,datetime('now'))",
-            (tx_id, "Aspire", direction, "COMPLETED", abs(amount), currency, counterparty,
-             category, reference, note, balance, tx_date, fee, gross))
-        added += 1
+        new_rows.append(
+            (tx_id, "Aspire", direction, "COMPLETED", abs(amount), currency, counterparty, cp_ids.get(counterparty),
+             category, reference, note, 0.0, balance, tx_date, *tx_period(tx_date), fee, gross, now))
 
+    added = await db.bulk_insert("fiat_transactions", FIAT_ASPIRE_COLUMNS, new_rows)
+    await _refresh_counterparty_stats(db, {r[7] for r in new_rows})
     await db.commit()
+    _bump_fiat_version()
     await db.close()
     return {"added": added, "skipped": skipped, "message": f"Aspire ({currency}): {added}건 추가, {skipped}건 중복 제외"}
 
 @app.delete("/api/hr/fiat/{tx_id}")
-async def delete_fiat(tx_id: int):
-    db = await get_db()
+async def delete_fiat(tx_id: int, db=Depends(db_session)):
+    row = await db.execute("SELECT counterparty_id FROM fiat_transactions WHERE id=?", (tx_id,))
+    tx = await row.fetchone()
     await db.execute("DELETE FROM fiat_transactions WHERE id=?", (tx_id,))
+    if tx:
+        await _refresh_counterparty_stats(db, [tx["counterparty_id"]])
     await db.commit()
+    _bump_fiat_version()
     await db.close()
     return {"message": "Deleted"}
 
 @app.get("/api/hr/fiat/download")
-async def download_fiat(year: Optional[int] = None, month: Optional[int] = None, currency: str = "", source: str = ""):
+async def download_fiat(year: Optional[int] = None, month: Optional[int] = None, currency: str = "", source: str = "", db=Depends(db_session)):
     """법인 입출금 내역 엑셀 다운로드"""
     import openpyxl, io
     from fastapi.responses import StreamingResponse
 
-    db = await get_db()
-    conditions, params = [], []
-    if year:
-        conditions.append("CAST(substr(tx_date, 1, 4) AS INTEGER)=?")
-        params.append(year)
-    if month:
-        conditions.append("CAST(substr(tx_date, 6, 2) AS INTEGER)=?")
-        params.append(month)
-    if currency:
-        conditions.append("currency=?")
-        params.append(currency)
-    if source:
-        conditions.append("source=?")
-        params.append(source)
+    conditions, params = _fiat_filters(year, month, currency, source=source)
     where = " WHERE " + " AND ".join(conditions) if conditions else ""
-    rows = await db.execute(f"SELECT * FROM fiat_transactions{where} ORDER BY tx_date DESC", params)
+    rows = await db.execute(f"SELECT * FROM fiat_transactions{where} ORDER BY tx_date DESC, id DESC", params)
     data = [dict(r) for r in await rows.fetchall()]
     await db.close()
 
@@ -2471,16 +2791,14 @@ async def download_fiat(year: Optional[int] = None, month: Optional[int] = None,
 # ── Member Wallets ──
 
 @app.get("/api/hr/members/{member_id}/wallets")
-async def list_member_wallets(member_id: int):
-    db = await get_db()
+async def list_member_wallets(member_id: int, db=Depends(db_session)):
     rows = await db.execute("SELECT * FROM member_wallets WHERE member_id=? ORDER BY id", (member_id,))
     result = [dict(r) for r in await rows.fetchall()]
     await db.close()
     return result
 
 @app.post("/api/hr/members/{member_id}/wallets")
-async def add_member_wallet(member_id: int, data: WalletCreate):
-    db = await get_db()
+async def add_member_wallet(member_id: int, data: WalletCreate, db=Depends(db_session)):
     cursor = await db.execute(
         "INSERT INTO member_wallets (member_id, label, address, chain, created_at) VALUES (?,?,?,?,datetime('now'))",
         (member_id, data.label, data.address, data.chain))
@@ -2490,8 +2808,7 @@ async def add_member_wallet(member_id: int, data: WalletCreate):
     return {"id": wid, "message": "Added"}
 
 @app.put("/api/hr/members/wallets/{wallet_id}")
-async def update_member_wallet(wallet_id: int, data: WalletCreate):
-    db = await get_db()
+async def update_member_wallet(wallet_id: int, data: WalletCreate, db=Depends(db_session)):
     await db.execute("UPDATE member_wallets SET label=?, address=?, chain=? WHERE id=?",
                      (data.label, data.address, data.chain, wallet_id))
     await db.commit()
@@ -2499,17 +2816,15 @@ async def update_member_wallet(wallet_id: int, data: WalletCreate):
     return {"message": "Updated"}
 
 @app.delete("/api/hr/members/wallets/{wallet_id}")
-async def delete_member_wallet(wallet_id: int):
-    db = await get_db()
+async def delete_member_wallet(wallet_id: int, db=Depends(db_session)):
     await db.execute("DELETE FROM member_wallets WHERE id=?", (wallet_id,))
     await db.commit()
     await db.close()
     return {"message": "Deleted"}
 
 @app.get("/api/hr/address-map")
-async def get_address_map():
+async def get_address_map(db=Depends(db_session)):
     """모든 지갑 주소 → 이름/라벨 매핑 (트랜잭션 표시용)"""
-    db = await get_db()
     addr_map = {}
 
     # 관리자 지갑 (설정)
@@ -2534,7 +2849,7 @@ async def get_address_map():
 USDT_CONTRACT = "0xdAC17F958D2ee523a2206206994597C13D831ec7".lower()
 
 @app.post("/api/hr/transactions/sync")
-async def sync_etherscan_transactions():
+async def sync_etherscan_transactions(db=Depends(db_session)):
     """등록된 지갑 주소에서 Etherscan API로 ERC-20 트랜잭션 동기화"""
     import httpx
 
@@ -2542,7 +2857,6 @@ async def sync_etherscan_transactions():
     if not api_key:
         raise HTTPException(500, "ETHERSCAN_API_KEY not configured")
 
-    db = await get_db()
 
     # 등록된 지갑 조회
     w_rows = await db.execute("SELECT * FROM hr_wallets WHERE is_active=1")
@@ -2630,10 +2944,9 @@ async def sync_etherscan_transactions():
 
 
 @app.get("/api/hr/transactions/sync-status")
-async def etherscan_sync_status():
+async def etherscan_sync_status(db=Depends(db_session)):
     """동기화 가능 여부 확인"""
     api_key = os.getenv("ETHERSCAN_API_KEY", "")
-    db = await get_db()
     w_rows = await db.execute("SELECT COUNT(*) as cnt FROM hr_wallets WHERE is_active=1")
     wallet_count = (await w_rows.fetchone())["cnt"]
     tx_rows = await db.execute("SELECT COUNT(*) as cnt FROM hr_transactions")
@@ -2650,8 +2963,7 @@ async def etherscan_sync_status():
 # ── Tax Simulation ──
 
 @app.get("/api/hr/tax/simulate/{member_id}")
-async def tax_simulate(member_id: int, year: int = 2026):
-    db = await get_db()
+async def tax_simulate(member_id: int, year: int = 2026, db=Depends(db_session)):
     row = await db.execute("SELECT * FROM hr_members WHERE id=?", (member_id,))
     member = await row.fetchone()
     if not member:
@@ -2690,8 +3002,7 @@ async def tax_simulate(member_id: int, year: int = 2026):
 # ── Incentives ──
 
 @app.get("/api/hr/incentives")
-async def list_incentives(year: int = 2026, quarter: Optional[int] = None):
-    db = await get_db()
+async def list_incentives(year: int = 2026, quarter: Optional[int] = None, db=Depends(db_session)):
     if quarter:
         rows = await db.execute("""
             SELECT i.*, m.name, m.role FROM incentives i
@@ -2712,8 +3023,7 @@ async def list_incentives(year: int = 2026, quarter: Optional[int] = None):
 # ── Transactions ──
 
 @app.get("/api/hr/transactions")
-async def list_hr_transactions(limit: int = 20):
-    db = await get_db()
+async def list_hr_transactions(limit: int = 20, db=Depends(db_session)):
     rows = await db.execute("SELECT * FROM hr_transactions ORDER BY timestamp DESC LIMIT ?", (limit,))
     result = [dict(r) for r in await rows.fetchall()]
     await db.close()
@@ -2730,8 +3040,7 @@ class TransactionCreate(BaseModel):
     note: str = ""
 
 @app.post("/api/hr/transactions")
-async def create_hr_transaction(data: TransactionCreate):
-    db = await get_db()
+async def create_hr_transaction(data: TransactionCreate, db=Depends(db_session)):
     ts = data.timestamp or datetime.now().isoformat()
     cursor = await db.execute(
         "INSERT INTO hr_transactions (tx_hash, from_address, to_address, amount, token, status, timestamp, note) VALUES (?,?,?,?,?,?,?,?)",
@@ -2742,8 +3051,7 @@ async def create_hr_transaction(data: TransactionCreate):
     return {"id": tid, "message": "Created"}
 
 @app.delete("/api/hr/transactions/{tx_id}")
-async def delete_hr_transaction(tx_id: int):
-    db = await get_db()
+async def delete_hr_transaction(tx_id: int, db=Depends(db_session)):
     await db.execute("DELETE FROM hr_transactions WHERE id=?", (tx_id,))
     await db.commit()
     await db.close()
@@ -2753,7 +3061,7 @@ async def delete_hr_transaction(tx_id: int):
 # ── Bulk Payroll History Upload (연도/월 포함 일괄 업로드) ──
 
 @app.post("/api/hr/payroll/upload")
-async def upload_payroll_history(file: UploadFile = File(...)):
+async def upload_payroll_history(file: UploadFile = File(...), db=Depends(db_session)):
     """
     급여이력 일괄 업로드.
     엑셀 컬럼: 연도, 월, 이름, USDT, 환율(선택), 세금(선택), 부양가족수(선택)
@@ -2766,12 +3074,22 @@ async def upload_payroll_history(file: UploadFile = File(...)):
     wb = openpyxl.load_workbook(io.BytesIO(content))
     ws = wb.active
 
-    db = await get_db()
     added, updated, skipped = 0, 0, 0
     dependents_missing = []  # 부양가족수 누락 행 추적
 
     import re
 
+    # 멤버/기존 급여는 한 번에 읽어 두고 행마다 조회하지 않는다
+    m_rows = await db.execute("SELECT id, name, tax_treatment FROM hr_members ORDER BY id")
+    members_by_name = {}
+    for r in await m_rows.fetchall():
+        members_by_name.setdefault(r["name"], dict(r))
+    p_rows = await db.execute("SELECT id, member_id, year, month FROM payrolls")
+    payroll_ids = {(r["member_id"], r["year"], r["month"]): r["id"] for r in await p_rows.fetchall()}
+    to_update = []
+    to_insert = {}  # (member_id, year, month) → row — 같은 파일 내 중복은 마지막 값으로 덮어씀
+    periods = set()
+
     for row_idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
         if not row[0] or not row[2]:
             continue
@@ -2803,10 +3121,9 @@ async def upload_payroll_history(file: UploadFile = File(...)):
             tax = round(tax_override)
             tax_src = "manual"
         elif krw > 0:
-            m_row = await db.execute("SELECT id, tax_treatment FROM hr_members WHERE name=?", (name,))
-            m_info = await m_row.fetchone()
+            m_info = members_by_name.get(name)
             if m_info:
-                treatment = dict(m_info).get("tax_treatment") or "kr_resident"
+                treatment = m_info.get("tax_treatment") or "kr_resident"
                 tax = _compute_withholding(treatment, krw, num_dependents=num_deps)
                 tax_src = "auto" if treatment == "kr_resident" else "non_resident"
             else:
@@ -2817,28 +3134,35 @@ async def upload_payroll_history(file: UploadFile = File(...)):
         net = krw - tax if krw else 0
 
         # 이름으로 멤버 매칭
-        r_member = await db.execute("SELECT id FROM hr_members WHERE name=?", (name,))
-        member = await r_member.fetchone()
+        member = members_by_name.get(name)
         if not member:
             skipped += 1
             continue
         mid = member["id"]
 
-        existing = await db.execute("SELECT id FROM payrolls WHERE member_id=? AND year=? AND month=?", (mid, year, month))
-        ex = await existing.fetchone()
-
-        if ex:
-            await db.execute(
-                "UPDATE payrolls SET usdt_amount=?, krw_rate=?, krw_amount=?, tax_simulated=?, net_pay_krw=?, num_dependents=?, tax_source=?, status='paid' WHERE id=?",
-                (usdt, rate, krw, tax, net, num_deps, tax_src, ex["id"]))
+        key = (mid, year, month)
+        periods.add((year, month))
+        if key in payroll_ids:
+            to_update.append((usdt, rate, krw, tax, net, num_deps, tax_src, payroll_ids[key]))
             updated += 1
         else:
-            await db.execute(
-                "INSERT INTO payrolls (member_id, year, month, usdt_amount, krw_rate, krw_amount, tax_simulated, reserve_tokamak, net_pay_krw, num_dependents, tax_source, status) VALUES (?,?,?,?,?,?,?,0,?,?,?,?)",
-                (mid, year, month, usdt, rate, krw, tax, net, num_deps, tax_src, "paid"))
-            added += 1
+            if key in to_insert:
+                updated += 1
+            else:
+                added += 1
+            to_insert[key] = (mid, year, month, usdt, rate, krw, tax, 0, net, num_deps, tax_src, "paid")
 
-    await db.commit()
+    async with db.transaction():
+        if to_update:
+            await db.executemany(
+                "UPDATE payrolls SET usdt_amount=?, krw_rate=?, krw_amount=?, tax_simulated=?, net_pay_krw=?, num_dependents=?, tax_source=?, status='paid' WHERE id=?",
+                to_update)
+        await db.bulk_insert(
+            "payrolls",
+            ("member_id", "year", "month", "usdt_amount", "krw_rate", "krw_amount", "tax_simulated",
+             "reserve_tokamak", "net_pay_krw", "num_dependents", "tax_source", "status"),
+            to_insert.values())
+        await _refresh_payroll_summary(db, periods)
     await db.close()
     result = {"added": added, "updated": updated, "skipped": skipped,
               "message": f"{added}건 추가, {updated}건 업데이트, {skipped}건 스킵"}
@@ -2848,12 +3172,11 @@ async def upload_payroll_history(file: UploadFile = File(...)):
 
 
 @app.get("/api/hr/payroll/upload-template")
-async def download_payroll_upload_template():
+async def download_payroll_upload_template(db=Depends(db_session)):
     """급여이력 일괄 업로드용 템플릿 (전 팀원 x 연월)"""
     import openpyxl, io
     from fastapi.responses import StreamingResponse
 
-    db = await get_db()
     rows = await db.execute("SELECT name FROM hr_members ORDER BY is_active DESC, id")
     members = [r["name"] for r in await rows.fetchall()]
     await db.close()
@@ -2882,7 +3205,7 @@ async def download_payroll_upload_template():
 # ── Bulk Payroll Calculation (엑셀 업로드) ──
 
 @app.post("/api/hr/calculate/preview")
-async def calculate_payroll_preview(file: UploadFile = File(...)):
+async def calculate_payroll_preview(file: UploadFile = File(...), db=Depends(db_session)):
     """
     엑셀 업로드 → 미리보기 (저장 안 함).
     엑셀 컬럼: 이름, USDT, 환율, 부양가족수(기본1), 8-20세자녀수(기본0)
@@ -2895,7 +3218,6 @@ async def calculate_payroll_preview(file: UploadFile = File(...)):
     ws = wb.active
 
     # 멤버별 tax_treatment 조회
-    db = await get_db()
     m_rows = await db.execute("SELECT name, tax_treatment FROM hr_members WHERE is_active=1")
     member_treatment = {dict(r)["name"]: dict(r).get("tax_treatment") or "kr_resident" for r in await m_rows.fetchall()}
     await db.close()
@@ -2932,53 +3254,52 @@ async def calculate_payroll_preview(file: UploadFile = File(...)):
 
 
 @app.post("/api/hr/calculate/save")
-async def calculate_payroll_save(data: dict):
+async def calculate_payroll_save(data: dict, db=Depends(db_session)):
     """
     미리보기 결과를 payrolls 테이블에 저장.
     data: { year, month, status, results: [...preview results] }
     """
-    db = await get_db()
     year = data["year"]
     month = data["month"]
     status = data.get("status", "estimated")
     saved = 0
 
-    for r in data["results"]:
-        # 이름으로 멤버 매칭
-        row = await db.execute("SELECT id FROM hr_members WHERE name=? AND is_active=1", (r["name"],))
-        member = await row.fetchone()
-        if not member:
-            continue
-        mid = member["id"]
-
-        # 기존 데이터 확인
-        existing = await db.execute("SELECT id FROM payrolls WHERE member_id=? AND year=? AND month=?", (mid, year, month))
-        ex = await existing.fetchone()
-
-        deps = r.get("dependents", 1)
-        tax_src = "auto" if r.get("tax_treatment", "kr_resident") == "kr_resident" else "non_resident"
-        if ex:
-            await db.execute(
-                "UPDATE payrolls SET usdt_amount=?, krw_rate=?, krw_amount=?, tax_simulated=?, net_pay_krw=?, num_dependents=?, tax_source=?, status=? WHERE id=?",
-                (r["usdt_amount"], r["krw_rate"], r["krw_amount"], r["tax_total"], r["net_pay_krw"], deps, tax_src, status, ex["id"]))
-        else:
-            await db.execute(
-                "INSERT INTO payrolls (member_id, year, month, usdt_amount, krw_rate, krw_amount, tax_simulated, reserve_tokamak, net_pay_krw, num_dependents, tax_source, status) VALUES (?,?,?,?,?,?,?,0,?,?,?,?)",
-                (mid, year, month, r["usdt_amount"], r["krw_rate"], r["krw_amount"], r["tax_total"], r["net_pay_krw"], deps, tax_src, status))
-        saved += 1
+    async with db.transaction():
+        for r in data["results"]:
+            # 이름으로 멤버 매칭
+            row = await db.execute("SELECT id FROM hr_members WHERE name=? AND is_active=1", (r["name"],))
+            member = await row.fetchone()
+            if not member:
+                continue
+            mid = member["id"]
+
+            # 기존 데이터 확인
+            existing = await db.execute("SELECT id FROM payrolls WHERE member_id=? AND year=? AND month=?", (mid, year, month))
+            ex = await existing.fetchone()
+
+            deps = r.get("dependents", 1)
+            tax_src = "auto" if r.get("tax_treatment", "kr_resident") == "kr_resident" else "non_resident"
+            if ex:
+                await db.execute(
+                    "UPDATE payrolls SET usdt_amount=?, krw_rate=?, krw_amount=?, tax_simulated=?, net_pay_krw=?, num_dependents=?, tax_source=?, status=? WHERE id=?",
+                    (r["usdt_amount"], r["krw_rate"], r["krw_amount"], r["tax_total"], r["net_pay_krw"], deps, tax_src, status, ex["id"]))
+            else:
+                await db.execute(
+                    "INSERT INTO payrolls (member_id, year, month, usdt_amount, krw_rate, krw_amount, tax_simulated, reserve_tokamak, net_pay_krw, num_dependents, tax_source, status) VALUES (?,?,?,?,?,?,?,0,?,?,?,?)",
+                    (mid, year, month, r["usdt_amount"], r["krw_rate"], r["krw_amount"], r["tax_total"], r["net_pay_krw"], deps, tax_src, status))
+            saved += 1
+        await _refresh_payroll_summary(db, [(year, month)])
 
-    await db.commit()
     await db.close()
     return {"saved": saved, "message": f"{saved}명 급여 데이터 저장 완료"}
 
 
 @app.get("/api/hr/calculate/template")
-async def download_payroll_template():
+async def download_payroll_template(db=Depends(db_session)):
     """급여계산용 엑셀 템플릿 다운로드"""
     import openpyxl, io
     from fastapi.responses import StreamingResponse
 
-    db = await get_db()
     rows = await db.execute("SELECT name, monthly_usdt FROM hr_members WHERE is_active=1 ORDER BY id")
     members = [dict(r) for r in await rows.fetchall()]
     await db.close()
@@ -3182,13 +3503,12 @@ class PayslipRequest(BaseModel):
     tax_percentage: int = 100
 
 @app.get("/api/hr/generate-payslip")
-async def generate_payslip_from_payroll(member_id: int, year: int, month: int):
+async def generate_payslip_from_payroll(member_id: int, year: int, month: int, db=Depends(db_session)):
     """급여 데이터 기반 Payslip PDF 자동 생성"""
     from fastapi.responses import Response
     from payslip_pdf import generate_payslip_pdf
     from tax_calculator import calculate_tax
 
-    db = await get_db()
     # 멤버 정보
     m_row = await db.execute("SELECT * FROM hr_members WHERE id=?", (member_id,))
     member = await m_row.fetchone()
@@ -3196,8 +3516,12 @@ async def generate_payslip_from_payroll(member_id: int, year: int, month: int):
         await db.close()
         raise HTTPException(404, "Member not found")
 
-    # 급여 데이터
-    p_row = await db.execute("SELECT * FROM payrolls WHERE member_id=? AND year=? AND month=?", (member_id, year, month))
+    # 급여 데이터 + 경비 합계 (list_payroll 과 같은 집계)
+    p_row = await db.execute(
+        PAYROLL_EXPENSE_CTE + f"""
+        SELECT p.*, COALESCE(e.expense_total, 0) AS expense_usdt FROM payrolls p {PAYROLL_EXPENSE_JOIN}
+        WHERE p.member_id=? AND p.year=? AND p.month=?
+        """, (year, member_id, year, month))
     payroll = await p_row.fetchone()
     if not payroll:
         await db.close()
@@ -3216,11 +3540,11 @@ async def generate_payslip_from_payroll(member_id: int, year: int, month: int):
         "SELECT category, description, amount_usdt, memo FROM expenses WHERE member_id=? AND year=? AND month=? ORDER BY expense_date",
         (member_id, year, month))
     expenses = [dict(r) for r in await exp_rows.fetchall()]
-    expense_total = sum(e["amount_usdt"] for e in expenses)
 
     await db.close()
 
     p = dict(payroll)
+    expense_total = p["expense_usdt"]
     rate = p["krw_rate"] or 0
     krw = p["krw_amount"] or 0
     tx_hash = p.get("tx_hash", "") or ""
@@ -3300,21 +3624,76 @@ async def usdt_rate():
 # Accounting — Transaction Classifier
 # ══════════════════════════════════════════════════════════════════════════════
 
-from accounting.classifier import classify_transactions
+from accounting.classifier import classify_transactions, CounterpartyMatcher
+
+# 규칙 버전 — 규칙이 바뀌는 곳(add/update/delete_rule, 수동 분류의 규칙 저장)에서 올린다.
+# 컴파일된 matcher 는 이 버전이 같으면 재사용 (단일 uvicorn 워커 기준 프로세스 캐시).
+_rules_version = 0
+_rules_matcher = None  # (version, 분류 matcher, WHT 규칙만의 matcher)
+_counterparties_resolved = None  # counterparties.rule_id 를 마지막으로 채운 규칙 버전
+
+
+def _bump_rules_version():
+    global _rules_version
+    _rules_version += 1
+
+
+async def _load_matchers(db) -> tuple:
+    global _rules_matcher
+    if _rules_matcher is None or _rules_matcher[0] != _rules_version:
+        version = _rules_version
+        rows = await db.execute("SELECT * FROM counterparty_rules ORDER BY id")
+        rules = [dict(r) for r in await rows.fetchall()]
+        _rules_matcher = (version, CounterpartyMatcher(rules),
+                          CounterpartyMatcher([r for r in rules if r.get("wht_flag") == 1]))
+    return _rules_matcher
+
+
+async def _counterparty_matcher(db) -> CounterpartyMatcher:
+    return (await _load_matchers(db))[1]
+
+
+async def _resolve_counterparties(db, ids=None):
+    """counterparties 행마다 규칙을 한 번 해석해 rule_id / wht_rule_id 저장 (바뀐 행만, 한 배치)."""
+    _, matcher, wht_matcher = await _load_matchers(db)
+    if ids is None:
+        rows = await db.execute("SELECT id, name, rule_id, wht_rule_id FROM counterparties")
+    elif ids:
+        placeholders = ",".join("?" for _ in ids)
+        rows = await db.execute(
+            f"SELECT id, name, rule_id, wht_rule_id FROM counterparties WHERE id IN ({placeholders})", list(ids))
+    else:
+        return
+    updates = []
+    for r in await rows.fetchall():
+        rule, wht_rule = matcher.match(r["name"]), wht_matcher.match(r["name"])
+        rule_id, wht_rule_id = rule["id"] if rule else None, wht_rule["id"] if wht_rule else None
+        if (rule_id, wht_rule_id) != (r["rule_id"], r["wht_rule_id"]):
+            updates.append((rule_id, wht_rule_id, r["id"]))
+    if updates:
+        await db.executemany("UPDATE counterparties SET rule_id=?, wht_rule_id=? WHERE id=?", updates)
+
+
+async def _ensure_counterparties_resolved(db):
+    """규칙 버전이 바뀐 뒤(또는 기동 후) 처음 읽을 때 전체 거래처를 다시 해석 — 거래처 수만큼만 돈다."""
+    global _counterparties_resolved
+    if _counterparties_resolved != _rules_version:
+        version = _rules_version
+        await _resolve_counterparties(db)
+        await db.commit()
+        _counterparties_resolved = version
 
 # ── Chart of Accounts ──
 
 @app.get("/api/accounting/chart")
-async def list_chart_of_accounts():
-    db = await get_db()
+async def list_chart_of_accounts(db=Depends(db_session)):
     rows = await db.execute("SELECT * FROM chart_of_accounts WHERE is_active=1 ORDER BY category, name")
     result = [dict(r) for r in await rows.fetchall()]
     await db.close()
     return result
 
 @app.post("/api/accounting/chart")
-async def add_account(data: dict):
-    db = await get_db()
+async def add_account(data: dict, db=Depends(db_session)):
     await db.execute(
         "INSERT INTO chart_of_accounts (code, name, category) VALUES (?, ?, ?)",
         (data["code"], data["name"], data["category"]))
@@ -3326,80 +3705,178 @@ async def add_account(data: dict):
 # ── Counterparty Rules ──
 
 @app.get("/api/accounting/rules")
-async def list_rules():
-    db = await get_db()
+async def list_rules(db=Depends(db_session)):
     rows = await db.execute("SELECT * FROM counterparty_rules ORDER BY pattern")
     result = [dict(r) for r in await rows.fetchall()]
     await db.close()
     return result
 
 @app.post("/api/accounting/rules")
-async def add_rule(data: dict):
-    db = await get_db()
+async def add_rule(data: dict, db=Depends(db_session)):
     await db.execute(
         "INSERT INTO counterparty_rules (pattern, account_code, residence, wht_flag, note, created_at) VALUES (?, ?, ?, ?, ?, datetime('now'))",
         (data["pattern"], data["account_code"], data.get("residence"), data.get("wht_flag", 0), data.get("note", "")))
     await db.commit()
+    _bump_rules_version()
+    reclassified = await _reclassify_for_patterns(db, [data["pattern"]])
     await db.close()
-    return {"message": "Rule added"}
+    return {"message": "Rule added", "reclassified": reclassified}
 
 @app.put("/api/accounting/rules/{rule_id}")
-async def update_rule(rule_id: int, data: dict):
-    db = await get_db()
+async def update_rule(rule_id: int, data: dict, db=Depends(db_session)):
+    old = await db.execute("SELECT pattern FROM counterparty_rules WHERE id=?", (rule_id,))
+    old_rule = await old.fetchone()
     await db.execute(
         "UPDATE counterparty_rules SET pattern=?, account_code=?, residence=?, wht_flag=?, note=?, updated_at=datetime('now') WHERE id=?",
         (data["pattern"], data["account_code"], data.get("residence"), data.get("wht_flag", 0), data.get("note", ""), rule_id))
     await db.commit()
+    _bump_rules_version()
+    reclassified = await _reclassify_for_patterns(db, [data["pattern"], old_rule["pattern"] if old_rule else None])
     await db.close()
-    return {"message": "Updated"}
+    return {"message": "Updated", "reclassified": reclassified}
 
 @app.delete("/api/accounting/rules/{rule_id}")
-async def delete_rule(rule_id: int):
-    db = await get_db()
+async def delete_rule(rule_id: int, db=Depends(db_session)):
+    old = await db.execute("SELECT pattern FROM counterparty_rules WHERE id=?", (rule_id,))
+    old_rule = await old.fetchone()
     await db.execute("DELETE FROM counterparty_rules WHERE id=?", (rule_id,))
     await db.commit()
+    _bump_rules_version()
+    reclassified = await _reclassify_for_patterns(db, [old_rule["pattern"]] if old_rule else [])
     await db.close()
-    return {"message": "Deleted"}
+    return {"message": "Deleted", "reclassified": reclassified}
+
+
+@app.get("/api/accounting/rules/preview")
+async def preview_rule(pattern: str, db=Depends(db_session)):
+    """
+    규칙 초안 미리보기 — pattern 을 새 규칙으로 추가하면 무엇이 잡히는지 (저장 안 함).
+    counterparties(이름별 한 행 + 건수/금액 집계)만 읽으므로 거래 행 수와 무관하게 빠르다.
+    새 규칙은 맨 뒤(가장 큰 id)에 붙으므로 이미 다른 규칙에 걸린 거래처는 가져오지 못한다(shadowed).
+    """
+    needle = pattern.strip().lower()
+    if not needle:
+        await db.close()
+        raise HTTPException(400, "pattern required")
+    await _ensure_counterparties_resolved(db)
+    rows = await db.execute("""
+        SELECT cp.name, cp.tx_count, cp.total_amount, cp.rule_id, cr.pattern AS rule_pattern, cr.account_code
+        FROM counterparties cp LEFT JOIN counterparty_rules cr ON cr.id = cp.rule_id
+    """)
+    matched = [dict(r) for r in await rows.fetchall() if needle in r["name"].lower()]
+    await db.close()
+
+    def _totals(items):
+        return {"counterparties": len(items),
+                "transactions": sum(i["tx_count"] or 0 for i in items),
+                "amount": round(sum(i["total_amount"] or 0 for i in items), 2)}
+
+    captured = [m for m in matched if m["rule_id"] is None]
+    shadowed = {}
+    for m in matched:
+        if m["rule_id"] is not None:
+            entry = shadowed.setdefault(m["rule_id"], {"rule_id": m["rule_id"], "pattern": m["rule_pattern"],
+                                                   "account_code": m["account_code"], "counterparties": 0, "transactions": 0})
+            entry["counterparties"] += 1
+            entry["transactions"] += m["tx_count"] or 0
+    matched.sort(key=lambda m: m["tx_count"] or 0, reverse=True)
+    return {
+        "pattern": pattern,
+        "matches": _totals(matched),
+        "would_classify": _totals(captured),
+        "shadowed_by": sorted(shadowed.values(), key=lambda s: s["transactions"], reverse=True),
+        "examples": [{"name": m["name"], "transactions": m["tx_count"], "amount": m["total_amount"],
+                      "current_rule": m["rule_pattern"]} for m in matched[:20]],
+    }
 
 
 # ── Classify Transactions ──
 
-@app.post("/api/accounting/classify")
-async def run_classification(year: Optional[int] = None):
-    """Run classification on fiat_transactions. Optionally filter by fiscal year."""
-    db = await get_db()
+CLASSIFY_WATERMARK_KEY = "accounting.classify_watermark"  # hr_settings — 마지막 전체 분류 때의 MAX(id)
+CLASSIFY_COLUMNS = "id, tx_date, counterparty, amount, currency, direction, account_code, classified_by"
 
-    # Get rules
-    rule_rows = await db.execute("SELECT * FROM counterparty_rules ORDER BY id")
-    rules = [dict(r) for r in await rule_rows.fetchall()]
 
-    # Get unclassified (or all) transactions
-    if year:
-        # Fiscal year: Mar [year-1] ~ Feb [year]
-        fy_start = f"{year - 1}-03-01"
-        fy_end = f"{year}-02-28"
-        tx_rows = await db.execute(
-            "SELECT * FROM fiat_transactions WHERE tx_date >= ? AND tx_date <= ? ORDER BY tx_date",
-            (fy_start, fy_end))
-    else:
-        tx_rows = await db.execute("SELECT * FROM fiat_transactions ORDER BY tx_date")
+async def _apply_classification(db, transactions: list, matcher: CounterpartyMatcher) -> dict:
+    """Classify rows in memory and write back only the ones whose result changed (one batch, by id).
 
-    transactions = [dict(r) for r in await tx_rows.fetchall()]
+    수동 분류(classified_by='manual') 행은 호출 쪽에서 제외해 넘긴다.
+    규칙에 안 걸리는 행은 account_code=NULL, classified_by='unclassified' 로 되돌린다.
+    """
+    result = classify_transactions(transactions, matcher.rules, matcher=matcher)
+    updates = [(tx["account_code"], "auto", tx["id"]) for tx in result["classified"]
+               if tx["account_code"] != tx.get("prev_code") or tx.get("classified_by") != "auto"]
+    updates += [(None, "unclassified", tx["id"]) for tx in result["unclassified"]
+                if tx.get("account_code") is not None or tx.get("classified_by") != "unclassified"]
+    if updates:
+        await db.executemany("UPDATE fiat_transactions SET account_code=?, classified_by=? WHERE id=?", updates)
+    result["stats"]["updated"] = len(updates)
+    return result
 
-    # Run classifier
-    result = classify_transactions(transactions, rules)
 
-    # Bulk update: one UPDATE per rule pattern (much faster than per-transaction)
-    for rule in rules:
-        pattern = rule["pattern"]
-        code = rule["account_code"]
-        await db.execute(
-            "UPDATE fiat_transactions SET account_code=?, classified_by='auto' WHERE LOWER(counterparty) LIKE ? AND (classified_by = 'unclassified' OR classified_by IS NULL)",
-            (code, f"%{pattern.lower()}%"))
+async def _load_for_classification(db, where: str, params) -> list:
+    rows = await db.execute(
+        f"SELECT {CLASSIFY_COLUMNS} FROM fiat_transactions "
+        f"WHERE (classified_by IS NULL OR classified_by <> 'manual') AND ({where}) ORDER BY tx_date",
+        params)
+    # classify_transactions 가 account_code 를 덮어쓰므로 이전 값은 따로 보관
+    return [{**dict(r), "prev_code": r["account_code"]} for r in await rows.fetchall()]
+
+
+async def _reclassify_for_patterns(db, patterns: list) -> int:
+    """규칙 변경 후 — 바뀐 패턴(이전/이후)을 포함하는 거래처의 행만 다시 분류. 나머지 행의 결과는 변할 수 없다.
+
+    대상 거래처는 counterparties(이름별 한 행)에서 고르고, 행은 counterparty_id 인덱스로 읽는다.
+    """
+    patterns = [p.lower() for p in patterns if p]
+    if not patterns:
+        return 0
+    matcher = await _counterparty_matcher(db)
+    await _ensure_counterparties_resolved(db)
+    rows = await db.execute("SELECT id, name FROM counterparties")
+    ids = [r["id"] for r in await rows.fetchall() if any(p in r["name"].lower() for p in patterns)]
+    if not ids:
+        return 0
+    placeholders = ",".join("?" for _ in ids)
+    async with db.transaction():
+        transactions = await _load_for_classification(db, f"counterparty_id IN ({placeholders})", ids)
+        result = await _apply_classification(db, transactions, matcher)
+    return result["stats"]["updated"]
+
+
+@app.post("/api/accounting/classify")
+async def run_classification(year: Optional[int] = None, db=Depends(db_session)):
+    """Classify fiat_transactions that still need it. Optionally filter by fiscal year.
+
+    Only rows that are unclassified (classified_by NULL/'unclassified') or were added
+    after the last full run's watermark are evaluated; changed results are written
+    back by id in one batch. Manual classifications are never touched.
+    """
+    matcher = await _counterparty_matcher(db)
+
+    wm_row = await db.execute("SELECT value FROM hr_settings WHERE key=?", (CLASSIFY_WATERMARK_KEY,))
+    wm = await wm_row.fetchone()
+    watermark = int(wm["value"]) if wm and wm["value"] else 0
+
+    where, params = "classified_by IS NULL OR classified_by = 'unclassified' OR id > ?", [watermark]
+    if year:
+        # Fiscal year: Mar [year-1] ~ Feb [year]
+        where = f"({where}) AND tx_date >= ? AND tx_date <= ?"
+        params += [f"{year - 1}-03-01", f"{year}-02-28"]
+
+    async with db.transaction():
+        transactions = await _load_for_classification(db, where, params)
+        result = await _apply_classification(db, transactions, matcher)
+        if not year:
+            max_row = await db.execute("SELECT MAX(id) AS max_id FROM fiat_transactions")
+            max_id = (await max_row.fetchone())["max_id"] or 0
+            await db.execute(
+                "INSERT INTO hr_settings (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value=excluded.value",
+                (CLASSIFY_WATERMARK_KEY, str(max_id)))
 
-    await db.commit()
     await db.close()
 
+    for tx in result["unclassified"]:
+        tx.pop("prev_code", None)
     return {
         "message": f"{result['stats']['auto']}건 자동 분류, {result['stats']['unclassified']}건 미분류",
         "stats": result["stats"],
@@ -3408,9 +3885,8 @@ async def run_classification(year: Optional[int] = None):
 
 
 @app.post("/api/accounting/classify-manual")
-async def classify_manual(data: dict):
+async def classify_manual(data: dict, db=Depends(db_session)):
     """Manually classify a transaction and optionally save as rule."""
-    db = await get_db()
     tx_id = data["tx_id"]
     account_code = data["account_code"]
     save_rule = data.get("save_rule", False)
@@ -3429,16 +3905,17 @@ async def classify_manual(data: dict):
             await db.execute(
                 "INSERT INTO counterparty_rules (pattern, account_code, residence, wht_flag, note, created_at) VALUES (?, ?, ?, 0, 'Auto-created from manual classification', datetime('now'))",
                 (counterparty, account_code, data.get("residence")))
+            _bump_rules_version()
 
     await db.commit()
+    reclassified = await _reclassify_for_patterns(db, [counterparty]) if save_rule and counterparty else 0
     await db.close()
-    return {"message": "Classified"}
+    return {"message": "Classified", "reclassified": reclassified}
 
 
 @app.get("/api/accounting/summary")
-async def classification_summary(year: Optional[int] = None):
+async def classification_summary(year: Optional[int] = None, db=Depends(db_session)):
     """Get classification summary by account."""
-    db = await get_db()
 
     conditions = []
     params = []
@@ -3468,11 +3945,12 @@ async def classification_summary(year: Optional[int] = None):
     by_account_rows = [dict(r) for r in await by_account.fetchall()]
 
     # WHT flagged
+    await _ensure_counterparties_resolved(db)
     wht = await db.execute("""
         SELECT ft.counterparty, ft.amount, ft.currency, ft.tx_date, cr.residence
         FROM fiat_transactions ft
-        JOIN counterparty_rules cr ON LOWER(ft.counterparty) LIKE '%%' || LOWER(cr.pattern) || '%%'
-        WHERE cr.wht_flag = 1
+        JOIN counterparties cp ON cp.id = ft.counterparty_id
+        JOIN counterparty_rules cr ON cr.id = cp.wht_rule_id
         ORDER BY ft.tx_date DESC LIMIT 20
     """)
     wht_rows = [dict(r) for r in await wht.fetchall()]
@@ -3493,9 +3971,8 @@ async def classification_summary(year: Optional[int] = None):
 # ══════════════════════════════════════════════════════════════════════════════
 
 @app.put("/api/accounting/wht/{tx_id}")
-async def update_wht_status(tx_id: int, data: dict):
+async def update_wht_status(tx_id: int, data: dict, db=Depends(db_session)):
     """Update WHT review status for a transaction."""
-    db = await get_db()
     await db.execute(
         "UPDATE fiat_transactions SET wht_status=?, wht_note=?, wht_reviewed_at=datetime('now') WHERE id=?",
         (data["status"], data.get("note", ""), tx_id))
@@ -3504,16 +3981,16 @@ async def update_wht_status(tx_id: int, data: dict):
     return {"message": "WHT status updated"}
 
 @app.get("/api/accounting/wht")
-async def list_wht_transactions():
+async def list_wht_transactions(db=Depends(db_session)):
     """List all WHT-flagged transactions with review status."""
-    db = await get_db()
+    await _ensure_counterparties_resolved(db)
     rows = await db.execute("""
         SELECT ft.id, ft.counterparty, ft.amount, ft.currency, ft.direction, ft.tx_date,
                ft.account_code, ft.wht_status, ft.wht_note, ft.wht_reviewed_at,
                cr.residence, cr.note as rule_note
         FROM fiat_transactions ft
-        JOIN counterparty_rules cr ON LOWER(ft.counterparty) LIKE '%%' || LOWER(cr.pattern) || '%%'
-        WHERE cr.wht_flag = 1
+        JOIN counterparties cp ON cp.id = ft.counterparty_id
+        JOIN counterparty_rules cr ON cr.id = cp.wht_rule_id
         ORDER BY ft.tx_date DESC
     """)
     result = [dict(r) for r in await rows.fetchall()]
@@ -3526,9 +4003,8 @@ async def list_wht_transactions():
 # ══════════════════════════════════════════════════════════════════════════════
 
 @app.get("/api/accounting/invoices")
-async def list_invoices(type: str = "", year: Optional[int] = None):
+async def list_invoices(type: str = "", year: Optional[int] = None, db=Depends(db_session)):
     """List invoices. type: 'receivable' (AR) or 'payable' (AP)."""
-    db = await get_db()
     conditions, params = [], []
     if type:
         conditions.append("type=?")
@@ -3545,8 +4021,7 @@ async def list_invoices(type: str = "", year: Optional[int] = None):
     return result
 
 @app.post("/api/accounting/invoices")
-async def create_invoice(data: dict):
-    db = await get_db()
+async def create_invoice(data: dict, db=Depends(db_session)):
     cursor = await db.execute(
         "INSERT INTO invoices (type, invoice_no, counterparty, description, amount, currency, issue_date, due_date, paid_date, status, fx_rate, sgd_amount, fiat_tx_id, note, created_at) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,datetime('now'))",
         (data["type"], data.get("invoice_no", ""), data["counterparty"], data.get("description", ""),
@@ -3558,8 +4033,7 @@ async def create_invoice(data: dict):
     return {"message": "Invoice created"}
 
 @app.put("/api/accounting/invoices/{invoice_id}")
-async def update_invoice(invoice_id: int, data: dict):
-    db = await get_db()
+async def update_invoice(invoice_id: int, data: dict, db=Depends(db_session)):
     fields = ["invoice_no", "counterparty", "description", "amount", "currency", "issue_date",
               "due_date", "paid_date", "status", "fx_rate", "sgd_amount", "fiat_tx_id", "note"]
     updates = {k: data[k] for k in fields if k in data}
@@ -3571,8 +4045,7 @@ async def update_invoice(invoice_id: int, data: dict):
     return {"message": "Updated"}
 
 @app.delete("/api/accounting/invoices/{invoice_id}")
-async def delete_invoice(invoice_id: int):
-    db = await get_db()
+async def delete_invoice(invoice_id: int, db=Depends(db_session)):
     await db.execute("DELETE FROM invoices WHERE id=?", (invoice_id,))
     await db.commit()
     await db.close()
@@ -3678,11 +4151,13 @@ async def upload_invoice_file(
     final_due_date = due_date or extracted.get("due_date", "")
 
     db = await get_db()
-    await db.execute(
-        "INSERT INTO invoices (type, invoice_no, counterparty, description, amount, currency, issue_date, due_date, status, file_url, note, created_at) VALUES (?,?,?,?,?,?,?,?,?,?,?,datetime('now'))",
-        (final_type, final_invoice_no, final_counterparty, final_description, final_amount, final_currency, final_issue_date, final_due_date, status, file_url, note))
-    await db.commit()
-    await db.close()
+    try:
+        await db.execute(
+            "INSERT INTO invoices (type, invoice_no, counterparty, description, amount, currency, issue_date, due_date, status, file_url, note, created_at) VALUES (?,?,?,?,?,?,?,?,?,?,?,datetime('now'))",
+            (final_type, final_invoice_no, final_counterparty, final_description, final_amount, final_currency, final_issue_date, final_due_date, status, file_url, note))
+        await db.commit()
+    finally:
+        await db.close()
 
     return {
         "message": f"Invoice uploaded: {file.filename}",
@@ -3711,9 +4186,8 @@ async def get_invoice_file(filename: str):
 
 
 @app.get("/api/accounting/invoices/summary")
-async def invoice_summary(year: Optional[int] = None):
+async def invoice_summary(year: Optional[int] = None, db=Depends(db_session)):
     """AR/AP summary."""
-    db = await get_db()
     conditions = []
     params = []
     if year:
@@ -3740,9 +4214,8 @@ async def invoice_summary(year: Optional[int] = None):
 # ── Accounting Documents (문서 저장소) ──────────────────────────────
 
 @app.get("/api/accounting/documents")
-async def list_accounting_documents(ya: Optional[int] = None, category: Optional[str] = None):
+async def list_accounting_documents(ya: Optional[int] = None, category: Optional[str] = None, db=Depends(db_session)):
     """List accounting documents, optionally filtered by YA and category."""
-    db = await get_db()
     conditions = []
     params = []
     if ya:
@@ -3759,9 +4232,8 @@ async def list_accounting_documents(ya: Optional[int] = None, category: Optional
 
 
 @app.get("/api/accounting/documents/years")
-async def list_accounting_years():
+async def list_accounting_years(db=Depends(db_session)):
     """Get list of available YAs."""
-    db = await get_db()
     rows = await db.execute("SELECT DISTINCT ya FROM accounting_documents ORDER BY ya DESC")
     years = [r["ya"] for r in await rows.fetchall()]
     await db.close()
@@ -3791,18 +4263,19 @@ async def upload_accounting_document(
 
     file_url = f"/api/accounting/documents/file/{safe_name}"
     db = await get_db()
-    await db.execute(
-        "INSERT INTO accounting_documents (ya, category, subcategory, filename, file_url, description, uploaded_at, note) VALUES (?,?,?,?,?,?,datetime('now'),?)",
-        (ya, category, subcategory, file.filename or safe_name, file_url, description, note))
-    await db.commit()
-    await db.close()
+    try:
+        await db.execute(
+            "INSERT INTO accounting_documents (ya, category, subcategory, filename, file_url, description, uploaded_at, note) VALUES (?,?,?,?,?,?,datetime('now'),?)",
+            (ya, category, subcategory, file.filename or safe_name, file_url, description, note))
+        await db.commit()
+    finally:
+        await db.close()
     return {"message": f"Document uploaded: {file.filename}", "file_url": file_url}
 
 
 @app.delete("/api/accounting/documents/{doc_id}")
-async def delete_accounting_document(doc_id: int):
+async def delete_accounting_document(doc_id: int, db=Depends(db_session)):
     """Delete an accounting document."""
-    db = await get_db()
     row = await db.execute("SELECT file_url FROM accounting_documents WHERE id = ?", (doc_id,))
     doc = await row.fetchone()
     if not doc:
@@ -3823,10 +4296,9 @@ async def delete_accounting_document(doc_id: int):
 
 
 @app.put("/api/accounting/documents/{doc_id}")
-async def update_accounting_document(doc_id: int, request: Request):
+async def update_accounting_document(doc_id: int, request: Request, db=Depends(db_session)):
     """Update document metadata (description, note, category, subcategory)."""
     body = await request.json()
-    db = await get_db()
     fields = []
     params = []
     for key in ["ya", "category", "subcategory", "description", "note"]:
@@ -3944,7 +4416,7 @@ async def _lookup_fx_to_usdt(currency: str, date_str: str) -> tuple:
 
 
 @app.post("/api/hr/expenses/ingest")
-async def ingest_expenses(data: ExpenseIngestBody, request: Request):
+async def ingest_expenses(data: ExpenseIngestBody, request: Request, db=Depends(db_session)):
     """
     Ingest structured expense rows into Supabase `expenses` table.
     - Maps submitter (Drive folder name) → member_id via hr_members.drive_folder_name.
@@ -3954,7 +4426,6 @@ async def ingest_expenses(data: ExpenseIngestBody, request: Request):
     - NO payment, NO transfer. Record only.
     """
     require_operator(request)
-    db = await get_db()
 
     # Parse period
     try:
@@ -3980,11 +4451,19 @@ async def ingest_expenses(data: ExpenseIngestBody, request: Request):
         if m.get("name"):
             folder_map.setdefault(_norm_key(m["name"]), m["id"])
 
-    inserted = 0
     skipped = 0
     mapping_failures = []
     fx_warnings = []
 
+    # Dedup keys for the period, loaded once; rows queued in this batch are added as we go.
+    seen_rows = await db.execute(
+        "SELECT member_id, vendor, amount_original, fx_date_estimate FROM expenses WHERE year=? AND month=?",
+        (year, month))
+    seen = {(r["member_id"], r["vendor"], r["amount_original"], r["fx_date_estimate"] or None)
+            for r in await seen_rows.fetchall()}
+    new_rows = []
+    now = now_text()
+
     for row in data.rows:
         flags = row.flags or ""
 
@@ -4016,38 +4495,30 @@ async def ingest_expenses(data: ExpenseIngestBody, request: Request):
                 fx_warnings.append(f"{row.submitter}/{row.vendor}: {row.currency_original} rate not found for {row.fx_date_estimate}")
 
         # Dedup check
-        if row.fx_date_estimate:
-            dedup_row = await db.execute(
-                "SELECT id FROM expenses WHERE member_id=? AND year=? AND month=? AND vendor=? AND amount_original=? AND fx_date_estimate=?",
-                (member_id, year, month, row.vendor, row.amount_original, row.fx_date_estimate)
-            )
-        else:
-            dedup_row = await db.execute(
-                "SELECT id FROM expenses WHERE member_id=? AND year=? AND month=? AND vendor=? AND amount_original=? AND fx_date_estimate IS NULL",
-                (member_id, year, month, row.vendor, row.amount_original)
-            )
-        if await dedup_row.fetchone():
+        dedup_key = (member_id, row.vendor, row.amount_original, row.fx_date_estimate or None)
+        if dedup_key in seen:
             skipped += 1
             continue
+        seen.add(dedup_key)
 
         flags_clean = flags.strip(",") if flags else None
 
-        await db.execute(
-            """INSERT INTO expenses
-               (member_id, year, month, amount_usdt, category, description, status, expense_date, created_at,
-                vendor, amount_original, currency_original,
-                fx_date_estimate, fx_rate_estimate, amount_usdt_estimate,
-                evidence_status, evidence_ref, flags)
-               VALUES (?,?,?,?,?,?,?,?,datetime('now'),?,?,?,?,?,?,?,?,?)""",
+        new_rows.append(
             (member_id, year, month,
              None,  # amount_usdt left NULL until confirmed
-             row.category, row.item, status, row.fx_date_estimate,
+             row.category, row.item, status, row.fx_date_estimate, now,
              row.vendor, row.amount_original, row.currency_original,
              row.fx_date_estimate, fx_rate, usdt_est,
              row.evidence_status, row.evidence_ref, flags_clean)
         )
-        inserted += 1
 
+    inserted = await db.bulk_insert(
+        "expenses",
+        ("member_id", "year", "month", "amount_usdt", "category", "description", "status", "expense_date", "created_at",
+         "vendor", "amount_original", "currency_original",
+         "fx_date_estimate", "fx_rate_estimate", "amount_usdt_estimate",
+         "evidence_status", "evidence_ref", "flags"),
+        new_rows)
     await db.commit()
     await db.close()
 
@@ -4060,7 +4531,7 @@ async def ingest_expenses(data: ExpenseIngestBody, request: Request):
 
 
 @app.post("/api/hr/expenses/{expense_id}/decision")
-async def decide_expense(expense_id: int, data: ExpenseDecisionBody, request: Request):
+async def decide_expense(expense_id: int, data: ExpenseDecisionBody, request: Request, db=Depends(db_session)):
     """
     Record a decision on an expense in Supabase `expenses` table.
     If decision='paid': calculates confirmed USDT from D-1 ECB exchange rate,
@@ -4076,7 +4547,6 @@ async def decide_expense(expense_id: int, data: ExpenseDecisionBody, request: Re
     if data.decision not in ("paid", "approved", "hold", "more_docs"):
         raise HTTPException(400, "decision must be: paid, approved, hold, or more_docs")
 
-    db = await get_db()
     row = await db.execute("SELECT * FROM expenses WHERE id = ?", (expense_id,))
     expense = await row.fetchone()
     if not expense:
@@ -4126,6 +4596,7 @@ async def decide_expense(expense_id: int, data: ExpenseDecisionBody, request: Re
              amount_usdt_confirmed, amount_usdt_confirmed,
              decided_by, now, now, expense_id)
         )
+        await _refresh_payroll_summary(db, [(expense["year"], expense["month"])])
     else:
         # hold / more_docs / approved — no amount changes, record only
         await db.execute(
@@ -4174,8 +4645,7 @@ class TaxDeadlineUpdate(BaseModel):
 
 
 @app.get("/api/hr/tax-calendar")
-async def list_tax_deadlines(ya: int = None, category: str = None):
-    db = await get_db()
+async def list_tax_deadlines(ya: int = None, category: str = None, db=Depends(db_session)):
     query = "SELECT * FROM tax_deadlines WHERE 1=1"
     params = []
     if ya:
@@ -4204,14 +4674,13 @@ async def list_tax_deadlines(ya: int = None, category: str = None):
 
 
 @app.get("/api/hr/tax-calendar/alerts")
-async def get_tax_alerts():
+async def get_tax_alerts(db=Depends(db_session)):
     """Return deadlines within 7 days for alert display."""
     from datetime import timedelta
     today = datetime.now().date()
     d7 = (today + timedelta(days=7)).strftime("%Y-%m-%d")
     today_str = today.strftime("%Y-%m-%d")
 
-    db = await get_db()
     rows = await db.execute(
         "SELECT * FROM tax_deadlines WHERE deadline_date BETWEEN ? AND ? AND status != 'completed' ORDER BY deadline_date ASC",
         (today_str, d7)
@@ -4228,9 +4697,8 @@ async def get_tax_alerts():
 
 
 @app.get("/api/hr/tax-calendar/summary")
-async def tax_calendar_summary():
+async def tax_calendar_summary(db=Depends(db_session)):
     """Summary counts by status for dashboard."""
-    db = await get_db()
     today = datetime.now().strftime("%Y-%m-%d")
     rows = await db.execute("SELECT * FROM tax_deadlines ORDER BY deadline_date ASC")
     all_deadlines = [dict(r) for r in await rows.fetchall()]
@@ -4257,21 +4725,19 @@ async def tax_calendar_summary():
 
 
 @app.post("/api/hr/tax-calendar")
-async def create_tax_deadline(data: TaxDeadlineCreate):
-    db = await get_db()
-    await db.execute(
+async def create_tax_deadline(data: TaxDeadlineCreate, db=Depends(db_session)):
+    cursor = await db.execute(
         "INSERT INTO tax_deadlines (title, description, category, deadline_date, alert_d7, alert_d1, ya) VALUES (?,?,?,?,?,?,?)",
         (data.title, data.description, data.category, data.deadline_date, int(data.alert_d7), int(data.alert_d1), data.ya)
     )
     await db.commit()
-    last_id = (await (await db.execute("SELECT last_insert_rowid()")).fetchone())[0]
+    last_id = cursor.lastrowid
     await db.close()
     return {"id": last_id, "message": "Created"}
 
 
 @app.put("/api/hr/tax-calendar/{deadline_id}")
-async def update_tax_deadline(deadline_id: int, data: TaxDeadlineUpdate):
-    db = await get_db()
+async def update_tax_deadline(deadline_id: int, data: TaxDeadlineUpdate, db=Depends(db_session)):
     fields = []
     params = []
     for key, val in data.model_dump(exclude_none=True).items():
@@ -4290,8 +4756,7 @@ async def update_tax_deadline(deadline_id: int, data: TaxDeadlineUpdate):
 
 
 @app.delete("/api/hr/tax-calendar/{deadline_id}")
-async def delete_tax_deadline(deadline_id: int):
-    db = await get_db()
+async def delete_tax_deadline(deadline_id: int, db=Depends(db_session)):
     await db.execute("DELETE FROM tax_deadlines WHERE id = ?", (deadline_id,))
     await db.commit()
     await db.close()
@@ -0,0 +1,388 @@
+"""
+Versioned schema migrations — SQLite / PostgreSQL 공용.
+
+schema_version 테이블에 적용된 버전을 기록하고, 아직 적용되지 않은 항목만 순서대로
+실행한다. 각 항목은 멱등(IF NOT EXISTS)이라 여러 워커가 동시에 떠서 겹쳐 실행해도 안전.
+새 스키마 변경은 MIGRATIONS 끝에 다음 번호로 추가한다(기존 항목은 수정하지 않음).
+
+웜 스타트는 pending_migrations() 의 버전 조회 한 번으로 끝난다.
+"""
+import json
+import logging
+import sqlite3
+
+import asyncpg
+
+logger = logging.getLogger("migrations")
+
+SCHEMA_VERSION_DDL = {
+    "sqlite": "CREATE TABLE IF NOT EXISTS schema_version ("
+              "version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at TEXT DEFAULT (datetime('now')))",
+    "pg": "CREATE TABLE IF NOT EXISTS schema_version ("
+          "version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at TEXT DEFAULT (NOW()::TEXT))",
+}
+
+_RECORD_SQL = {
+    "sqlite": "INSERT OR IGNORE INTO schema_version (version, name) VALUES (?, ?)",
+    "pg": "INSERT INTO schema_version (version, name) VALUES ($1, $2) ON CONFLICT (version) DO NOTHING",
+}
+
+
+# ── v0: baseline ──
+# 예전에는 부팅마다 다시 돌던 스키마. SQLite 는 database.create_schema(테이블·시드·
+# PRAGMA table_info 기반 컬럼 추가), PostgreSQL 은 migrate_to_pg.py 로 만든 테이블에
+# 대한 추가 컬럼만 — RLS 는 건드리지 않는다(기본 거부 유지).
+PG_BASELINE = [
+    # C-1 §1: email-intake columns on candidates
+    "ALTER TABLE candidates ADD COLUMN IF NOT EXISTS wallet_address TEXT",
+    "ALTER TABLE candidates ADD COLUMN IF NOT EXISTS source TEXT DEFAULT 'manual'",
+    "ALTER TABLE candidates ADD COLUMN IF NOT EXISTS source_email_id TEXT",
+    "ALTER TABLE candidates ADD COLUMN IF NOT EXISTS detected_at TEXT",
+    # C-1 §3: detected_applicants staging table (감지됨/검토 대기)
+    "CREATE TABLE IF NOT EXISTS detected_applicants ("
+    "id SERIAL PRIMARY KEY, sender_email TEXT NOT NULL UNIQUE, sender_name TEXT, "
+    "repo_url TEXT, wallet_address TEXT, status TEXT DEFAULT 'detected', "
+    "source_email_ids TEXT, first_detected_at TEXT, updated_at TEXT, "
+    "registered_candidate_id INTEGER)",
+    # RLS 기본 거부 유지: 정책 없이 RLS만 켠다(서비스 역할만 백엔드 경유 접근).
+    "ALTER TABLE detected_applicants ENABLE ROW LEVEL SECURITY",
+]
+
+
+async def _baseline(conn, dialect):
+    if dialect == "pg":
+        for stmt in PG_BASELINE:
+            await conn.execute(stmt)
+        return
+    from database import create_schema
+    await create_schema(conn)
+
+
+# ── v1: hot-path indexes ──
+# 주석은 SQLite EXPLAIN QUERY PLAN (인덱스 없을 때 → 있을 때).
+# detected_applicants(sender_email), linkedin_candidates(linkedin_username) 는 UNIQUE 제약의
+# 자동 인덱스로 이미 SEARCH 되므로 중복 인덱스를 만들지 않는다.
+HOT_PATH_INDEXES = [
+    # payrolls WHERE year=? AND month=? [AND member_id=?]
+    #   SCAN payrolls → SEARCH USING COVERING INDEX (year=? AND month=? AND member_id=?)
+    "CREATE INDEX IF NOT EXISTS idx_payrolls_period_member ON payrolls (year, month, member_id)",
+    # expenses SUM(amount_usdt) WHERE member_id=? AND year=? AND month=?
+    #   SCAN expenses → SEARCH USING INDEX (member_id=? AND year=? AND month=?)
+    "CREATE INDEX IF NOT EXISTS idx_expenses_member_period ON expenses (member_id, year, month)",
+    # monitor_activities WHERE github_username=? ORDER BY activity_date DESC LIMIT 5
+    #   SEARCH (github_username=?) + USE TEMP B-TREE FOR ORDER BY → SEARCH, 정렬 없음
+    "CREATE INDEX IF NOT EXISTS idx_monitor_activities_user_date ON monitor_activities (github_username, activity_date)",
+    # 업로드 중복 체크: SELECT tx_id FROM fiat_transactions WHERE source=?
+    #   SCAN fiat_transactions → SEARCH USING COVERING INDEX (source=?)
+    "CREATE INDEX IF NOT EXISTS idx_fiat_source_txid ON fiat_transactions (source, tx_id)",
+    # 회계연도 필터: WHERE tx_date >= ? AND tx_date <= ? ORDER BY tx_date
+    #   SCAN + USE TEMP B-TREE FOR ORDER BY → SEARCH USING INDEX (tx_date>? AND tx_date<?)
+    "CREATE INDEX IF NOT EXISTS idx_fiat_tx_date ON fiat_transactions (tx_date)",
+    # 메일 intake 중복 체크: WHERE LOWER(TRIM(email)) = ?  (식 인덱스)
+    #   SCAN candidates → SEARCH USING INDEX (<expr>=?)
+    "CREATE INDEX IF NOT EXISTS idx_candidates_email_norm ON candidates ((LOWER(TRIM(email))))",
+    # 업로드 시 이름 매칭: SELECT id FROM hr_members WHERE name=?
+    #   SCAN hr_members → SEARCH USING COVERING INDEX (name=?)
+    "CREATE INDEX IF NOT EXISTS idx_hr_members_name ON hr_members (name)",
+]
+
+
+async def _hot_path_indexes(conn, dialect):
+    for stmt in HOT_PATH_INDEXES:
+        await conn.execute(stmt)
+
+
+# ── v2: payroll_monthly_summary ──
+# /api/hr/dashboard 용 월별 집계. 원본(payrolls/expenses/hr_members)이 바뀔 때 main 의
+# _refresh_payroll_summary() 가 해당 (year, month) 행만 다시 계산한다.
+# 연간 평균 환율은 AVG 를 합칠 수 없으므로 rate_sum / rate_count 로 보관.
+# active_member_* 는 급여 행이 없는 달의 예상치(재직 팀원 monthly_usdt 합)용 스냅샷.
+PAYROLL_SUMMARY_DDL = {
+    "sqlite": """CREATE TABLE IF NOT EXISTS payroll_monthly_summary (
+        year INTEGER NOT NULL, month INTEGER NOT NULL,
+        payroll_count INTEGER DEFAULT 0,
+        total_usdt REAL DEFAULT 0, total_krw REAL DEFAULT 0, total_tax REAL DEFAULT 0,
+        tax_accrued REAL DEFAULT 0, rate_sum REAL DEFAULT 0, rate_count INTEGER DEFAULT 0,
+        expense_usdt REAL DEFAULT 0,
+        active_member_count INTEGER DEFAULT 0, active_member_usdt REAL DEFAULT 0,
+        updated_at TEXT,
+        PRIMARY KEY (year, month))""",
+    "pg": """CREATE TABLE IF NOT EXISTS payroll_monthly_summary (
+        year INTEGER NOT NULL, month INTEGER NOT NULL,
+        payroll_count INTEGER DEFAULT 0,
+        total_usdt DOUBLE PRECISION DEFAULT 0, total_krw DOUBLE PRECISION DEFAULT 0,
+        total_tax DOUBLE PRECISION DEFAULT 0, tax_accrued DOUBLE PRECISION DEFAULT 0,
+        rate_sum DOUBLE PRECISION DEFAULT 0, rate_count INTEGER DEFAULT 0,
+        expense_usdt DOUBLE PRECISION DEFAULT 0,
+        active_member_count INTEGER DEFAULT 0, active_member_usdt DOUBLE PRECISION DEFAULT 0,
+        updated_at TEXT,
+        PRIMARY KEY (year, month))""",
+}
+
+# 기존 데이터 백필 — 급여 또는 경비가 있는 모든 (year, month). 겹쳐 실행돼도 DO NOTHING.
+PAYROLL_SUMMARY_BACKFILL = """
+    INSERT INTO payroll_monthly_summary (
+        year, month, payroll_count, total_usdt, total_krw, total_tax, tax_accrued,
+        rate_sum, rate_count, expense_usdt, active_member_count, active_member_usdt, updated_at)
+    SELECT k.year, k.month, COALESCE(p.payroll_count, 0), COALESCE(p.total_usdt, 0),
+           COALESCE(p.total_krw, 0), COALESCE(p.total_tax, 0), COALESCE(p.tax_accrued, 0),
+           COALESCE(p.rate_sum, 0), COALESCE(p.rate_count, 0), COALESCE(e.expense_usdt, 0),
+           (SELECT COUNT(*) FROM hr_members WHERE is_active = 1),
+           (SELECT COALESCE(SUM(monthly_usdt), 0) FROM hr_members WHERE is_active = 1),
+           {now}
+    FROM (SELECT year, month FROM payrolls UNION SELECT year, month FROM expenses) k
+    LEFT JOIN (
+        SELECT year, month, COUNT(*) AS payroll_count,
+               SUM(usdt_amount) AS total_usdt, SUM(krw_amount) AS total_krw,
+               SUM(tax_simulated) AS total_tax,
+               SUM(CASE WHEN tax_simulated > 0 THEN tax_simulated ELSE 0 END) AS tax_accrued,
+               SUM(CASE WHEN krw_rate > 0 THEN krw_rate ELSE 0 END) AS rate_sum,
+               SUM(CASE WHEN krw_rate > 0 THEN 1 ELSE 0 END) AS rate_count
+        FROM payrolls GROUP BY year, month
+    ) p ON p.year = k.year AND p.month = k.month
+    LEFT JOIN (
+        SELECT year, month, SUM(amount_usdt) AS expense_usdt FROM expenses GROUP BY year, month
+    ) e ON e.year = k.year AND e.month = k.month
+    WHERE true
+    ON CONFLICT (year, month) DO NOTHING
+"""
+_NOW_EXPR = {"sqlite": "datetime('now')", "pg": "NOW()::TEXT"}
+
+
+async def _payroll_monthly_summary(conn, dialect):
+    await conn.execute(PAYROLL_SUMMARY_DDL[dialect])
+    await conn.execute(PAYROLL_SUMMARY_BACKFILL.format(now=_NOW_EXPR[dialect]))
+
+
+# ── v3: fiat_transactions 날짜 정규화 ──
+# tx_date 를 "YYYY-MM-DD HH:MM:SS" 로 통일하고 tx_year / tx_month 를 저장한다.
+# 연/월 필터가 CAST(substr(tx_date, ...)) 대신 인덱스를 탄다:
+#   SCAN fiat_transactions → SEARCH USING INDEX idx_fiat_period (tx_year=? AND tx_month=?)
+# 목록 정렬/keyset 커서: WHERE (tx_date, id) < (?, ?) ORDER BY tx_date DESC, id DESC
+#   → idx_fiat_date_id 역방향 범위 스캔, 정렬 없음 (SQLite 는 rowid 를 품은 idx_fiat_tx_date 로도 동일).
+FIAT_PERIOD_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_fiat_period ON fiat_transactions (tx_year, tx_month, tx_date, id)",
+    "CREATE INDEX IF NOT EXISTS idx_fiat_date_id ON fiat_transactions (tx_date, id)",
+]
+
+
+async def _fiat_tx_period(conn, dialect):
+    from accounting.fiat_dates import normalize_tx_date, tx_period
+
+    if dialect == "pg":
+        await conn.execute("ALTER TABLE fiat_transactions ADD COLUMN IF NOT EXISTS tx_year INTEGER")
+        await conn.execute("ALTER TABLE fiat_transactions ADD COLUMN IF NOT EXISTS tx_month INTEGER")
+        rows = await conn.fetch("SELECT id, tx_date FROM fiat_transactions")
+    else:
+        cur = await conn.execute("PRAGMA table_info(fiat_transactions)")
+        cols = {r[1] for r in await cur.fetchall()}
+        for col in ("tx_year", "tx_month"):
+            if col not in cols:
+                await conn.execute(f"ALTER TABLE fiat_transactions ADD COLUMN {col} INTEGER")
+        cur = await conn.execute("SELECT id, tx_date FROM fiat_transactions")
+        rows = await cur.fetchall()
+
+    updates = []
+    for tx_id, raw in rows:
+        iso = normalize_tx_date(raw)
+        updates.append((iso, *tx_period(iso), tx_id))
+    if updates:
+        if dialect == "pg":
+            await conn.executemany(
+                "UPDATE fiat_transactions SET tx_date=$1, tx_year=$2, tx_month=$3 WHERE id=$4", updates)
+        else:
+            await conn.executemany(
+                "UPDATE fiat_transactions SET tx_date=?, tx_year=?, tx_month=? WHERE id=?", updates)
+    for stmt in FIAT_PERIOD_INDEXES:
+        await conn.execute(stmt)
+
+
+# ── v4: counterparties 차원 테이블 ──
+# 같은 거래처 이름이 수만 건에 반복되므로 이름별 한 행으로 모으고 fiat_transactions.counterparty_id 로 참조.
+# 규칙 해석 결과(rule_id = 분류 규칙, wht_rule_id = 첫 WHT 규칙)는 main 이 이름별로 한 번 계산해 채운다.
+# tx_count / total_amount 는 규칙 미리보기용 집계 (업로드·삭제 때 해당 거래처만 갱신).
+COUNTERPARTIES_DDL = {
+    "sqlite": "CREATE TABLE IF NOT EXISTS counterparties ("
+              "id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE, "
+              "rule_id INTEGER, wht_rule_id INTEGER, tx_count INTEGER DEFAULT 0, total_amount REAL DEFAULT 0, "
+              "created_at TEXT DEFAULT (datetime('now')))",
+    "pg": "CREATE TABLE IF NOT EXISTS counterparties ("
+          "id SERIAL PRIMARY KEY, name TEXT NOT NULL UNIQUE, "
+          "rule_id INTEGER, wht_rule_id INTEGER, tx_count INTEGER DEFAULT 0, total_amount DOUBLE PRECISION DEFAULT 0, "
+          "created_at TEXT DEFAULT (NOW()::TEXT))",
+}
+COUNTERPARTIES_BACKFILL = [
+    "INSERT INTO counterparties (name) SELECT DISTINCT counterparty FROM fiat_transactions "
+    "WHERE counterparty IS NOT NULL AND counterparty <> '' ON CONFLICT (name) DO NOTHING",
+    "UPDATE fiat_transactions SET counterparty_id = "
+    "(SELECT c.id FROM counterparties c WHERE c.name = fiat_transactions.counterparty) "
+    "WHERE counterparty_id IS NULL",
+    # WHERE counterparty_id IN (...) / JOIN ON ft.counterparty_id = cp.id
+    #   SCAN fiat_transactions → SEARCH USING INDEX idx_fiat_counterparty (counterparty_id=?)
+    "CREATE INDEX IF NOT EXISTS idx_fiat_counterparty ON fiat_transactions (counterparty_id)",
+    "UPDATE counterparties SET "
+    "tx_count = (SELECT COUNT(*) FROM fiat_transactions f WHERE f.counterparty_id = counterparties.id), "
+    "total_amount = (SELECT COALESCE(SUM(amount), 0) FROM fiat_transactions f WHERE f.counterparty_id = counterparties.id)",
+]
+
+
+async def _counterparties(conn, dialect):
+    await conn.execute(COUNTERPARTIES_DDL[dialect])
+    if dialect == "pg":
+        await conn.execute("ALTER TABLE fiat_transactions ADD COLUMN IF NOT EXISTS counterparty_id INTEGER")
+    else:
+        cur = await conn.execute("PRAGMA table_info(fiat_transactions)")
+        if "counterparty_id" not in {r[1] for r in await cur.fetchall()}:
+            await conn.execute("ALTER TABLE fiat_transactions ADD COLUMN counterparty_id INTEGER")
+    for stmt in COUNTERPARTIES_BACKFILL:
+        await conn.execute(stmt)
+
+
+# ── v5: repo_analysis_cache ──
+# analyze_repo 결과를 (정규화된 저장소 URL, 원격 HEAD 커밋 SHA) 로 보관 — 같은 커밋이면 clone 생략.
+REPO_ANALYSIS_CACHE_DDL = {
+    "sqlite": "CREATE TABLE IF NOT EXISTS repo_analysis_cache ("
+              "repo_url TEXT NOT NULL, commit_sha TEXT NOT NULL, result TEXT NOT NULL, "
+              "hit_count INTEGER DEFAULT 0, created_at TEXT DEFAULT (datetime('now')), last_hit_at TEXT, "
+              "PRIMARY KEY (repo_url, commit_sha))",
+    "pg": "CREATE TABLE IF NOT EXISTS repo_analysis_cache ("
+          "repo_url TEXT NOT NULL, commit_sha TEXT NOT NULL, result TEXT NOT NULL, "
+          "hit_count INTEGER DEFAULT 0, created_at TEXT DEFAULT (NOW()::TEXT), last_hit_at TEXT, "
+          "PRIMARY KEY (repo_url, commit_sha))",
+}
+
+
+async def _repo_analysis_cache(conn, dialect):
+    await conn.execute(REPO_ANALYSIS_CACHE_DDL[dialect])
+
+
+# ── v6: org_benchmark_repos ──
+# 조직 벤치마크의 저장소별 지표 — 저장소당 한 행, pushed_at 이 바뀐 저장소만 다시 분석한다.
+# included = 최근 refresh 집계에 들어간 저장소. 집계는 이 행들로 다시 계산한다.
+_BENCHMARK_REPO_COLUMNS = (
+    "org_name TEXT NOT NULL, repo_name TEXT NOT NULL, pushed_at TEXT, stars INTEGER DEFAULT 0, description TEXT, "
+    "file_count INTEGER DEFAULT 0, commit_count INTEGER DEFAULT 0, total_size_kb {real} DEFAULT 0, "
+    "has_tests INTEGER DEFAULT 0, readme_sections INTEGER DEFAULT 0, readme_has_install_guide INTEGER DEFAULT 0, "
+    "readme_has_code_blocks INTEGER DEFAULT 0, config_file_count INTEGER DEFAULT 0, src_dir_count INTEGER DEFAULT 0, "
+    "has_ci INTEGER DEFAULT 0, languages TEXT DEFAULT '{{}}', included INTEGER DEFAULT 0, analyzed_at TEXT, "
+    "PRIMARY KEY (org_name, repo_name)"
+)
+ORG_BENCHMARK_REPOS_DDL = {
+    "sqlite": "CREATE TABLE IF NOT EXISTS org_benchmark_repos (" + _BENCHMARK_REPO_COLUMNS.format(real="REAL") + ")",
+    "pg": "CREATE TABLE IF NOT EXISTS org_benchmark_repos (" + _BENCHMARK_REPO_COLUMNS.format(real="DOUBLE PRECISION") + ")",
+}
+
+
+async def _org_benchmark_repos(conn, dialect):
+    await conn.execute(ORG_BENCHMARK_REPOS_DDL[dialect])
+
+
+# ── v7: fiat 목록 keyset 정렬키 ──
+# tx_date 가 NULL 인 행은 "(tx_date, id) < (?, ?)" 비교가 NULL 이 되어 커서 페이지에서 빠지고,
+# NULL 정렬 위치도 SQLite(맨 뒤)·PG(DESC 에서 맨 앞)가 달라 COALESCE(tx_date, '') 로 정렬·비교한다.
+#   WHERE (COALESCE(tx_date, ''), id) < (?, ?) ORDER BY COALESCE(tx_date, '') DESC, id DESC
+#   → PG: idx_fiat_date0_id 역방향 범위 스캔 / SQLite: SCAN USING INDEX idx_fiat_date0_id — 둘 다 정렬 없음
+FIAT_SORT_INDEX = "CREATE INDEX IF NOT EXISTS idx_fiat_date0_id ON fiat_transactions ((COALESCE(tx_date, '')), id)"
+
+
+async def _fiat_sort_key(conn, dialect):
+    await conn.execute(FIAT_SORT_INDEX)
+
+
+# ── v8: 후보 벤치마크 지표 컬럼 ──
+# /api/benchmark/candidate-ranks 가 후보마다 repo_analysis JSON 전체를 읽어 파싱하지 않도록
+# 분포 지표(analyzer.BENCHMARK_DISTRIBUTION_METRICS) 값을 candidates.metric_<지표> 컬럼에 둔다.
+# analyze_candidate 가 repo_analysis 와 함께 쓰고, 기존 행은 여기서 한 번 채운다(파싱 안 되는 행은 NULL 로 두고 로그).
+CANDIDATE_METRICS = ("file_count", "commit_count", "total_size_kb", "readme_sections", "config_file_count", "src_dir_count")
+
+
+async def _candidate_metric_columns(conn, dialect):
+    columns = ["metric_" + m for m in CANDIDATE_METRICS]
+    if dialect == "pg":
+        for col in columns:
+            await conn.execute(f"ALTER TABLE candidates ADD COLUMN IF NOT EXISTS {col} DOUBLE PRECISION")
+        rows = await conn.fetch("SELECT id, repo_analysis FROM candidates WHERE repo_analysis IS NOT NULL")
+    else:
+        cur = await conn.execute("PRAGMA table_info(candidates)")
+        existing = {r[1] for r in await cur.fetchall()}
+        for col in columns:
+            if col not in existing:
+                await conn.execute(f"ALTER TABLE candidates ADD COLUMN {col} REAL")
+        cur = await conn.execute("SELECT id, repo_analysis FROM candidates WHERE repo_analysis IS NOT NULL")
+        rows = await cur.fetchall()
+
+    updates = []
+    for candidate_id, raw in rows:
+        try:
+            analysis = json.loads(raw) if raw else None
+        except ValueError:
+            analysis = None
+        if not isinstance(analysis, dict):
+            if raw:
+                logger.warning("candidate %s: unreadable repo_analysis, benchmark metrics left empty", candidate_id)
+            continue
+        values = [analysis.get(m) for m in CANDIDATE_METRICS]
+        updates.append((*(float(v) if isinstance(v, (int, float)) else None for v in values), candidate_id))
+    if updates:
+        if dialect == "pg":
+            set_clause = ", ".join(f"{col}=${i}" for i, col in enumerate(columns, 1))
+            await conn.executemany(f"UPDATE candidates SET {set_clause} WHERE id=${len(columns) + 1}", updates)
+        else:
+            set_clause = ", ".join(f"{col}=?" for col in columns)
+            await conn.executemany(f"UPDATE candidates SET {set_clause} WHERE id=?", updates)
+
+
+# (version, name, async fn(conn, dialect)) — 버전 오름차순
+MIGRATIONS = [
+    (0, "baseline", _baseline),
+    (1, "hot_path_indexes", _hot_path_indexes),
+    (2, "payroll_monthly_summary", _payroll_monthly_summary),
+    (3, "fiat_tx_period", _fiat_tx_period),
+    (4, "counterparties", _counterparties),
+    (5, "repo_analysis_cache", _repo_analysis_cache),
+    (6, "org_benchmark_repos", _org_benchmark_repos),
+    (7, "fiat_sort_key", _fiat_sort_key),
+    (8, "candidate_metric_columns", _candidate_metric_columns),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+async def _applied_versions(conn, dialect):
+    if dialect == "pg":
+        rows = await conn.fetch("SELECT version FROM schema_version")
+    else:
+        cur = await conn.execute("SELECT version FROM schema_version")
+        rows = await cur.fetchall()
+    return {r[0] for r in rows}
+
+
+async def pending_migrations(conn, dialect):
+    """Registry entries not yet recorded in schema_version (one query)."""
+    try:
+        done = await _applied_versions(conn, dialect)
+    except (sqlite3.OperationalError, asyncpg.UndefinedTableError):
+        return list(MIGRATIONS)  # 새 DB — schema_version 자체가 없음
+    return [m for m in MIGRATIONS if m[0] not in done]
+
+
+async def run_migrations(conn, dialect, pending=None):
+    """Apply pending migrations on a raw aiosqlite / asyncpg connection.
+
+    Returns the names of the migrations applied in this call.
+    """
+    if pending is None:
+        pending = await pending_migrations(conn, dialect)
+    if not pending:
+        return []
+    await conn.execute(SCHEMA_VERSION_DDL[dialect])
+    applied = []
+    for version, name, fn in pending:
+        await fn(conn, dialect)
+        if dialect == "pg":
+            await conn.execute(_RECORD_SQL[dialect], version, name)
+        else:
+            await conn.execute(_RECORD_SQL[dialect], (version, name))
+            await conn.commit()
+        logger.info("schema migration %d (%s) applied", version, name)
+        applied.append(name)
+    return applied